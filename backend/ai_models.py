@@ -3,15 +3,25 @@ AI/ML Models for Building Performance Dashboard
 This module contains the machine learning models for predictions and anomaly detection.
 """
 
-import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from __future__ import annotations
+
 from datetime import datetime, timedelta
-import joblib
 import os
-from typing import List, Dict, Any, Tuple
+import random
+import time
+from typing import List, Dict, Any, Tuple, Callable, Iterable, Iterator, Optional
+
+from lazy_imports import LazyModule
+
+# Heavy dependencies load on first use (scikit-learn is imported inside the methods)
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+joblib = LazyModule("joblib")
+
+# Columns aggregated into a daily usage profile
+PROFILE_SUMMARY_FEATURES = ['temperature', 'humidity', 'energy_consumption', 'occupancy']
+# Columns whose hourly shape forms the clustering vector (24 values each)
+PROFILE_SHAPE_FEATURES = ['energy_consumption', 'occupancy']
 
 class BuildingAIModels:
     """AI models for building performance analysis"""
@@ -20,14 +30,21 @@ class BuildingAIModels:
         self.lstm_model = None
         self.anomaly_detector = None
         self.clustering_model = None
-        self.scaler = StandardScaler()
+        self._scaler = None
         self.models_dir = "models"
         
         # Create models directory if it doesn't exist
         if not os.path.exists(self.models_dir):
             os.makedirs(self.models_dir)
     
-    def train_lstm_model(self, historical_data: pd.DataFrame) -> Dict[str, Any]:
+    @property
+    def scaler(self):
+        if self._scaler is None:
+            from sklearn.preprocessing import StandardScaler
+            self._scaler = StandardScaler()
+        return self._scaler
+    
+    def train_lstm_model(self, historical_data: pd.DataFrame, building_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Train LSTM model for time series prediction
         In a real implementation, this would use TensorFlow/Keras
@@ -44,12 +61,13 @@ class BuildingAIModels:
             "model_type": "LSTM",
             "features": features,
             "training_samples": len(historical_data),
-            "accuracy": np.random.uniform(0.85, 0.95),
+            "accuracy": float(np.random.uniform(0.85, 0.95)),
             "training_date": datetime.now().isoformat()
         }
         
-        # Save model info
-        joblib.dump(model_info, f"{self.models_dir}/lstm_model_info.pkl")
+        # Save model info (one file per building when training per building)
+        suffix = f"_{building_id}" if building_id else ""
+        joblib.dump(model_info, f"{self.models_dir}/lstm_model_info{suffix}.pkl")
         
         return model_info
     
@@ -111,14 +129,27 @@ class BuildingAIModels:
         if len(building_data) < 10:
             return []
         
-        # Prepare features for anomaly detection
+        iso_forest = self.fit_anomaly_model(building_data)
+        return self.score_anomalies(iso_forest, building_data)
+    
+    def fit_anomaly_model(self, reference_data: pd.DataFrame, contamination: float = 0.1):
+        """
+        Fit an Isolation Forest on reference readings; contamination is the share
+        of the reference treated as outliers, which sets the score threshold
+        """
+        features = ['temperature', 'humidity', 'energy_consumption', 'occupancy']
+        from sklearn.ensemble import IsolationForest
+        iso_forest = IsolationForest(contamination=contamination, random_state=42)
+        iso_forest.fit(reference_data[features].values)
+        return iso_forest
+    
+    def score_anomalies(self, iso_forest, building_data: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Score readings against a fitted Isolation Forest
+        """
         features = ['temperature', 'humidity', 'energy_consumption', 'occupancy']
         X = building_data[features].values
         
-        # Train isolation forest
-        iso_forest = IsolationForest(contamination=0.1, random_state=42)
-        iso_forest.fit(X)
-        
         # Predict anomalies
         anomaly_scores = iso_forest.decision_function(X)
         anomaly_predictions = iso_forest.predict(X)
@@ -146,7 +177,7 @@ class BuildingAIModels:
         
         return anomalies
     
-    def cluster_usage_patterns(self, building_data: pd.DataFrame) -> Dict[str, Any]:
+    def cluster_usage_patterns(self, building_data: pd.DataFrame, n_clusters: int = 3) -> Dict[str, Any]:
         """
         Cluster building usage patterns using K-means
         """
@@ -161,7 +192,8 @@ class BuildingAIModels:
         X_scaled = self.scaler.fit_transform(X)
         
         # Perform clustering
-        n_clusters = min(3, len(building_data) // 3)
+        from sklearn.cluster import KMeans
+        n_clusters = min(n_clusters, len(building_data) // 3)
         kmeans = KMeans(n_clusters=n_clusters, random_state=42)
         cluster_labels = kmeans.fit_predict(X_scaled)
         
@@ -192,6 +224,228 @@ class BuildingAIModels:
             "analysis_date": datetime.now().isoformat()
         }
     
+    def cluster_daily_profiles(
+        self,
+        chunk_source: Callable[[], Iterable[pd.DataFrame]],
+        n_clusters: Optional[int] = None,
+        k_range: Tuple[int, int] = (2, 8),
+        time_budget_seconds: float = 30.0,
+        batch_size: int = 512,
+        sample_size: int = 2000,
+        random_state: int = 42
+    ) -> Dict[str, Any]:
+        """
+        Cluster daily usage profiles with mini-batch K-means.
+        
+        ``chunk_source`` is called once per pass and must return an iterable of
+        DataFrames (``building_id``, ``timestamp`` and the sensor features)
+        ordered by building and timestamp, e.g.
+        ``lambda: BuildingService.stream_sensor_frames(db, ...)``. Raw rows are
+        folded into one profile per building-day (hourly energy and occupancy
+        shape), so memory is bounded by the chunk size, the mini-batch and the
+        k-selection sample rather than by the amount of history.
+        
+        Three passes are made over the stream: fit the scaler and draw a
+        reservoir sample, fit the model incrementally, then assign profiles
+        to clusters. When ``n_clusters`` is not given, k is chosen on the
+        sample by silhouette score, trying values from ``k_range`` until
+        ``time_budget_seconds`` is spent.
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.preprocessing import StandardScaler
+        
+        rng = random.Random(random_state)
+        scaler = StandardScaler()
+        sample: List[np.ndarray] = []
+        n_profiles = 0
+        
+        # Pass 1: scaling statistics and a bounded sample for choosing k
+        for vectors, _ in self._profile_batches(chunk_source(), batch_size):
+            scaler.partial_fit(vectors)
+            for vector in vectors:
+                n_profiles += 1
+                if len(sample) < sample_size:
+                    sample.append(vector)
+                else:
+                    j = rng.randrange(n_profiles)
+                    if j < sample_size:
+                        sample[j] = vector
+        
+        if n_profiles < 10:
+            return {"clusters": [], "patterns": []}
+        
+        sample_scaled = scaler.transform(np.vstack(sample))
+        k, k_selection, initial_centers = self._select_k(
+            sample_scaled, n_clusters, k_range, time_budget_seconds, random_state
+        )
+        
+        # Pass 2: incremental fit, seeded with the centroids found on the sample
+        model = MiniBatchKMeans(
+            n_clusters=k,
+            init=initial_centers,
+            n_init=1,
+            batch_size=batch_size,
+            random_state=random_state
+        )
+        for vectors, _ in self._profile_batches(chunk_source(), max(batch_size, k)):
+            model.partial_fit(scaler.transform(vectors))
+        
+        # Pass 3: assignment and per-cluster summaries
+        hours = 24
+        sizes = np.zeros(k, dtype=np.int64)
+        summary_sums = np.zeros((k, len(PROFILE_SUMMARY_FEATURES)))
+        shape_sums = np.zeros((k, hours))
+        for vectors, summaries in self._profile_batches(chunk_source(), batch_size):
+            labels = model.predict(scaler.transform(vectors))
+            sizes += np.bincount(labels, minlength=k)
+            np.add.at(summary_sums, labels, summaries)
+            np.add.at(shape_sums, labels, vectors[:, :hours])
+        
+        total = int(sizes.sum())
+        cluster_analysis = []
+        for cluster_id in range(k):
+            size = int(sizes[cluster_id])
+            if size == 0:
+                continue
+            means = dict(zip(PROFILE_SUMMARY_FEATURES, (summary_sums[cluster_id] / size).tolist()))
+            cluster_analysis.append({
+                "cluster_id": cluster_id,
+                "size": size,
+                "percentage": round(size / total * 100, 1),
+                "centroid": {
+                    "temperature": round(means['temperature'], 1),
+                    "humidity": round(means['humidity'], 1),
+                    "energy_consumption": round(means['energy_consumption'], 2),
+                    "occupancy": round(means['occupancy'], 1)
+                },
+                "hourly_energy_profile": [round(v, 2) for v in (shape_sums[cluster_id] / size).tolist()],
+                "pattern_type": self._classify_pattern_values(
+                    means['energy_consumption'], means['occupancy']
+                )
+            })
+        
+        return {
+            "clusters": cluster_analysis,
+            "total_patterns": total,
+            "n_clusters": k,
+            "k_selection": k_selection,
+            "analysis_date": datetime.now().isoformat()
+        }
+    
+    def _select_k(
+        self,
+        sample_scaled: np.ndarray,
+        n_clusters: Optional[int],
+        k_range: Tuple[int, int],
+        time_budget_seconds: float,
+        random_state: int
+    ) -> Tuple[int, Dict[str, Any], np.ndarray]:
+        """Pick k on the sample, stopping once the time budget would be exceeded"""
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.metrics import silhouette_score
+        
+        if n_clusters is not None:
+            k = max(1, min(n_clusters, len(sample_scaled)))
+            model = MiniBatchKMeans(n_clusters=k, n_init=3, random_state=random_state).fit(sample_scaled)
+            return k, {"method": "fixed"}, model.cluster_centers_
+        
+        k_min = max(2, k_range[0])
+        k_max = min(k_range[1], len(sample_scaled) - 1)
+        started = time.perf_counter()
+        scores: Dict[int, float] = {}
+        best = None
+        last_duration = 0.0
+        
+        for k in range(k_min, k_max + 1):
+            elapsed = time.perf_counter() - started
+            if scores and elapsed + last_duration > time_budget_seconds:
+                break
+            k_started = time.perf_counter()
+            model = MiniBatchKMeans(n_clusters=k, n_init=3, random_state=random_state).fit(sample_scaled)
+            if len(set(model.labels_)) < 2:
+                last_duration = time.perf_counter() - k_started
+                continue
+            score = silhouette_score(
+                sample_scaled, model.labels_,
+                sample_size=min(len(sample_scaled), 1000), random_state=random_state
+            )
+            scores[k] = round(float(score), 4)
+            if best is None or score > best[1]:
+                best = (k, score, model.cluster_centers_)
+            last_duration = time.perf_counter() - k_started
+        
+        if best is None:
+            model = MiniBatchKMeans(n_clusters=k_min, n_init=3, random_state=random_state).fit(sample_scaled)
+            best = (k_min, None, model.cluster_centers_)
+        
+        return best[0], {
+            "method": "silhouette",
+            "scores": scores,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }, best[2]
+    
+    def _profile_batches(
+        self, chunks: Iterable[pd.DataFrame], batch_size: int
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Group daily profiles into (shape vectors, daily means) mini-batches"""
+        vectors, summaries = [], []
+        for vector, summary in self._iter_daily_profiles(chunks):
+            vectors.append(vector)
+            summaries.append(summary)
+            if len(vectors) >= batch_size:
+                yield np.vstack(vectors), np.vstack(summaries)
+                vectors, summaries = [], []
+        if vectors:
+            yield np.vstack(vectors), np.vstack(summaries)
+    
+    def _iter_daily_profiles(self, chunks: Iterable[pd.DataFrame]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Fold raw rows into one profile per building-day.
+        
+        Rows must arrive ordered by building and timestamp, so every day
+        before the last one seen in a chunk is complete and can be emitted;
+        only that last day is carried over to the next chunk.
+        """
+        n_summary = len(PROFILE_SUMMARY_FEATURES)
+        columns = PROFILE_SUMMARY_FEATURES
+        shape_index = [columns.index(f) for f in PROFILE_SHAPE_FEATURES]
+        pending: Dict[Tuple[Any, Any], Tuple[np.ndarray, np.ndarray]] = {}
+        
+        def emit(sums: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            daily_means = sums.sum(axis=0) / counts.sum()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                hourly = sums[:, shape_index] / counts[:, None]
+            # Hours without readings take the day's mean
+            missing = counts == 0
+            hourly[missing] = daily_means[shape_index]
+            return hourly.T.reshape(-1), daily_means
+        
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            timestamps = pd.to_datetime(chunk['timestamp'])
+            frame = chunk[columns].astype(float)
+            frame['building_id'] = chunk['building_id'].values
+            frame['day'] = timestamps.dt.date.values
+            frame['hour'] = timestamps.dt.hour.values
+            grouped = frame.groupby(['building_id', 'day', 'hour'], sort=False)
+            sums = grouped[columns].sum()
+            counts = grouped.size().reindex(sums.index).values
+            
+            for (building_id, day, hour), row_sums, row_count in zip(sums.index, sums.values, counts):
+                key = (building_id, day)
+                if key not in pending:
+                    # A new key means every other pending day is complete
+                    for done_key in list(pending):
+                        yield emit(*pending.pop(done_key))
+                    pending[key] = (np.zeros((24, n_summary)), np.zeros(24))
+                day_sums, day_counts = pending[key]
+                day_sums[hour] += row_sums
+                day_counts[hour] += row_count
+        
+        for day_sums, day_counts in pending.values():
+            yield emit(day_sums, day_counts)
+    
     def _classify_anomaly_type(self, feature_values: pd.Series) -> str:
         """Classify the type of anomaly based on feature values"""
         temp = feature_values['temperature']
@@ -221,7 +475,10 @@ class BuildingAIModels:
         """Classify the type of usage pattern"""
         avg_energy = cluster_data['energy_consumption'].mean()
         avg_occupancy = cluster_data['occupancy'].mean()
-        
+        return self._classify_pattern_values(avg_energy, avg_occupancy)
+    
+    def _classify_pattern_values(self, avg_energy: float, avg_occupancy: float) -> str:
+        """Classify a usage pattern from its mean energy and occupancy"""
         if avg_energy > 400 and avg_occupancy > 60:
             return "high_activity"
         elif avg_energy < 200 and avg_occupancy < 20:
@@ -0,0 +1,271 @@
+"""
+Bounded alert history with batched persistence
+
+Recent alerts are kept per building in fixed-size ring buffers, so reads
+of the latest alerts are cheap and memory stays flat however long the
+process runs. Alert transitions are also queued for the database and
+written in batches off the event loop:
+
+- open: a row in `anomalies` (confidence 1.0, keyed by alert_id, the alert
+  in feature_values) and an `alert` row in `system_events`
+- close: the anomaly with the alert's alert_id is marked resolved and a
+  second `system_events` row records the closed alert
+
+A batch that fails to write goes back to the front of the queue and is
+retried with exponential backoff, up to ALERT_WRITE_RETRIES attempts.
+
+Each system_events row carries the alert as JSON, so the ring buffers are
+refilled from the database at startup and history survives restarts.
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Any, List, Optional, Deque
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, desc
+
+from validators import RealTimeAlert
+
+load_dotenv()
+
+# History settings
+ALERT_HISTORY_SIZE = int(os.getenv("ALERT_HISTORY_SIZE", "200"))  # alerts kept in memory per building
+ALERT_FLUSH_INTERVAL = float(os.getenv("ALERT_FLUSH_INTERVAL", "2"))  # seconds between database writes
+ALERT_FLUSH_BATCH = int(os.getenv("ALERT_FLUSH_BATCH", "500"))  # pending transitions that trigger an early write
+ALERT_WRITE_QUEUE = int(os.getenv("ALERT_WRITE_QUEUE", "20000"))  # pending transitions kept; oldest dropped beyond
+ALERT_WRITE_RETRIES = int(os.getenv("ALERT_WRITE_RETRIES", "5"))  # attempts per batch before it is dropped
+ALERT_RETRY_MAX_DELAY = float(os.getenv("ALERT_RETRY_MAX_DELAY", "60"))  # seconds, cap on the backoff between attempts
+
+ALERT_EVENT_TYPE = "alert"
+
+class AlertHistory:
+    """Most recent alerts per building, oldest first"""
+    
+    def __init__(self, capacity: int = ALERT_HISTORY_SIZE):
+        self.capacity = capacity
+        self.buildings: Dict[str, Deque[RealTimeAlert]] = {}
+    
+    def append(self, alert: RealTimeAlert):
+        alerts = self.buildings.get(alert.building_id)
+        if alerts is None:
+            alerts = self.buildings[alert.building_id] = deque(maxlen=self.capacity)
+        alerts.append(alert)
+    
+    def recent(self, building_id: str, limit: int = 50) -> List[RealTimeAlert]:
+        alerts = self.buildings.get(building_id)
+        if not alerts or limit <= 0:
+            return []
+        newest_first = list(islice(reversed(alerts), limit))
+        newest_first.reverse()
+        return newest_first
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "buildings": len(self.buildings),
+            "alerts": sum(len(alerts) for alerts in self.buildings.values())
+        }
+
+class AlertWriter:
+    """Queues alert transitions and writes them to the database in batches"""
+    
+    def __init__(self, flush_interval: float = ALERT_FLUSH_INTERVAL, flush_batch: int = ALERT_FLUSH_BATCH,
+                 max_pending: int = ALERT_WRITE_QUEUE, max_attempts: int = ALERT_WRITE_RETRIES,
+                 max_retry_delay: float = ALERT_RETRY_MAX_DELAY):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.max_retry_delay = max_retry_delay
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self.attempts = 0  # failed attempts of the batch at the front of pending
+        self.building_ids: Dict[str, Optional[int]] = {}  # building_id -> buildings.id
+        self.counts = {
+            "submitted": 0, "written": 0, "batches": 0, "dropped": 0, "skipped": 0, "retried": 0, "failed": 0
+        }
+        self.last_error: Optional[str] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def submit(self, alert: RealTimeAlert):
+        """Queue an opened or closed alert; the alert is copied as it is now"""
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft()
+            self.counts["dropped"] += 1
+        self.pending.append(alert.model_dump(mode="json"))
+        self.counts["submitted"] += 1
+        if self._wakeup is not None and len(self.pending) >= self.flush_batch:
+            self._wakeup.set()
+    
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run_forever())
+    
+    async def stop(self):
+        """Stop the background task and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    def retry_delay(self) -> float:
+        """Backoff before the next attempt of a batch that failed"""
+        return min(self.flush_interval * 2 ** self.attempts, self.max_retry_delay)
+    
+    async def run_forever(self):
+        while True:
+            if self.attempts:
+                # Submissions don't cut the backoff short while the database is failing
+                await asyncio.sleep(self.retry_delay())
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    async def flush(self) -> bool:
+        """Write everything pending; False when a batch failed and was put back for a retry"""
+        while self.pending:
+            batch = [self.pending.popleft() for _ in range(min(self.flush_batch, len(self.pending)))]
+            try:
+                await asyncio.to_thread(self.write, batch)
+            except Exception as e:
+                self.attempts += 1
+                self.last_error = str(e)
+                if self.attempts >= self.max_attempts:
+                    self.attempts = 0
+                    self.counts["failed"] += len(batch)
+                    print(f"Alert history write failed {self.max_attempts} times, dropping {len(batch)} alerts: {e}")
+                    continue
+                
+                # Back at the front, in order, so opens are still written before their closes
+                self.pending.extendleft(reversed(batch))
+                self.counts["retried"] += len(batch)
+                print(f"Alert history write failed (attempt {self.attempts} of {self.max_attempts}): {e}")
+                return False
+            self.attempts = 0
+        return True
+    
+    def write(self, batch: List[Dict[str, Any]]):
+        """Write one batch of alert snapshots in a single transaction"""
+        from database import SessionLocal, Anomaly, SystemEvent, Building
+        
+        db = SessionLocal()
+        try:
+            unknown = {alert["building_id"] for alert in batch} - self.building_ids.keys()
+            if unknown:
+                found = dict(db.query(Building.building_id, Building.id).filter(Building.building_id.in_(unknown)).all())
+                for building_id in unknown:
+                    self.building_ids[building_id] = found.get(building_id)
+            
+            anomalies = []
+            events = []
+            written = 0
+            skipped = 0
+            for alert in batch:
+                building_pk = self.building_ids[alert["building_id"]]
+                if building_pk is None:
+                    skipped += 1
+                    continue
+                
+                first_seen = datetime.fromisoformat(alert["first_seen"] or alert["timestamp"])
+                closed = alert["state"] == "closed"
+                if closed:
+                    if anomalies:
+                        # The alert may have opened earlier in this batch
+                        db.bulk_insert_mappings(Anomaly, anomalies)
+                        anomalies = []
+                    closed_at = datetime.fromisoformat(alert["closed_at"])
+                    db.query(Anomaly).filter(
+                        and_(
+                            Anomaly.alert_id == alert["alert_id"],
+                            Anomaly.is_resolved == False
+                        )
+                    ).update({"is_resolved": True, "resolved_at": closed_at}, synchronize_session=False)
+                else:
+                    anomalies.append({
+                        "building_id": building_pk,
+                        "timestamp": first_seen,
+                        "anomaly_type": alert["alert_type"],
+                        "severity": alert["severity"],
+                        "confidence": 1.0,
+                        "description": alert["message"],
+                        "feature_values": json.dumps({
+                            "alert_id": alert["alert_id"],
+                            "sensor_id": alert["sensor_id"],
+                            **(alert["data"] or {})
+                        }, default=str),
+                        "alert_id": alert["alert_id"],
+                        "is_resolved": False
+                    })
+                
+                events.append({
+                    "building_id": building_pk,
+                    "event_type": ALERT_EVENT_TYPE,
+                    "severity": alert["severity"],
+                    "title": f"Alert {alert['state']}: {alert['message']}"[:200],
+                    "description": json.dumps(alert),
+                    "created_at": datetime.fromisoformat(alert["timestamp"]),
+                    "resolved_at": datetime.fromisoformat(alert["closed_at"]) if closed else None
+                })
+                written += 1
+            
+            if anomalies:
+                db.bulk_insert_mappings(Anomaly, anomalies)
+            if events:
+                db.bulk_insert_mappings(SystemEvent, events)
+            db.commit()
+            self.counts["written"] += written
+            self.counts["skipped"] += skipped
+            self.counts["batches"] += 1
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self.pending), **self.counts, "last_error": self.last_error}
+
+def load_alert_history(history: AlertHistory):
+    """Refill the ring buffers from the alert rows in system_events, newest state of each alert"""
+    from database import SessionLocal, SystemEvent, Building
+    
+    db = SessionLocal()
+    try:
+        for building in db.query(Building).all():
+            rows = db.query(SystemEvent.description).filter(
+                and_(
+                    SystemEvent.building_id == building.id,
+                    SystemEvent.event_type == ALERT_EVENT_TYPE
+                )
+            ).order_by(desc(SystemEvent.id)).limit(history.capacity * 2).all()
+            
+            latest: Dict[str, RealTimeAlert] = {}
+            for (description,) in rows:
+                try:
+                    alert = RealTimeAlert.model_validate_json(description)
+                except ValueError:
+                    continue
+                latest.setdefault(alert.alert_id, alert)
+            
+            for alert in sorted(latest.values(), key=lambda a: a.first_seen or a.timestamp)[-history.capacity:]:
+                history.append(alert)
+    finally:
+        db.close()
+
+# Global instance
+alert_writer = AlertWriter()
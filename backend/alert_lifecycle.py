@@ -0,0 +1,159 @@
+"""
+Alert lifecycles for the real-time rules engine
+
+A threshold crossed on every reading used to raise a new alert on every
+reading. Alerts are now stateful per (building, sensor, rule): the first
+firing reading opens an alert, further firing readings are counted on it,
+and it closes once the value is back inside the threshold by the rule's
+hysteresis band. Only transitions are emitted:
+
+- open: first firing reading, or a re-fire after the re-fire interval
+- update: severity escalated, reopened within the re-fire interval, or
+  ALERT_UPDATE_INTERVAL seconds since the alert was last emitted
+- close: value cleared the hysteresis band
+
+Durations are measured on reading timestamps, not wall-clock time.
+"""
+
+import os
+from enum import Enum
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from dotenv import load_dotenv
+
+from validators import RealTimeAlert, AnomalySeverity
+
+load_dotenv()
+
+# Lifecycle settings (seconds)
+ALERT_REFIRE_INTERVAL = float(os.getenv("ALERT_REFIRE_INTERVAL", "300"))
+ALERT_UPDATE_INTERVAL = float(os.getenv("ALERT_UPDATE_INTERVAL", "60"))
+
+# Closed lifecycles are swept after this many closes
+PRUNE_EVERY = 1024
+
+class AlertState(str, Enum):
+    OPEN = "open"
+    CLOSED = "closed"
+
+SEVERITY_RANK = {
+    AnomalySeverity.LOW: 0,
+    AnomalySeverity.MEDIUM: 1,
+    AnomalySeverity.HIGH: 2,
+    AnomalySeverity.CRITICAL: 3
+}
+
+AlertKey = Tuple[str, str, str]  # (building_id, sensor_id, rule)
+
+# Called only for firing readings: returns (alert_type, severity, message, data)
+AlertBuilder = Callable[[], Tuple[str, AnomalySeverity, str, Dict[str, Any]]]
+
+class AlertTracker:
+    """Open and recently closed alerts keyed by (building, sensor, rule)"""
+    
+    def __init__(self, refire_interval: float = ALERT_REFIRE_INTERVAL, update_interval: float = ALERT_UPDATE_INTERVAL):
+        self.refire_interval = refire_interval
+        self.update_interval = update_interval
+        self.open: Dict[AlertKey, RealTimeAlert] = {}
+        self.closed: Dict[AlertKey, RealTimeAlert] = {}
+        self.counts = {"opened": 0, "updated": 0, "reopened": 0, "closed": 0, "suppressed": 0}
+    
+    def observe(
+        self,
+        building_id: str,
+        sensor_id: str,
+        rule: str,
+        timestamp,
+        value: Optional[float],
+        firing: bool,
+        cleared: bool,
+        build: AlertBuilder
+    ) -> Optional[RealTimeAlert]:
+        """Feed one reading's outcome for a rule; returns the alert when it should be emitted"""
+        key = (building_id, sensor_id, rule)
+        alert = self.open.get(key)
+        
+        if firing:
+            alert_type, severity, message, details = build()
+            if alert is None:
+                alert = self._reopen(key, timestamp)
+                if alert is None:
+                    return self._open(key, timestamp, alert_type, severity, message, details)
+                reopened = True
+            else:
+                reopened = False
+            
+            escalated = SEVERITY_RANK[severity] > SEVERITY_RANK[alert.severity]
+            alert.occurrences += 1
+            alert.last_seen = timestamp
+            alert.message = message
+            alert.data = details
+            if escalated:
+                alert.severity = severity
+            
+            if reopened or escalated or (timestamp - alert.timestamp).total_seconds() >= self.update_interval:
+                alert.timestamp = timestamp
+                self.counts["updated"] += 1
+                return alert
+            self.counts["suppressed"] += 1
+            return None
+        
+        if alert is not None and cleared:
+            return self._close(key, alert, timestamp, value)
+        return None
+    
+    def _open(self, key: AlertKey, timestamp, alert_type: str, severity: AnomalySeverity,
+              message: str, details: Dict[str, Any]) -> RealTimeAlert:
+        building_id, sensor_id, rule = key
+        alert = RealTimeAlert(
+            alert_id=f"{rule}_{building_id}_{sensor_id}_{int(timestamp.timestamp() * 1000)}",
+            building_id=building_id,
+            sensor_id=sensor_id,
+            alert_type=alert_type,
+            severity=severity,
+            message=message,
+            timestamp=timestamp,
+            data=details,
+            state=AlertState.OPEN.value,
+            occurrences=1,
+            first_seen=timestamp,
+            last_seen=timestamp
+        )
+        self.open[key] = alert
+        self.counts["opened"] += 1
+        return alert
+    
+    def _reopen(self, key: AlertKey, timestamp) -> Optional[RealTimeAlert]:
+        """Resume a lifecycle that closed less than the re-fire interval ago"""
+        alert = self.closed.pop(key, None)
+        if alert is None or (timestamp - alert.closed_at).total_seconds() >= self.refire_interval:
+            return None
+        alert.state = AlertState.OPEN.value
+        alert.closed_at = None
+        self.open[key] = alert
+        self.counts["reopened"] += 1
+        return alert
+    
+    def _close(self, key: AlertKey, alert: RealTimeAlert, timestamp, value: Optional[float]) -> RealTimeAlert:
+        del self.open[key]
+        alert.state = AlertState.CLOSED.value
+        alert.closed_at = timestamp
+        alert.timestamp = timestamp
+        alert.data = {**(alert.data or {}), "resolved_value": value}
+        self.closed[key] = alert
+        self.counts["closed"] += 1
+        if self.counts["closed"] % PRUNE_EVERY == 0:
+            self._prune(timestamp)
+        return alert
+    
+    def _prune(self, now):
+        expired = [key for key, alert in self.closed.items()
+                   if (now - alert.closed_at).total_seconds() >= self.refire_interval]
+        for key in expired:
+            del self.closed[key]
+    
+    def get_open_alerts(self, building_id: str) -> List[RealTimeAlert]:
+        return [alert for (alert_building, _, _), alert in self.open.items() if alert_building == building_id]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"open": len(self.open), "recently_closed": len(self.closed), **self.counts}
@@ -0,0 +1,343 @@
+"""
+Embedded columnar analytics over sensor history
+
+Portfolio reports (aggregates, percentiles and period comparisons across
+many buildings and months) run in an embedded DuckDB engine over Parquet
+files instead of row by row through the ORM. The engine reads local files
+only, so it runs fully offline:
+- the cold archive under ARCHIVE_DIR (building_id=.../month=.../part-*.parquet)
+- a snapshot of the readings still in sensor_data, written by sync() to
+  ANALYTICS_DIR; readings archived after the last sync are counted once
+
+Set ANALYTICS_SOURCE (or --source) to a Parquet file or glob, such as an
+export from GET /api/export/sensor-data, to query that instead.
+
+Every query opens its own in-memory connection, so calls are safe from
+worker threads. Needs duckdb; sync() also needs pyarrow.
+
+    python3 analytics_engine.py sync
+    python3 analytics_engine.py summary --start 2025-01-01 --end 2026-01-01
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from archive import ARCHIVE_DIR
+from export import EXPORT_COLUMNS, export_sensor_data
+from lazy_imports import LazyModule
+
+duckdb = LazyModule("duckdb")
+
+load_dotenv()
+
+# Analytics engine settings
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics"))
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "")  # Parquet file or glob replacing archive + snapshot
+ANALYTICS_SYNC_INTERVAL = float(os.getenv("ANALYTICS_SYNC_INTERVAL", "0"))  # seconds, 0 disables the in-app sync
+
+ANALYTICS_METRICS = [
+    "temperature", "humidity", "energy_consumption", "occupancy",
+    "air_quality", "hvac_efficiency", "lighting_efficiency"
+]
+ROLLUP_BUCKETS = ("day", "week", "month")
+DEFAULT_PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+
+# Column types of an empty readings relation, when no files exist yet
+_SQL_TYPES = {
+    "building_id": "VARCHAR",
+    "timestamp": "TIMESTAMP",
+    "occupancy": "INTEGER",
+    "hvac_status": "VARCHAR",
+    "lighting_status": "VARCHAR"
+}
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+class AnalyticsEngine:
+    """Aggregate, percentile and comparison queries over Parquet sensor history"""
+    
+    def __init__(self, archive_dir: str = ARCHIVE_DIR, data_dir: str = ANALYTICS_DIR,
+                 source: Optional[str] = ANALYTICS_SOURCE or None):
+        self.archive_dir = archive_dir
+        self.data_dir = data_dir
+        self.source = source
+        self.snapshot_path = os.path.join(data_dir, "sensor_data.parquet")
+        self.last_sync: Optional[Dict[str, Any]] = None
+    
+    def _archive_glob(self) -> str:
+        # Archive files being written are dot-prefixed and don't match
+        return os.path.join(self.archive_dir, "building_id=*", "month=*", "part-*.parquet")
+    
+    def _readings_sql(self) -> str:
+        """SELECT producing EXPORT_COLUMNS over the files that exist right now"""
+        columns = ", ".join(EXPORT_COLUMNS)
+        if self.source:
+            return f"SELECT {columns} FROM read_parquet({_literal(self.source)})"
+        
+        archive = f"SELECT {columns} FROM read_parquet({_literal(self._archive_glob())}, hive_partitioning = true)"
+        snapshot = f"SELECT {columns} FROM read_parquet({_literal(self.snapshot_path)})"
+        has_archive = bool(glob.glob(self._archive_glob()))
+        has_snapshot = os.path.exists(self.snapshot_path)
+        
+        if has_archive and has_snapshot:
+            # Readings archived since the last sync are in both; only the overlap is joined
+            return f"""
+                {archive}
+                UNION ALL
+                SELECT {columns} FROM ({snapshot}) AS hot ANTI JOIN (
+                    SELECT building_id, timestamp FROM ({archive}) AS cold
+                    WHERE timestamp >= (SELECT min(timestamp) FROM ({snapshot}) AS first_hot)
+                ) AS archived USING (building_id, timestamp)
+            """
+        if has_archive:
+            return archive
+        if has_snapshot:
+            return snapshot
+        empty = ", ".join(f"CAST(NULL AS {_SQL_TYPES.get(column, 'DOUBLE')}) AS {column}" for column in EXPORT_COLUMNS)
+        return f"SELECT {empty} WHERE false"
+    
+    @staticmethod
+    def _filters(building_ids: Optional[List[str]], start_time: Optional[datetime],
+                 end_time: Optional[datetime]) -> Tuple[str, list]:
+        """WHERE clause and parameters; start inclusive, end exclusive"""
+        conditions = ["true"]
+        params: list = []
+        if building_ids is not None:
+            if not building_ids:
+                conditions.append("false")
+            else:
+                conditions.append(f"building_id IN ({', '.join('?' for _ in building_ids)})")
+                params.extend(building_ids)
+        if start_time:
+            conditions.append("timestamp >= ?")
+            params.append(start_time)
+        if end_time:
+            conditions.append("timestamp < ?")
+            params.append(end_time)
+        return " AND ".join(conditions), params
+    
+    def _query(self, sql: str, params: list) -> List[Dict[str, Any]]:
+        connection = duckdb.connect()
+        try:
+            cursor = connection.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            connection.close()
+    
+    def summary(self, building_ids: Optional[List[str]] = None, start_time: Optional[datetime] = None,
+                end_time: Optional[datetime] = None) -> Dict[str, Any]:
+        """Per-building aggregates plus a portfolio-wide row"""
+        where, params = self._filters(building_ids, start_time, end_time)
+        rows = self._query(f"""
+            SELECT
+                building_id,
+                count(*) AS readings,
+                min(timestamp) AS first_reading,
+                max(timestamp) AS last_reading,
+                round(avg(temperature), 2) AS avg_temperature,
+                round(avg(humidity), 2) AS avg_humidity,
+                round(sum(energy_consumption), 2) AS total_energy_consumption,
+                round(avg(energy_consumption), 2) AS avg_energy_consumption,
+                round(quantile_cont(energy_consumption, 0.95), 2) AS p95_energy_consumption,
+                round(max(energy_consumption), 2) AS peak_energy_consumption,
+                round(avg(occupancy), 1) AS avg_occupancy,
+                max(occupancy) AS peak_occupancy
+            FROM ({self._readings_sql()}) AS readings
+            WHERE {where}
+            GROUP BY GROUPING SETS ((building_id), ())
+            ORDER BY building_id NULLS LAST
+        """, params)
+        
+        portfolio = rows.pop()
+        portfolio.pop("building_id")
+        return {"buildings": rows, "portfolio": portfolio}
+    
+    def percentiles(self, metric: str = "energy_consumption", percentiles: Optional[List[float]] = None,
+                    building_ids: Optional[List[str]] = None, start_time: Optional[datetime] = None,
+                    end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Distribution of one metric per building"""
+        if metric not in ANALYTICS_METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of: {', '.join(ANALYTICS_METRICS)}")
+        percentiles = percentiles or DEFAULT_PERCENTILES
+        if any(not 0 <= p <= 1 for p in percentiles):
+            raise ValueError("Percentiles must be between 0 and 1")
+        
+        where, params = self._filters(building_ids, start_time, end_time)
+        rows = self._query(f"""
+            SELECT
+                building_id,
+                count({metric}) AS readings,
+                min({metric}) AS min,
+                round(avg({metric}), 2) AS mean,
+                max({metric}) AS max,
+                quantile_cont({metric}, ?) AS quantiles
+            FROM ({self._readings_sql()}) AS readings
+            WHERE {where}
+            GROUP BY building_id
+            ORDER BY building_id
+        """, [list(percentiles), *params])
+        
+        for row in rows:
+            values = row.pop("quantiles") or [None] * len(percentiles)
+            row["percentiles"] = {
+                f"p{p * 100:g}": round(value, 2) if value is not None else None
+                for p, value in zip(percentiles, values)
+            }
+        return rows
+    
+    def rollup(self, bucket: str = "month", building_ids: Optional[List[str]] = None,
+               start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Per-building aggregates for each day, week or month"""
+        if bucket not in ROLLUP_BUCKETS:
+            raise ValueError(f"Unknown bucket '{bucket}', expected one of: {', '.join(ROLLUP_BUCKETS)}")
+        
+        where, params = self._filters(building_ids, start_time, end_time)
+        return self._query(f"""
+            SELECT
+                building_id,
+                date_trunc('{bucket}', timestamp) AS period,
+                count(*) AS readings,
+                round(avg(temperature), 2) AS avg_temperature,
+                round(sum(energy_consumption), 2) AS total_energy_consumption,
+                round(max(energy_consumption), 2) AS peak_energy_consumption,
+                round(avg(occupancy), 1) AS avg_occupancy
+            FROM ({self._readings_sql()}) AS readings
+            WHERE {where}
+            GROUP BY building_id, period
+            ORDER BY building_id, period
+        """, params)
+    
+    def compare(self, baseline_start: datetime, baseline_end: datetime, start_time: datetime, end_time: datetime,
+                building_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Each building's current period against a baseline, largest energy increase first
+        
+        The change is in average energy per reading, so periods of different
+        length or with gaps in the data compare fairly.
+        """
+        if baseline_start >= baseline_end or start_time >= end_time:
+            raise ValueError("Each period must start before it ends")
+        
+        where, params = self._filters(building_ids, None, None)
+        return self._query(f"""
+            WITH periods AS (
+                SELECT
+                    building_id, temperature, energy_consumption, occupancy,
+                    timestamp >= ? AND timestamp < ? AS is_current
+                FROM ({self._readings_sql()}) AS readings
+                WHERE {where}
+                    AND ((timestamp >= ? AND timestamp < ?) OR (timestamp >= ? AND timestamp < ?))
+            ),
+            totals AS (
+                SELECT
+                    building_id,
+                    count(*) FILTER (WHERE NOT is_current) AS baseline_readings,
+                    round(sum(energy_consumption) FILTER (WHERE NOT is_current), 2) AS baseline_energy_consumption,
+                    avg(energy_consumption) FILTER (WHERE NOT is_current) AS baseline_avg_energy,
+                    round(avg(temperature) FILTER (WHERE NOT is_current), 2) AS baseline_avg_temperature,
+                    round(avg(occupancy) FILTER (WHERE NOT is_current), 1) AS baseline_avg_occupancy,
+                    count(*) FILTER (WHERE is_current) AS current_readings,
+                    round(sum(energy_consumption) FILTER (WHERE is_current), 2) AS current_energy_consumption,
+                    avg(energy_consumption) FILTER (WHERE is_current) AS current_avg_energy,
+                    round(avg(temperature) FILTER (WHERE is_current), 2) AS current_avg_temperature,
+                    round(avg(occupancy) FILTER (WHERE is_current), 1) AS current_avg_occupancy
+                FROM periods
+                GROUP BY building_id
+            )
+            SELECT
+                * EXCLUDE (baseline_avg_energy, current_avg_energy),
+                round((current_avg_energy - baseline_avg_energy) / baseline_avg_energy * 100, 1) AS energy_change_pct
+            FROM totals
+            ORDER BY energy_change_pct DESC NULLS LAST, building_id
+        """, [start_time, end_time, *params, baseline_start, baseline_end, start_time, end_time])
+    
+    def sync(self) -> Dict[str, Any]:
+        """Snapshot the readings still in sensor_data to ANALYTICS_DIR"""
+        started = datetime.now()
+        os.makedirs(self.data_dir, exist_ok=True)
+        temporary = os.path.join(self.data_dir, ".sensor_data.parquet")
+        
+        db = SessionLocal()
+        try:
+            result = export_sensor_data(db, temporary, include_archive=False)
+        finally:
+            db.close()
+        # Queries in flight keep reading the previous snapshot
+        os.replace(temporary, self.snapshot_path)
+        
+        self.last_sync = {
+            "started_at": started.isoformat(),
+            "rows": result["rows"],
+            "bytes": result["bytes"],
+            "duration_seconds": round((datetime.now() - started).total_seconds(), 3)
+        }
+        return self.last_sync
+    
+    async def run_forever(self, interval: float):
+        """Refresh the snapshot off the event loop, sleeping ``interval`` seconds between syncs"""
+        while True:
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception as e:
+                print(f"Analytics sync failed: {e}")
+            await asyncio.sleep(interval)
+    
+    def stats(self) -> Dict[str, Any]:
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            snapshot = {
+                "path": self.snapshot_path,
+                "bytes": os.path.getsize(self.snapshot_path),
+                "modified_at": datetime.fromtimestamp(os.path.getmtime(self.snapshot_path)).isoformat()
+            }
+        return {
+            "source": self.source,
+            "archive_files": len(glob.glob(self._archive_glob())),
+            "snapshot": snapshot,
+            "last_sync": self.last_sync
+        }
+
+# Global instance
+analytics_engine = AnalyticsEngine()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Portfolio analytics over Parquet sensor history")
+    parser.add_argument("report", choices=["sync", "stats", "summary", "percentiles", "rollup", "compare"])
+    parser.add_argument("--buildings", nargs="*", help="building ids (default: all)")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="first timestamp, inclusive")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="last timestamp, exclusive")
+    parser.add_argument("--baseline-start", type=datetime.fromisoformat, help="compare: baseline period start")
+    parser.add_argument("--baseline-end", type=datetime.fromisoformat, help="compare: baseline period end")
+    parser.add_argument("--metric", default="energy_consumption", choices=ANALYTICS_METRICS)
+    parser.add_argument("--bucket", default="month", choices=ROLLUP_BUCKETS)
+    parser.add_argument("--source", help="Parquet file or glob to query instead of archive + snapshot")
+    args = parser.parse_args()
+    
+    if args.source:
+        analytics_engine.source = args.source
+    
+    if args.report == "sync":
+        result = analytics_engine.sync()
+    elif args.report == "stats":
+        result = analytics_engine.stats()
+    elif args.report == "summary":
+        result = analytics_engine.summary(args.buildings, args.start, args.end)
+    elif args.report == "percentiles":
+        result = analytics_engine.percentiles(args.metric, None, args.buildings, args.start, args.end)
+    elif args.report == "rollup":
+        result = analytics_engine.rollup(args.bucket, args.buildings, args.start, args.end)
+    else:
+        if not (args.baseline_start and args.baseline_end and args.start and args.end):
+            parser.error("compare needs --baseline-start, --baseline-end, --start and --end")
+        result = analytics_engine.compare(args.baseline_start, args.baseline_end, args.start, args.end,
+                                          args.buildings)
+    print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,218 @@
+"""
+Background anomaly scanner for stored sensor data
+
+Each cycle scores only the SensorData rows added since the last cycle.
+Progress is kept per building as a high-water mark on SensorData.id in the
+scan_watermarks table. The mark is committed in the same transaction as the
+anomalies it produced, so a restarted scanner resumes where it stopped
+without rescanning or duplicating findings.
+
+New rows are scored against an Isolation Forest fit on the building's
+already scanned history (the last ANOMALY_SCAN_REFERENCE_ROWS rows before
+the mark), refit after that many more rows have been scanned. A row is
+flagged only when it is as unusual as the most extreme
+ANOMALY_SCAN_CONTAMINATION share of that history, so quiet data produces few
+findings. Until a building has ANOMALY_SCAN_MIN_REFERENCE_ROWS of scanned
+history, the model is fit on that history plus the chunk being scored.
+"""
+
+import asyncio
+import os
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, desc
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Building, SensorData, ScanWatermark
+from services import AnomalyService
+from ai_models import ai_models
+from lazy_imports import LazyModule
+
+pd = LazyModule("pandas")
+
+load_dotenv()
+
+# Scanner settings
+ANOMALY_SCAN_INTERVAL = float(os.getenv("ANOMALY_SCAN_INTERVAL", "0"))  # seconds, 0 disables the in-app scanner
+ANOMALY_SCAN_CHUNK_SIZE = int(os.getenv("ANOMALY_SCAN_CHUNK_SIZE", "5000"))
+ANOMALY_SCAN_LOOKBACK_HOURS = os.getenv("ANOMALY_SCAN_LOOKBACK_HOURS")  # first scan of a building; unset = all history
+ANOMALY_SCAN_REFERENCE_ROWS = int(os.getenv("ANOMALY_SCAN_REFERENCE_ROWS", "5000"))  # scanned history the model is fit on
+ANOMALY_SCAN_MIN_REFERENCE_ROWS = int(os.getenv("ANOMALY_SCAN_MIN_REFERENCE_ROWS", "500"))
+ANOMALY_SCAN_CONTAMINATION = float(os.getenv("ANOMALY_SCAN_CONTAMINATION", "0.01"))  # outlier share of the reference
+
+SCAN_FEATURES = ['temperature', 'humidity', 'energy_consumption', 'occupancy']
+SCAN_COLUMNS = [
+    SensorData.id,
+    SensorData.timestamp,
+    SensorData.temperature,
+    SensorData.humidity,
+    SensorData.energy_consumption,
+    SensorData.occupancy
+]
+
+class AnomalyScanner:
+    """Scores new sensor rows in chunks and stores the anomalies found"""
+
+    def __init__(
+        self,
+        name: str = "isolation_forest",
+        chunk_size: int = ANOMALY_SCAN_CHUNK_SIZE,
+        min_rows: int = 10,
+        lookback_hours: Optional[float] = None,
+        reference_rows: int = ANOMALY_SCAN_REFERENCE_ROWS,
+        min_reference_rows: int = ANOMALY_SCAN_MIN_REFERENCE_ROWS,
+        contamination: float = ANOMALY_SCAN_CONTAMINATION
+    ):
+        self.name = name
+        self.chunk_size = chunk_size
+        # Smaller tails wait for the next cycle
+        self.min_rows = min_rows
+        self.lookback_hours = lookback_hours
+        self.reference_rows = reference_rows
+        self.min_reference_rows = min_reference_rows
+        self.contamination = contamination
+        # buildings.id -> {"model": fitted forest, "scanned": rows scanned since it was fit}
+        self.models: Dict[int, Dict[str, Any]] = {}
+        self.last_cycle: Optional[Dict[str, Any]] = None
+
+    def _get_watermark(self, db: Session, building: Building) -> ScanWatermark:
+        watermark = db.query(ScanWatermark).filter(
+            and_(
+                ScanWatermark.scanner == self.name,
+                ScanWatermark.building_id == building.id
+            )
+        ).first()
+        if watermark:
+            return watermark
+
+        start_id = 0
+        if self.lookback_hours is not None:
+            cutoff = datetime.now() - timedelta(hours=self.lookback_hours)
+            first_id = db.query(SensorData.id).filter(
+                and_(
+                    SensorData.building_id == building.id,
+                    SensorData.timestamp >= cutoff
+                )
+            ).order_by(SensorData.id).limit(1).scalar()
+            if first_id is not None:
+                start_id = first_id - 1
+
+        watermark = ScanWatermark(scanner=self.name, building_id=building.id, last_sensor_data_id=start_id)
+        db.add(watermark)
+        db.commit()
+        return watermark
+
+    def _reference_model(self, db: Session, building: Building, watermark: ScanWatermark, chunk: "pd.DataFrame"):
+        """Model fit on the building's scanned history, refit every reference_rows scanned rows"""
+        cached = self.models.get(building.id)
+        if cached and cached["scanned"] < self.reference_rows:
+            return cached["model"]
+
+        rows = db.query(*SCAN_COLUMNS).filter(
+            and_(
+                SensorData.building_id == building.id,
+                SensorData.id <= watermark.last_sensor_data_id
+            )
+        ).order_by(desc(SensorData.id)).limit(self.reference_rows).all()
+        reference = pd.DataFrame.from_records(rows, columns=['id', 'timestamp'] + SCAN_FEATURES)
+
+        if len(reference) < self.min_reference_rows:
+            # Not enough history yet; the chunk fills in and the model is refit next time
+            self.models.pop(building.id, None)
+            return ai_models.fit_anomaly_model(pd.concat([reference, chunk]), self.contamination)
+
+        model = ai_models.fit_anomaly_model(reference, self.contamination)
+        self.models[building.id] = {"model": model, "scanned": 0}
+        return model
+
+    def scan_building(self, db: Session, building: Building) -> Dict[str, Any]:
+        """Score every complete chunk of new rows for one building"""
+        watermark = self._get_watermark(db, building)
+        rows_scanned = 0
+        anomalies_found = 0
+
+        while True:
+            rows = db.query(*SCAN_COLUMNS).filter(
+                and_(
+                    SensorData.building_id == building.id,
+                    SensorData.id > watermark.last_sensor_data_id
+                )
+            ).order_by(SensorData.id).limit(self.chunk_size).all()
+
+            if len(rows) < self.min_rows:
+                break
+
+            chunk = pd.DataFrame.from_records(rows, columns=['id', 'timestamp'] + SCAN_FEATURES)
+            model = self._reference_model(db, building, watermark, chunk)
+            anomalies = ai_models.score_anomalies(model, chunk)
+            anomalies_found += AnomalyService.create_anomalies(db, building.building_id, anomalies, commit=False)
+
+            # Advance the mark in the same transaction as the findings
+            watermark.last_sensor_data_id = rows[-1].id
+            watermark.last_timestamp = rows[-1].timestamp
+            db.commit()
+            rows_scanned += len(rows)
+            if building.id in self.models:
+                self.models[building.id]["scanned"] += len(rows)
+
+            if len(rows) < self.chunk_size:
+                break
+
+        return {
+            "rows_scanned": rows_scanned,
+            "anomalies_found": anomalies_found,
+            "last_sensor_data_id": watermark.last_sensor_data_id,
+            "last_timestamp": watermark.last_timestamp.isoformat() if watermark.last_timestamp else None
+        }
+
+    def run_cycle(self) -> Dict[str, Any]:
+        """Scan all active buildings once"""
+        started = datetime.now()
+        db = SessionLocal()
+        try:
+            buildings = db.query(Building).filter(Building.is_active == True).all()
+            results = {}
+            for building in buildings:
+                try:
+                    results[building.building_id] = self.scan_building(db, building)
+                except Exception as e:
+                    db.rollback()
+                    results[building.building_id] = {"error": str(e)}
+        finally:
+            db.close()
+
+        self.last_cycle = {
+            "started_at": started.isoformat(),
+            "duration_seconds": round((datetime.now() - started).total_seconds(), 3),
+            "buildings": results
+        }
+        return self.last_cycle
+
+    async def run_forever(self, interval: float):
+        """Run cycles off the event loop, sleeping ``interval`` seconds between them"""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_cycle)
+            except Exception as e:
+                print(f"Anomaly scan cycle failed: {e}")
+            await asyncio.sleep(interval)
+
+# Global instance
+anomaly_scanner = AnomalyScanner(
+    lookback_hours=float(ANOMALY_SCAN_LOOKBACK_HOURS) if ANOMALY_SCAN_LOOKBACK_HOURS else None
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously scan stored sensor data for anomalies")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    parser.add_argument("--interval", type=float, default=ANOMALY_SCAN_INTERVAL or 60.0,
+                        help="seconds between cycles")
+    args = parser.parse_args()
+
+    if args.once:
+        print(anomaly_scanner.run_cycle())
+    else:
+        asyncio.run(anomaly_scanner.run_forever(args.interval))
@@ -0,0 +1,270 @@
+"""
+Cold-tier Parquet archive of raw sensor readings
+
+Readings older than ARCHIVE_AFTER_DAYS move out of the sensor_data table
+into Parquet files partitioned by building and month:
+
+    ARCHIVE_DIR/building_id=building_a/month=2024-03/part-<run>-<id>.parquet
+
+Each (building, month) is archived on its own: the rows are written to a
+new part file that is renamed into place once complete, and only then
+deleted from the table, up to the highest id written. Readings arriving
+late for an archived month stay in the table until the next run adds
+another part file, so nothing is deleted without being archived.
+
+BuildingService reads merge hot rows from the database with the archive.
+Only partitions overlapping the requested window are opened, only the
+requested columns are read, and the time filter is pushed down to the
+Parquet row-group statistics.
+"""
+
+import argparse
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Building, SensorData
+from export import EXPORT_COLUMNS, EXPORT_COMPRESSION, naive_local, sensor_schema, record_batch
+from lazy_imports import LazyModule
+from services import SENSOR_DATA_FIELDS
+
+pa = LazyModule("pyarrow")
+pc = LazyModule("pyarrow.compute")
+ds = LazyModule("pyarrow.dataset")
+pq = LazyModule("pyarrow.parquet")
+
+load_dotenv()
+
+# Archive settings
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))  # raw readings older than this are archived
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "0"))  # seconds between runs, 0 disables the in-app job
+
+# Per-day rollup of archived readings, in the order BuildingService merges them
+DAILY_AGGREGATES = [
+    ("temperature", "count"),
+    ("temperature", "sum"),
+    ("humidity", "sum"),
+    ("energy_consumption", "sum"),
+    ("energy_consumption", "max"),
+    ("occupancy", "sum"),
+    ("occupancy", "max")
+]
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+class SensorArchive:
+    """Archived readings on local disk, partitioned by building and month"""
+    
+    def __init__(self, root: str = ARCHIVE_DIR, older_than_days: int = ARCHIVE_AFTER_DAYS):
+        self.root = root
+        self.older_than_days = older_than_days
+        self.last_run: Optional[Dict[str, Any]] = None
+    
+    def _building_dir(self, building_id: str) -> str:
+        return os.path.join(self.root, f"building_id={building_id}")
+    
+    def building_ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(name.split("=", 1)[1] for name in names if name.startswith("building_id="))
+    
+    def partitions(self, building_id: str, start_time: Optional[datetime] = None,
+                   end_time: Optional[datetime] = None) -> List[Tuple[datetime, str]]:
+        """(month, directory) of partitions overlapping [start_time, end_time], oldest first"""
+        start_time, end_time = naive_local(start_time), naive_local(end_time)
+        building_dir = self._building_dir(building_id)
+        try:
+            names = os.listdir(building_dir)
+        except FileNotFoundError:
+            return []
+        
+        found = []
+        for name in names:
+            if not name.startswith("month="):
+                continue
+            month = datetime.strptime(name[len("month="):], "%Y-%m")
+            if start_time is not None and _next_month(month) <= start_time:
+                continue
+            if end_time is not None and month > end_time:
+                continue
+            found.append((month, os.path.join(building_dir, name)))
+        return sorted(found)
+    
+    def _read(self, directory: str, columns: List[str], start_time: Optional[datetime],
+              end_time: Optional[datetime]):
+        """One partition's rows in the window, sorted by timestamp"""
+        start_time, end_time = naive_local(start_time), naive_local(end_time)
+        timestamp = ds.field("timestamp")
+        condition = None
+        if start_time is not None:
+            condition = timestamp >= pa.scalar(start_time, pa.timestamp("us"))
+        if end_time is not None:
+            upper = timestamp <= pa.scalar(end_time, pa.timestamp("us"))
+            condition = upper if condition is None else condition & upper
+        
+        # Files being written are dot-prefixed, which the dataset skips
+        dataset = ds.dataset(directory, format="parquet")
+        read_columns = columns if "timestamp" in columns else [*columns, "timestamp"]
+        return dataset.to_table(columns=read_columns, filter=condition).sort_by("timestamp")
+    
+    def iter_rows(self, building_id: str, start_time: Optional[datetime] = None,
+                  end_time: Optional[datetime] = None, columns: Optional[List[str]] = None) -> Iterator[tuple]:
+        """Archived rows of a building in timestamp order, holding one partition in memory at a time"""
+        columns = columns or EXPORT_COLUMNS
+        for _, directory in self.partitions(building_id, start_time, end_time):
+            table = self._read(directory, columns, start_time, end_time)
+            yield from zip(*(table.column(name).to_pylist() for name in columns))
+    
+    def daily_aggregates(self, building_id: str, start_time: Optional[datetime] = None) -> Dict[str, list]:
+        """Per-day values of DAILY_AGGREGATES for archived readings since ``start_time``"""
+        columns = ["timestamp", "temperature", "humidity", "energy_consumption", "occupancy"]
+        days: Dict[str, list] = {}
+        for _, directory in self.partitions(building_id, start_time):
+            table = self._read(directory, columns, start_time, None)
+            if table.num_rows == 0:
+                continue
+            table = table.append_column("day", pc.cast(table["timestamp"], pa.date32()))
+            grouped = table.group_by("day").aggregate(DAILY_AGGREGATES)
+            names = [f"{column}_{aggregate}" for column, aggregate in DAILY_AGGREGATES]
+            # Days never span partitions; part files of one partition are grouped together
+            for day, *values in zip(grouped["day"].to_pylist(), *(grouped[name].to_pylist() for name in names)):
+                days[str(day)] = values
+        return days
+    
+    def _write_part(self, building_id: str, month: datetime, rows: List[tuple], run_id: str) -> str:
+        directory = os.path.join(self._building_dir(building_id), f"month={month:%Y-%m}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{run_id}-{uuid.uuid4().hex[:8]}.parquet"
+        temporary = os.path.join(directory, f".{name}")
+        
+        schema = sensor_schema()
+        pq.write_table(pa.Table.from_batches([record_batch(rows, schema)]), temporary, compression=EXPORT_COMPRESSION)
+        path = os.path.join(directory, name)
+        os.replace(temporary, path)
+        return path
+    
+    def archive_building(self, db: Session, building: Building, cutoff: datetime, run_id: str) -> Dict[str, Any]:
+        """Move the building's readings older than ``cutoff`` to the archive, one month at a time"""
+        oldest = db.query(func.min(SensorData.timestamp)).filter(
+            and_(
+                SensorData.building_id == building.id,
+                SensorData.timestamp < cutoff
+            )
+        ).scalar()
+        
+        archived = 0
+        files = 0
+        month = _month_start(oldest) if oldest else cutoff
+        while month < cutoff:
+            window = and_(
+                SensorData.building_id == building.id,
+                SensorData.timestamp >= month,
+                SensorData.timestamp < min(_next_month(month), cutoff)
+            )
+            rows = db.query(
+                SensorData.id,
+                SensorData.timestamp,
+                *(getattr(SensorData, field) for field in SENSOR_DATA_FIELDS)
+            ).filter(window).order_by(SensorData.timestamp).all()
+            
+            if rows:
+                self._write_part(building.building_id, month, [(building.building_id, *row[1:]) for row in rows], run_id)
+                # Rows inserted after the read have higher ids and wait for the next run
+                max_id = max(row[0] for row in rows)
+                db.query(SensorData).filter(and_(window, SensorData.id <= max_id)).delete(synchronize_session=False)
+                db.commit()
+                archived += len(rows)
+                files += 1
+            month = _next_month(month)
+        
+        return {"rows": archived, "files": files}
+    
+    def run(self, older_than_days: Optional[int] = None) -> Dict[str, Any]:
+        """Archive every building's readings older than ``older_than_days`` (whole days)"""
+        started = datetime.now()
+        days = self.older_than_days if older_than_days is None else older_than_days
+        cutoff = (started - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        run_id = f"{started:%Y%m%d%H%M%S}"
+        
+        db = SessionLocal()
+        try:
+            results = {}
+            for building in db.query(Building).all():
+                try:
+                    results[building.building_id] = self.archive_building(db, building, cutoff, run_id)
+                except Exception as e:
+                    db.rollback()
+                    results[building.building_id] = {"error": str(e)}
+        finally:
+            db.close()
+        
+        self.last_run = {
+            "started_at": started.isoformat(),
+            "cutoff": cutoff.isoformat(),
+            "duration_seconds": round((datetime.now() - started).total_seconds(), 3),
+            "buildings": results
+        }
+        return self.last_run
+    
+    async def run_forever(self, interval: float):
+        """Run retention off the event loop, sleeping ``interval`` seconds between runs"""
+        while True:
+            try:
+                await asyncio.to_thread(self.run)
+            except Exception as e:
+                print(f"Archive run failed: {e}")
+            await asyncio.sleep(interval)
+    
+    def stats(self) -> Dict[str, Any]:
+        files = 0
+        size = 0
+        partitions = 0
+        for building_id in self.building_ids():
+            for _, directory in self.partitions(building_id):
+                partitions += 1
+                for name in os.listdir(directory):
+                    if name.endswith(".parquet") and not name.startswith("."):
+                        files += 1
+                        size += os.path.getsize(os.path.join(directory, name))
+        return {
+            "root": self.root,
+            "buildings": len(self.building_ids()),
+            "partitions": partitions,
+            "files": files,
+            "bytes": size,
+            "last_run": self.last_run
+        }
+
+def merge_daily_aggregates(left: list, right: list) -> list:
+    """Combine two DAILY_AGGREGATES value lists for the same day"""
+    merged = []
+    for (_, aggregate), a, b in zip(DAILY_AGGREGATES, left, right):
+        merged.append(max(a, b) if aggregate == "max" else a + b)
+    return merged
+
+# Global instance
+sensor_archive = SensorArchive()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old sensor readings to the Parquet archive")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive readings older than this")
+    parser.add_argument("--stats", action="store_true", help="show archive contents and exit")
+    args = parser.parse_args()
+    
+    if args.stats:
+        print(sensor_archive.stats())
+    else:
+        print(sensor_archive.run(args.days))
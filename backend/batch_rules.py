@@ -0,0 +1,118 @@
+"""
+Vectorized threshold evaluation for batches of readings
+
+process_sensor_data runs each reading through the compiled rule table one
+comparison at a time. For bulk ingest and replay the readings are packed
+into NumPy columns instead, and every rule is evaluated for the whole batch
+with one comparison against per-row thresholds gathered from each row's
+(building, zone) profile.
+
+Only rows that need the alert lifecycle are handed back: rows that fire,
+and rows inside the clear band for a sensor that has an open alert or
+fires somewhere in the batch. Everything else never leaves NumPy.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+from lazy_imports import LazyModule
+
+np = LazyModule("numpy")
+
+SensorKey = Tuple[str, str]  # (building_id, sensor_id)
+
+class ReadingBatch:
+    """Readings packed into float64 columns; missing values are NaN and never fire or clear"""
+    
+    def __init__(self, readings: List[Any], fields: Iterable[str]):
+        self.readings = readings
+        self.size = len(readings)
+        # None converts to NaN under dtype=float64
+        self.columns = {
+            field: np.array([getattr(reading, field) for reading in readings], dtype=np.float64)
+            for field in fields
+        }
+        
+        self.sensor_keys: List[SensorKey] = []
+        sensor_codes: Dict[SensorKey, int] = {}
+        self.profile_keys: List[Tuple[str, Optional[str]]] = []
+        profile_codes: Dict[Tuple[str, Optional[str]], int] = {}
+        sensors = []
+        profiles = []
+        for reading in readings:
+            key = (reading.building_id, reading.sensor_id)
+            code = sensor_codes.get(key)
+            if code is None:
+                code = sensor_codes[key] = len(self.sensor_keys)
+                self.sensor_keys.append(key)
+            sensors.append(code)
+            
+            key = (reading.building_id, reading.zone)
+            code = profile_codes.get(key)
+            if code is None:
+                code = profile_codes[key] = len(self.profile_keys)
+                self.profile_keys.append(key)
+            profiles.append(code)
+        
+        self.sensor_codes = sensor_codes
+        self.sensors = np.array(sensors, dtype=np.int64)
+        self.profiles = np.array(profiles, dtype=np.int64)
+    
+    def latest_rows(self) -> List[int]:
+        """Index of each sensor's last reading, in batch order"""
+        last = np.full(len(self.sensor_keys), -1, dtype=np.int64)
+        last[self.sensors] = np.arange(self.size)
+        return np.sort(last).tolist()
+
+def evaluate_thresholds(batch: ReadingBatch, compiled_profiles: List[Any],
+                        open_alerts: Dict[str, List[SensorKey]]) -> List[Tuple[int, int, bool, bool]]:
+    """Evaluate every compiled rule over the batch
+    
+    ``compiled_profiles`` holds the CompiledProfile for each of the batch's
+    profile keys and ``open_alerts`` the sensors with an open alert per rule
+    name. Returns (row, rule index, firing, cleared) for the rows the alert
+    lifecycle must see, ordered by row.
+    """
+    rules = compiled_profiles[0].rules
+    thresholds = np.array([[rule.threshold for rule in profile.rules] for profile in compiled_profiles],
+                          dtype=np.float64)
+    clear_at = np.array([[rule.clear_at for rule in profile.rules] for profile in compiled_profiles],
+                        dtype=np.float64)
+    row_thresholds = thresholds[batch.profiles]
+    row_clear_at = clear_at[batch.profiles]
+    
+    hit_rows = []
+    hit_rules = []
+    hit_firing = []
+    hit_cleared = []
+    for index, rule in enumerate(rules):
+        values = batch.columns[rule.field]
+        if rule.above:
+            firing = values > row_thresholds[:, index]
+            cleared = values <= row_clear_at[:, index]
+        else:
+            firing = values < row_thresholds[:, index]
+            cleared = values >= row_clear_at[:, index]
+        
+        # Clearing only matters for sensors whose alert is open now or opens in this batch
+        watched = batch.sensors[firing]
+        already_open = [batch.sensor_codes[key] for key in open_alerts.get(rule.name, ()) if key in batch.sensor_codes]
+        if already_open:
+            watched = np.concatenate([watched, np.array(already_open, dtype=np.int64)])
+        relevant = firing | (cleared & np.isin(batch.sensors, watched))
+        
+        rows = np.flatnonzero(relevant)
+        if rows.size:
+            hit_rows.append(rows)
+            hit_rules.append(np.full(rows.size, index, dtype=np.int64))
+            hit_firing.append(firing[rows])
+            hit_cleared.append(cleared[rows])
+    
+    if not hit_rows:
+        return []
+    rows = np.concatenate(hit_rows)
+    rule_indexes = np.concatenate(hit_rules)
+    firing = np.concatenate(hit_firing)
+    cleared = np.concatenate(hit_cleared)
+    order = np.lexsort((rule_indexes, rows))
+    return list(zip(rows[order].tolist(), rule_indexes[order].tolist(),
+                    firing[order].tolist(), cleared[order].tolist()))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Portfolio analytics benchmark
+
+Writes synthetic 15-minute readings for a portfolio of buildings in the
+archive layout (building_id=.../month=.../part-*.parquet), then runs the
+portfolio reports:
+- row at a time: rows streamed from the archive into pandas, the way
+  analytics jobs load history through stream_sensor_frames
+- engine: the same summary in DuckDB, plus percentiles, a monthly rollup
+  and a year-over-year comparison
+
+Checks that both summaries agree.
+
+Usage:
+    python3 benchmarks/analytics_benchmark.py [--buildings 20] [--years 3]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analytics_engine import AnalyticsEngine
+from archive import SensorArchive
+from export import sensor_schema
+
+def write_portfolio(root: str, buildings: int, years: int, seed: int = 1) -> int:
+    rng = np.random.default_rng(seed)
+    schema = sensor_schema()
+    rows = 0
+    months = pd.date_range("2023-01-01", periods=12 * years + 1, freq="MS")
+    for b in range(buildings):
+        building_id = f"building_{b:03d}"
+        for month, next_month in zip(months[:-1], months[1:]):
+            timestamps = pd.date_range(month, next_month, freq="15min", inclusive="left")
+            n = len(timestamps)
+            columns = {
+                "building_id": pa.array([building_id] * n).dictionary_encode(),
+                "timestamp": pa.array(timestamps.values.astype("datetime64[us]")),
+                "temperature": rng.normal(22, 2, n),
+                "humidity": rng.uniform(30, 60, n),
+                "energy_consumption": rng.uniform(100, 1500, n) * (1 + b / buildings),
+                "occupancy": rng.integers(0, 300, n).astype("int32"),
+                "hvac_status": pa.array(["active"] * n).dictionary_encode(),
+                "lighting_status": pa.array(["on"] * n).dictionary_encode(),
+                "air_quality": rng.uniform(40, 120, n),
+                "hvac_efficiency": rng.uniform(70, 95, n),
+                "lighting_efficiency": rng.uniform(80, 98, n)
+            }
+            table = pa.table({name: columns[name] for name in schema.names}).cast(schema)
+            directory = os.path.join(root, f"building_id={building_id}", f"month={month:%Y-%m}")
+            os.makedirs(directory)
+            pq.write_table(table, os.path.join(directory, "part-benchmark.parquet"), compression="zstd")
+            rows += n
+    return rows
+
+def row_at_a_time_summary(archive: SensorArchive):
+    columns = ["building_id", "timestamp", "temperature", "energy_consumption", "occupancy"]
+    frames = []
+    for building_id in archive.building_ids():
+        frames.append(pd.DataFrame(archive.iter_rows(building_id, columns=columns), columns=columns))
+    data = pd.concat(frames)
+    return data.groupby("building_id").agg(
+        readings=("timestamp", "count"),
+        total_energy_consumption=("energy_consumption", "sum")
+    )
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare row-at-a-time and engine portfolio reports")
+    parser.add_argument("--buildings", type=int, default=20)
+    parser.add_argument("--years", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="analytics_benchmark_")
+    try:
+        rows = write_portfolio(os.path.join(root, "archive"), args.buildings, args.years)
+        archive = SensorArchive(os.path.join(root, "archive"))
+        engine = AnalyticsEngine(archive_dir=archive.root, data_dir=os.path.join(root, "analytics"))
+        last_year = datetime(2023 + args.years - 1, 1, 1)
+        previous_year = datetime(2023 + args.years - 2, 1, 1)
+
+        baseline_seconds, baseline = timed(row_at_a_time_summary, archive)
+        results = [
+            ("summary", *timed(engine.summary)),
+            ("percentiles (energy)", *timed(engine.percentiles)),
+            ("monthly rollup", *timed(engine.rollup, "month")),
+            ("compare year over year", *timed(engine.compare, previous_year, last_year, last_year,
+                                              datetime(2023 + args.years, 1, 1)))
+        ]
+
+        print(f"Portfolio analytics benchmark ({args.buildings} buildings, {rows} readings)")
+        print("=" * 60)
+        print(f"{'row at a time (summary)':<30} {baseline_seconds:>8.2f} s")
+        for label, seconds, _ in results:
+            print(f"{'engine ' + label:<30} {seconds:>8.2f} s")
+
+        summary = {row["building_id"]: row for row in results[0][2]["buildings"]}
+        agree = all(
+            summary[building_id]["readings"] == row.readings
+            and abs(summary[building_id]["total_energy_consumption"] - row.total_energy_consumption) < 1
+            for building_id, row in baseline.iterrows()
+        )
+        print(f"summaries agree:               {'yes' if agree else 'NO'}")
+        sys.exit(0 if agree else 1)
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == "__main__":
+    main()
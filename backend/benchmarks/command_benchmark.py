@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Command dispatch load test against the simulated device gateway
+
+Submits commands for many buildings through the command scheduler and the
+dispatcher, with SimulatedGateway standing in for the building hardware,
+and reports throughput, acknowledgement latency and delivery failures.
+
+Usage:
+    python3 benchmarks/command_benchmark.py [--commands 10000] [--buildings 100] [--latency 0.005] [--failure-rate 0.01]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Keep the benchmark out of the workers' shared-memory segment
+os.environ.setdefault("STATE_STORE_BACKEND", "local")
+
+from business_logic import RealTimeBusinessLogic
+from command_scheduler import CommandScheduler, CommandLimit
+from device_gateways import CommandDispatcher, SimulatedGateway
+from validators import RealTimeCommand
+
+COMMANDS = [
+    ("hvac", "set_temperature", lambda i: {"temperature": 18 + i % 10, "zone": f"zone_{i}"}),
+    ("hvac", "set_mode", lambda i: {"mode": "auto", "zone": f"zone_{i}"}),
+    ("lighting", "set_brightness", lambda i: {"brightness": i % 100, "floor": i}),
+    ("security", "lockdown", lambda i: {})
+]
+
+def make_commands(count: int, buildings: int):
+    commands = []
+    for i in range(count):
+        system, command_type, parameters = COMMANDS[i % len(COMMANDS)]
+        commands.append(RealTimeCommand(
+            command_id=f"cmd_{i}",
+            building_id=f"building_{i % buildings}",
+            target_system=system,
+            command_type=command_type,
+            parameters=parameters(i),
+            priority=1 + i % 10
+        ))
+    return commands
+
+async def run(args):
+    engine = RealTimeBusinessLogic()
+    engine.dispatcher = CommandDispatcher(
+        default=SimulatedGateway(latency=args.latency, failure_rate=args.failure_rate, seed=1),
+        timeout=args.timeout, backoff=0.01
+    )
+    # Generous limits so the gateway, not the rate limiter, is measured
+    limit = CommandLimit(concurrency=args.concurrency, rate=1e9, burst=10 ** 9)
+    scheduler = CommandScheduler(engine.process_command, limits={}, default_limit=limit, queue_size=args.commands)
+    scheduler.start()
+
+    commands = make_commands(args.commands, args.buildings)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(scheduler.submit(command) for command in commands))
+    elapsed = time.perf_counter() - started
+    await scheduler.stop()
+
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    return elapsed, statuses, engine.dispatcher.stats(), scheduler.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test command dispatch with the simulated gateway")
+    parser.add_argument("--commands", type=int, default=10000, help="commands to submit")
+    parser.add_argument("--buildings", type=int, default=100, help="buildings the commands are spread over")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated device round trip in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="fraction of gateway calls that fail")
+    parser.add_argument("--timeout", type=float, default=1.0, help="seconds per gateway call")
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight commands per building and system")
+    args = parser.parse_args()
+
+    elapsed, statuses, dispatcher, scheduler = asyncio.run(run(args))
+
+    print(f"Command benchmark ({args.commands} commands, {args.buildings} buildings)")
+    print("=" * 50)
+    print(f"throughput:        {args.commands / elapsed:>10.0f} commands/s")
+    print(f"results:           {statuses}")
+    print(f"superseded:        {scheduler['superseded']:>10}")
+    print(f"gateway retries:   {dispatcher['retries']:>10}")
+    print(f"delivery failures: {dispatcher['failed']:>10}")
+    latency = dispatcher["ack_latency"] or {}
+    print(f"ack latency:       p50 {latency.get('p50_ms')} ms, p95 {latency.get('p95_ms')} ms, max {latency.get('max_ms')} ms")
+
+if __name__ == "__main__":
+    main()
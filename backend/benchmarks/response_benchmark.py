@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+REST response serialization benchmark
+
+Serializes a building data response of synthetic sensor rows the way
+/api/buildings/{building_id}/data did before and does now:
+- default: .isoformat() per row, jsonable_encoder, then JSONResponse
+  (stdlib json)
+- fast: datetime rows rendered by FastJSONResponse (orjson when installed)
+- fast, stdlib fallback: FastJSONResponse's rendering without orjson
+
+Checks that all paths produce the same JSON document.
+
+Usage:
+    python3 benchmarks/response_benchmark.py [--rows 10000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import responses
+from responses import FastJSONResponse
+
+def make_rows(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "timestamp": start + timedelta(minutes=15 * i),
+            "temperature": round(rng.gauss(22, 2), 2),
+            "humidity": round(rng.uniform(30, 60), 2),
+            "energy_consumption": round(rng.uniform(100, 1500), 2),
+            "occupancy": rng.randrange(0, 300),
+            "hvac_status": "active",
+            "lighting_status": "on",
+            "air_quality": round(rng.uniform(40, 120), 2),
+            "hvac_efficiency": round(rng.uniform(70, 95), 2),
+            "lighting_efficiency": round(rng.uniform(80, 98), 2)
+        }
+        for i in range(count)
+    ]
+
+def default_path(rows):
+    data = [{**row, "timestamp": row["timestamp"].isoformat()} for row in rows]
+    return JSONResponse(jsonable_encoder({"building_id": "building_a", "data": data})).body
+
+def fast_path(rows):
+    return FastJSONResponse({"building_id": "building_a", "data": rows}).body
+
+def fallback_path(rows):
+    orjson, responses.orjson = responses.orjson, None
+    try:
+        return fast_path(rows)
+    finally:
+        responses.orjson = orjson
+
+def timed(function, rows, runs: int = 3):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = function(rows)
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, body
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare default and fast JSON responses")
+    parser.add_argument("--rows", type=int, default=10000, help="sensor rows in the response")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    results = [
+        ("default (jsonable_encoder)", *timed(default_path, rows)),
+        ("fast, stdlib fallback", *timed(fallback_path, rows)),
+    ]
+    if responses.orjson is not None:
+        results.append(("fast (orjson)", *timed(fast_path, rows)))
+
+    print(f"Response benchmark ({args.rows} rows)")
+    print("=" * 50)
+    baseline = results[0][1]
+    for label, seconds, body in results:
+        print(f"{label:<28} {seconds * 1000:>8.1f} ms  {baseline / seconds:>5.1f}x  {len(body)} bytes")
+
+    expected = json.loads(results[0][2])
+    identical = all(json.loads(body) == expected for _, _, body in results)
+    print(f"same document:               {'yes' if identical else 'NO'}")
+    sys.exit(0 if identical else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Rules-engine throughput benchmark
+
+Feeds the same synthetic readings through `process_sensor_data` one at a
+time and through `process_sensor_batch`, and checks that both paths raise
+the same alerts. Readings are mostly in range with occasional excursions,
+like a healthy building.
+
+Usage:
+    python3 benchmarks/rules_benchmark.py [--readings 100000] [--sensors 2000] [--min-rate 100000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Keep the benchmark out of the workers' shared-memory segment
+os.environ.setdefault("STATE_STORE_BACKEND", "local")
+
+from business_logic import RealTimeBusinessLogic
+from validators import RealTimeSensorData
+
+def make_readings(count: int, sensors: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    buildings = ["building_a", "building_b", "building_c"]
+    return [
+        RealTimeSensorData.model_construct(
+            building_id=buildings[i % len(buildings)],
+            sensor_id=f"sensor_{rng.randrange(sensors)}",
+            timestamp=start + timedelta(seconds=i),
+            zone=None,
+            temperature=rng.gauss(22, 1.5),
+            humidity=rng.uniform(35, 60),
+            air_quality=rng.gauss(80, 8),
+            energy_consumption=abs(rng.gauss(600, 120)),
+            occupancy=rng.randrange(0, 320),
+            hvac_status="active",
+            lighting_status="on",
+            hvac_efficiency=rng.gauss(85, 4),
+            lighting_efficiency=rng.gauss(90, 3)
+        )
+        for i in range(count)
+    ]
+
+def new_engine():
+    engine = RealTimeBusinessLogic()
+    engine.profiles.load(use_db=False)
+    return engine
+
+async def run(readings, window_rules: bool):
+    single = new_engine()
+    started = time.perf_counter()
+    single_alerts = []
+    for reading in readings:
+        single_alerts.extend(await single.process_sensor_data(reading))
+    single_seconds = time.perf_counter() - started
+
+    batch = new_engine()
+    started = time.perf_counter()
+    batch_alerts = await batch.process_sensor_batch(readings, window_rules=window_rules)
+    batch_seconds = time.perf_counter() - started
+
+    return single_alerts, single_seconds, batch_alerts, batch_seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-reading and batched rule evaluation")
+    parser.add_argument("--readings", type=int, default=100000, help="readings to process")
+    parser.add_argument("--sensors", type=int, default=2000, help="distinct sensors")
+    parser.add_argument("--min-rate", type=float, default=100000, help="batched readings/s required (threshold rules only)")
+    args = parser.parse_args()
+
+    readings = make_readings(args.readings, args.sensors)
+    # Import numpy outside the timed section
+    asyncio.run(new_engine().process_sensor_batch(readings[:10], window_rules=False))
+
+    single_alerts, single_seconds, batch_alerts, batch_seconds = asyncio.run(run(readings, window_rules=True))
+    _, _, threshold_alerts, threshold_seconds = asyncio.run(run(readings, window_rules=False))
+
+    def key(alert):
+        return alert.alert_id, alert.state, alert.occurrences, alert.severity
+    matched = sorted(map(key, single_alerts)) == sorted(map(key, batch_alerts))
+
+    print(f"Rules benchmark ({args.readings} readings, {args.sensors} sensors)")
+    print("=" * 50)
+    print(f"per reading:            {args.readings / single_seconds:>10.0f} readings/s ({len(single_alerts)} alerts)")
+    print(f"batch:                  {args.readings / batch_seconds:>10.0f} readings/s ({len(batch_alerts)} alerts)")
+    print(f"batch, thresholds only: {args.readings / threshold_seconds:>10.0f} readings/s ({len(threshold_alerts)} alerts)")
+    print(f"alerts match:           {'yes' if matched else 'NO'}")
+
+    failed = not matched
+    if args.readings / threshold_seconds < args.min_rate:
+        print(f"\nBatched threshold rules ran below {args.min_rate:.0f} readings/s")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
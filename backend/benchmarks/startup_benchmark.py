@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the API process
+
+Measures, in a fresh interpreter, how long it takes to import `main` and
+answer a first `/api/health` request, and reports per-module import times
+from `python -X importtime`. Exits non-zero when the startup budget is
+exceeded or when heavy analytics modules are imported at startup.
+
+Usage:
+    python3 benchmarks/startup_benchmark.py [--budget 1.5] [--top 20]
+
+Most of the remaining startup is importing fastapi and sqlalchemy, which
+varies by a few hundred milliseconds between runs on the same machine; the
+default budget leaves room for that, so a failure means a real regression
+such as a heavy module loading at import.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only load when an ML code path runs
+HEAVY_MODULES = ["numpy", "pandas", "sklearn", "joblib", "scipy", "matplotlib", "seaborn"]
+
+# Runs in the child interpreter: import the app, then drive one ASGI request to /api/health
+PROBE = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def first_health_request():
+    messages = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/health", "raw_path": b"/api/health", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 0),
+        "server": ("localhost", 8000),
+    }
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    await main.app(scope, receive, send)
+    return next(m["status"] for m in messages if m["type"] == "http.response.start")
+
+status = asyncio.run(first_health_request())
+ready = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - started,
+    "health_seconds": ready - imported,
+    "ready_seconds": ready - started,
+    "health_status": status,
+    "heavy_modules_loaded": sorted(m for m in HEAVY if m in sys.modules),
+}))
+"""
+
+def parse_importtime(stderr: str):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us, depth) tuples"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        self_us, cumulative_us, raw_name = int(parts[0]), int(parts[1]), parts[2]
+        depth = (len(raw_name) - len(raw_name.lstrip())) // 2
+        modules.append((raw_name.strip(), self_us, cumulative_us, depth))
+    return modules
+
+def run_probe():
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + PROBE
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(result.returncode)
+    return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API startup time and per-module import cost")
+    parser.add_argument("--budget", type=float, default=1.5, help="seconds allowed until /api/health answers")
+    parser.add_argument("--top", type=int, default=20, help="number of modules to list")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to start; best run is reported")
+    args = parser.parse_args()
+
+    runs = [run_probe() for _ in range(args.runs)]
+    timings, modules = min(runs, key=lambda run: run[0]["ready_seconds"])
+
+    print("Startup benchmark (best of %d runs)" % args.runs)
+    print("=" * 50)
+    print(f"import main:          {timings['import_seconds'] * 1000:8.1f} ms")
+    print(f"first /api/health:    {timings['health_seconds'] * 1000:8.1f} ms (HTTP {timings['health_status']})")
+    print(f"ready to serve:       {timings['ready_seconds'] * 1000:8.1f} ms (budget {args.budget * 1000:.0f} ms)")
+
+    print(f"\nTop {args.top} first-level imports by cumulative time:")
+    print(f"{'module':<40} {'self ms':>10} {'cumulative ms':>15}")
+    first_level = [m for m in modules if m[3] <= 1]
+    for name, self_us, cumulative_us, _ in sorted(first_level, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"{name:<40} {self_us / 1000:>10.1f} {cumulative_us / 1000:>15.1f}")
+
+    failed = False
+    if timings["heavy_modules_loaded"]:
+        print(f"\nHeavy modules imported at startup: {', '.join(timings['heavy_modules_loaded'])}")
+        failed = True
+    if timings["ready_seconds"] > args.budget:
+        print(f"\nStartup took longer than the {args.budget}s budget")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Sensor payload validation benchmark
+
+Validates the same JSON array of synthetic readings, as posted to the
+batch endpoint, with:
+- json.loads and the previous RealTimeSensorData per reading, its Python
+  field validators reproduced here (re.match on ids, realistic-value
+  checks, occupancy)
+- json.loads and the current model per reading
+- json.loads and validate_sensor_batch (TypeAdapter over the whole list)
+- validate_sensor_batch_json (JSON parsed in pydantic-core)
+
+Usage:
+    python3 benchmarks/validation_benchmark.py [--readings 50000] [--invalid 0.01]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from pydantic import Field, ValidationError, field_validator
+
+from validators import RealTimeSensorData, validate_sensor_batch, validate_sensor_batch_json
+
+class LegacySensorData(RealTimeSensorData):
+    """RealTimeSensorData as validated before the core-constraint rewrite"""
+    temperature: float = Field(..., ge=-50, le=100)
+    humidity: float = Field(..., ge=0, le=100)
+    energy_consumption: float = Field(..., ge=0, le=10000)
+    building_id: str = Field(..., min_length=1, max_length=50)
+    sensor_id: str = Field(..., min_length=1, max_length=50)
+    
+    @field_validator('building_id')
+    @classmethod
+    def validate_building_id(cls, v):
+        if not re.match(r'^[a-zA-Z0-9_-]+$', v):
+            raise ValueError('Building ID must contain only alphanumeric characters, hyphens, and underscores')
+        return v
+    
+    @field_validator('sensor_id')
+    @classmethod
+    def validate_sensor_id(cls, v):
+        if not re.match(r'^[a-zA-Z0-9_-]+$', v):
+            raise ValueError('Sensor ID must contain only alphanumeric characters, hyphens, and underscores')
+        return v
+    
+    @field_validator('temperature', 'humidity', 'energy_consumption')
+    @classmethod
+    def validate_realistic_values(cls, v, info):
+        field_name = info.field_name
+        if field_name == 'temperature' and (v < -20 or v > 50):
+            raise ValueError('Temperature seems unrealistic for indoor environment')
+        elif field_name == 'humidity' and (v < 10 or v > 90):
+            raise ValueError('Humidity seems unrealistic for indoor environment')
+        elif field_name == 'energy_consumption' and v > 5000:
+            raise ValueError('Energy consumption seems unusually high')
+        return v
+    
+    @field_validator('occupancy')
+    @classmethod
+    def validate_occupancy(cls, v, info):
+        data = info.data
+        if data and 'occupancy_density' in data and data['occupancy_density']:
+            pass
+        return v
+
+def make_rows(count: int, invalid: float, seed: int = 1):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = {
+            "building_id": f"building_{i % 50}",
+            "sensor_id": f"sensor_{i % 2000}",
+            "timestamp": f"2024-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}",
+            "temperature": round(rng.gauss(22, 2), 2),
+            "humidity": round(rng.uniform(30, 60), 1),
+            "air_quality": round(rng.uniform(40, 120), 1),
+            "energy_consumption": round(rng.uniform(100, 1500), 2),
+            "occupancy": rng.randrange(0, 300),
+            "hvac_status": "active",
+            "lighting_status": "on",
+            "hvac_efficiency": round(rng.uniform(70, 95), 1),
+            "zone": f"zone_{i % 8}"
+        }
+        if rng.random() < invalid:
+            row["temperature"] = 80.0
+        rows.append(row)
+    return rows
+
+def per_row(model, raw: bytes):
+    readings = []
+    for row in json.loads(raw):
+        try:
+            readings.append(model.model_validate(row))
+        except ValidationError:
+            pass
+    return len(readings)
+
+def batch(raw: bytes):
+    return validate_sensor_batch(json.loads(raw))
+
+def timed(function, *args, runs: int = 3):
+    """Best of ``runs`` calls; later runs see the batch validator's steady state"""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-reading and batch validation throughput")
+    parser.add_argument("--readings", type=int, default=50000, help="readings to validate")
+    parser.add_argument("--invalid", type=float, default=0.01, help="fraction of readings with an out-of-range value")
+    args = parser.parse_args()
+    
+    rows = make_rows(args.readings, args.invalid)
+    raw = json.dumps(rows).encode()
+    
+    legacy_seconds, legacy_valid = timed(per_row, LegacySensorData, raw)
+    model_seconds, model_valid = timed(per_row, RealTimeSensorData, raw)
+    batch_seconds, (batch_readings, batch_errors) = timed(batch, raw)
+    json_seconds, (json_readings, json_errors) = timed(validate_sensor_batch_json, raw)
+    
+    print(f"Validation benchmark ({args.readings} readings, {args.invalid:.1%} invalid)")
+    print("=" * 50)
+    for label, seconds, valid in [
+        ("before, per reading", legacy_seconds, legacy_valid),
+        ("after, per reading", model_seconds, model_valid),
+        ("after, batch", batch_seconds, len(batch_readings)),
+        ("after, batch from JSON", json_seconds, len(json_readings)),
+    ]:
+        print(f"{label:<24} {args.readings / seconds:>10.0f} readings/s ({valid} valid)")
+    print(f"per-row errors reported: {len(batch_errors)} (batch), {len(json_errors)} (JSON)")
+    
+    consistent = legacy_valid == model_valid == len(batch_readings) == len(json_readings)
+    sys.exit(0 if consistent else 1)
+
+if __name__ == "__main__":
+    main()
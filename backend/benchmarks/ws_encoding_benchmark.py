@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+WebSocket wire encoding benchmark
+
+Compares JSON text frames with MessagePack binary frames for the messages
+the real-time channel carries most:
+- sensor_data frames sent by clients (decoded and validated as a reading)
+- alert and status_update frames broadcast by the hub (encoded)
+
+Frames are built from readings run through the rules engine, so floats
+have realistic precision. Reports microseconds per frame and bytes.
+
+Usage:
+    python3 benchmarks/ws_encoding_benchmark.py [--frames 20000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Keep the benchmark out of the workers' shared-memory segment
+os.environ.setdefault("STATE_STORE_BACKEND", "local")
+
+import msgpack
+
+from business_logic import RealTimeBusinessLogic
+from validators import RealTimeSensorData
+from ws_encoding import Frame, WireEncoding, decode_message
+
+def make_readings(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [
+        RealTimeSensorData(
+            building_id="building_a",
+            sensor_id=f"sensor_{i % 200}",
+            timestamp=start + timedelta(seconds=i),
+            zone=f"zone_{i % 8}",
+            temperature=rng.gauss(22, 3),
+            humidity=rng.uniform(30, 60),
+            air_quality=rng.gauss(80, 15),
+            energy_consumption=abs(rng.gauss(600, 120)),
+            power_factor=rng.uniform(0.85, 0.99),
+            voltage=rng.gauss(230, 2),
+            current=rng.uniform(5, 40),
+            occupancy=rng.randrange(0, 320),
+            hvac_status="active",
+            lighting_status="on",
+            hvac_efficiency=rng.uniform(75, 95),
+            lighting_efficiency=rng.uniform(80, 98)
+        )
+        for i in range(count)
+    ]
+
+def sample_frames(readings):
+    """Incoming sensor_data envelopes plus an alert and a status from the rules engine"""
+    engine = RealTimeBusinessLogic()
+    engine.profiles.load(use_db=False)
+
+    async def run():
+        alerts = []
+        for reading in readings:
+            alerts.extend(await engine.process_sensor_data(reading))
+        return alerts
+
+    alerts = asyncio.run(run())
+    incoming = [
+        {"message_type": "sensor_data", "data": reading.model_dump(mode="json"), "message_id": f"m{i}"}
+        for i, reading in enumerate(readings)
+    ]
+    alert = alerts[0].model_dump(mode="json") if alerts else {}
+    status = engine.get_system_status("building_a")
+    return incoming, alert, status
+
+def per_frame(function, items, runs: int = 3):
+    """Best of ``runs`` passes, in microseconds per frame"""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        for item in items:
+            function(item)
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(items) * 1e6
+
+def receive_reading(raw):
+    """What the hub does with an incoming sensor_data frame before the rules engine"""
+    return RealTimeSensorData.model_validate(decode_message(raw).data)
+
+def encode_outgoing(message_type, data, count, encoding):
+    return per_frame(lambda _: Frame(message_type, data).encode(encoding), range(count))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and MessagePack WebSocket frames")
+    parser.add_argument("--frames", type=int, default=20000, help="frames per measurement")
+    args = parser.parse_args()
+
+    incoming, alert, status = sample_frames(make_readings(min(args.frames, 2000)))
+    incoming = (incoming * (args.frames // len(incoming) + 1))[:args.frames]
+    json_frames = [json.dumps(frame) for frame in incoming]
+    msgpack_frames = [msgpack.packb(frame) for frame in incoming]
+
+    rows = []
+    rows.append(("sensor_data in (decode + validate)",
+                 per_frame(receive_reading, json_frames), per_frame(receive_reading, msgpack_frames),
+                 sum(map(len, json_frames)) / len(json_frames), sum(map(len, msgpack_frames)) / len(msgpack_frames)))
+    for message_type, data in [("alert", alert), ("status_update", status)]:
+        rows.append((f"{message_type} out (encode)",
+                     encode_outgoing(message_type, data, args.frames, WireEncoding.JSON),
+                     encode_outgoing(message_type, data, args.frames, WireEncoding.MSGPACK),
+                     len(Frame(message_type, data).encode(WireEncoding.JSON)),
+                     len(Frame(message_type, data).encode(WireEncoding.MSGPACK))))
+
+    print(f"WebSocket encoding benchmark ({args.frames} frames per row)")
+    print("=" * 78)
+    print(f"{'frame':<36} {'json us':>8} {'msgpack us':>11} {'json B':>8} {'msgpack B':>10}")
+    for label, json_us, msgpack_us, json_bytes, msgpack_bytes in rows:
+        print(f"{label:<36} {json_us:>8.2f} {msgpack_us:>11.2f} {json_bytes:>8.0f} {msgpack_bytes:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,13 @@ from enum import Enum
 
 from validators import RealTimeSensorData, RealTimeAlert, RealTimeCommand, SensorStatus, AnomalySeverity
 from database import get_db, SensorData, Anomaly, Building
+from state_store import LatestStateStore
+from alert_lifecycle import AlertTracker, AlertState
+from alert_history import AlertHistory, alert_writer
+from window_rules import default_window_rules
+from threshold_profiles import RuleSpec, ThresholdProfiles
+from batch_rules import ReadingBatch, evaluate_thresholds
+from device_gateways import CommandDispatcher
 from sqlalchemy.orm import Session
 
 class AlertType(str, Enum):
@@ -42,173 +49,198 @@ class ThresholdConfig:
     air_quality_min: float = 50.0
     hvac_efficiency_min: float = 70.0
     lighting_efficiency_min: float = 80.0
+    # Hysteresis: an open alert closes only once the value is this far back inside its threshold
+    temperature_band: float = 0.5
+    energy_band: float = 50.0
+    occupancy_band: int = 10
+    efficiency_band: float = 2.0
+    air_quality_band: float = 5.0
+
+# Single-reading rules; limits are resolved per building and zone by ThresholdProfiles
+THRESHOLD_RULES = [
+    RuleSpec(
+        name="temp_low", field="temperature", above=False,
+        threshold_field="temperature_min", band_field="temperature_band",
+        alert_type=AlertType.TEMPERATURE_ANOMALY, severity=AnomalySeverity.MEDIUM,
+        escalate_at=15, escalated_severity=AnomalySeverity.HIGH,
+        message="Temperature too low: {value}°C (min: {threshold}°C)", data_key="current_temp"
+    ),
+    RuleSpec(
+        name="temp_high", field="temperature", above=True,
+        threshold_field="temperature_max", band_field="temperature_band",
+        alert_type=AlertType.TEMPERATURE_ANOMALY, severity=AnomalySeverity.MEDIUM,
+        escalate_at=30, escalated_severity=AnomalySeverity.HIGH,
+        message="Temperature too high: {value}°C (max: {threshold}°C)", data_key="current_temp"
+    ),
+    RuleSpec(
+        name="energy_spike", field="energy_consumption", above=True,
+        threshold_field="energy_threshold", band_field="energy_band",
+        alert_type=AlertType.ENERGY_SPIKE, severity=AnomalySeverity.MEDIUM,
+        escalate_at=2000, escalated_severity=AnomalySeverity.HIGH,
+        message="Energy consumption spike: {value} kWh (threshold: {threshold} kWh)", data_key="current_energy"
+    ),
+    RuleSpec(
+        name="occupancy_high", field="occupancy", above=True,
+        threshold_field="occupancy_max", band_field="occupancy_band",
+        alert_type=AlertType.OCCUPANCY_ANOMALY, severity=AnomalySeverity.MEDIUM,
+        message="High occupancy detected: {value} people (max: {threshold})", data_key="current_occupancy"
+    ),
+    RuleSpec(
+        name="hvac_efficiency", field="hvac_efficiency", above=False,
+        threshold_field="hvac_efficiency_min", band_field="efficiency_band",
+        alert_type=AlertType.MAINTENANCE_REQUIRED, severity=AnomalySeverity.MEDIUM,
+        message="HVAC efficiency low: {value}% (min: {threshold}%)", data_key="current_efficiency"
+    ),
+    RuleSpec(
+        name="lighting_efficiency", field="lighting_efficiency", above=False,
+        threshold_field="lighting_efficiency_min", band_field="efficiency_band",
+        alert_type=AlertType.MAINTENANCE_REQUIRED, severity=AnomalySeverity.LOW,
+        message="Lighting efficiency low: {value}% (min: {threshold}%)", data_key="current_efficiency"
+    ),
+    RuleSpec(
+        name="air_quality", field="air_quality", above=False,
+        threshold_field="air_quality_min", band_field="air_quality_band",
+        alert_type=AlertType.AIR_QUALITY_ISSUE, severity=AnomalySeverity.MEDIUM,
+        escalate_at=30, escalated_severity=AnomalySeverity.HIGH,
+        message="Poor air quality: {value} (min: {threshold})", data_key="current_air_quality"
+    )
+]
 
 class RealTimeBusinessLogic:
     """Business logic for real-time building management"""
     
     def __init__(self):
         self.thresholds = ThresholdConfig()
-        self.alert_history: Dict[str, List[RealTimeAlert]] = {}
-        self.system_status: Dict[str, Dict[str, Any]] = {}
-        self.last_sensor_data: Dict[str, RealTimeSensorData] = {}
+        # Per building type / building / zone overrides of self.thresholds, compiled into rule tables
+        self.profiles = ThresholdProfiles(self.thresholds, THRESHOLD_RULES)
+        # Recent alerts per building in ring buffers; opens and closes are also persisted in batches
+        self.alert_history = AlertHistory()
+        self.alert_writer = alert_writer
+        self.alert_tracker = AlertTracker()
+        self.window_rules = default_window_rules()
+        # Latest reading per sensor and status per building, shared by all workers
+        self.state_store = LatestStateStore()
+        # Delivers validated commands to the device gateways
+        self.dispatcher = CommandDispatcher()
     
     async def process_sensor_data(self, sensor_data: RealTimeSensorData) -> List[RealTimeAlert]:
         """Process incoming sensor data and generate alerts if needed"""
         alerts = []
         
-        # Store latest data
-        key = f"{sensor_data.building_id}_{sensor_data.sensor_id}"
-        self.last_sensor_data[key] = sensor_data
-        
-        # Check temperature anomalies
-        temp_alerts = self._check_temperature_anomalies(sensor_data)
-        alerts.extend(temp_alerts)
-        
-        # Check energy consumption
-        energy_alerts = self._check_energy_anomalies(sensor_data)
-        alerts.extend(energy_alerts)
-        
-        # Check occupancy anomalies
-        occupancy_alerts = self._check_occupancy_anomalies(sensor_data)
-        alerts.extend(occupancy_alerts)
+        # Check every threshold rule for this building and zone in one pass
+        self.profiles.reload_if_changed()
+        profile = self.profiles.resolve(sensor_data.building_id, sensor_data.zone)
+        alerts.extend(self._check_thresholds(sensor_data, profile))
         
-        # Check system efficiency
-        efficiency_alerts = self._check_system_efficiency(sensor_data)
-        alerts.extend(efficiency_alerts)
+        # Check sustained conditions, baselines and trends
+        alerts.extend(self._check_window_rules(sensor_data, profile.thresholds))
         
-        # Check air quality
-        air_quality_alerts = self._check_air_quality(sensor_data)
-        alerts.extend(air_quality_alerts)
-        
-        # Update system status
-        self._update_system_status(sensor_data)
+        # Store latest data and update system status
+        self.record_sensor_data(sensor_data)
         
         return alerts
     
-    def _check_temperature_anomalies(self, data: RealTimeSensorData) -> List[RealTimeAlert]:
-        """Check for temperature-related anomalies"""
-        alerts = []
-        
-        if data.temperature < self.thresholds.temperature_min:
-            alerts.append(RealTimeAlert(
-                alert_id=f"temp_low_{data.timestamp.timestamp()}",
-                building_id=data.building_id,
-                sensor_id=data.sensor_id,
-                alert_type=AlertType.TEMPERATURE_ANOMALY,
-                severity=AnomalySeverity.MEDIUM if data.temperature < 15 else AnomalySeverity.HIGH,
-                message=f"Temperature too low: {data.temperature}°C (min: {self.thresholds.temperature_min}°C)",
-                data={"current_temp": data.temperature, "threshold": self.thresholds.temperature_min}
-            ))
+    async def process_sensor_batch(self, readings: List[RealTimeSensorData],
+                                   window_rules: bool = True) -> List[RealTimeAlert]:
+        """Process many readings at once with vectorized threshold checks
+        
+        Readings must be in time order per sensor. Alerts are built only for
+        rows that fire or close an alert. The window rules still run per
+        reading; pass window_rules=False for fast replay without them.
+        """
+        if not readings:
+            return []
+        
+        self.profiles.reload_if_changed()
+        batch = ReadingBatch(readings, {spec.field for spec in self.profiles.rules})
+        compiled = [self.profiles.resolve(building_id, zone) for building_id, zone in batch.profile_keys]
+        row_profiles = batch.profiles.tolist()
+        
+        open_alerts: Dict[str, List[Tuple[str, str]]] = {}
+        for building_id, sensor_id, rule in self.alert_tracker.open:
+            open_alerts.setdefault(rule, []).append((building_id, sensor_id))
         
-        elif data.temperature > self.thresholds.temperature_max:
-            alerts.append(RealTimeAlert(
-                alert_id=f"temp_high_{data.timestamp.timestamp()}",
-                building_id=data.building_id,
-                sensor_id=data.sensor_id,
-                alert_type=AlertType.TEMPERATURE_ANOMALY,
-                severity=AnomalySeverity.MEDIUM if data.temperature < 30 else AnomalySeverity.HIGH,
-                message=f"Temperature too high: {data.temperature}°C (max: {self.thresholds.temperature_max}°C)",
-                data={"current_temp": data.temperature, "threshold": self.thresholds.temperature_max}
-            ))
-        
-        return alerts
-    
-    def _check_energy_anomalies(self, data: RealTimeSensorData) -> List[RealTimeAlert]:
-        """Check for energy consumption anomalies"""
         alerts = []
-        
-        if data.energy_consumption > self.thresholds.energy_threshold:
-            alerts.append(RealTimeAlert(
-                alert_id=f"energy_spike_{data.timestamp.timestamp()}",
-                building_id=data.building_id,
-                sensor_id=data.sensor_id,
-                alert_type=AlertType.ENERGY_SPIKE,
-                severity=AnomalySeverity.HIGH if data.energy_consumption > 2000 else AnomalySeverity.MEDIUM,
-                message=f"Energy consumption spike: {data.energy_consumption} kWh (threshold: {self.thresholds.energy_threshold} kWh)",
-                data={"current_energy": data.energy_consumption, "threshold": self.thresholds.energy_threshold}
-            ))
+        for row, index, firing, cleared in evaluate_thresholds(batch, compiled, open_alerts):
+            data = readings[row]
+            rule = compiled[row_profiles[row]].rules[index]
+            value = getattr(data, rule.field)
+            alert = self._evaluate_rule(data, rule.name, value, firing, cleared,
+                                        build=lambda rule=rule, value=value: rule.build(value))
+            if alert is not None:
+                alerts.append(alert)
+        
+        if window_rules:
+            for row, data in enumerate(readings):
+                alerts.extend(self._check_window_rules(data, compiled[row_profiles[row]].thresholds))
+        
+        # Only each sensor's last reading is current state
+        for row in batch.latest_rows():
+            self.record_sensor_data(readings[row])
         
         return alerts
     
-    def _check_occupancy_anomalies(self, data: RealTimeSensorData) -> List[RealTimeAlert]:
-        """Check for occupancy anomalies"""
-        alerts = []
-        
-        if data.occupancy > self.thresholds.occupancy_max:
-            alerts.append(RealTimeAlert(
-                alert_id=f"occupancy_high_{data.timestamp.timestamp()}",
-                building_id=data.building_id,
-                sensor_id=data.sensor_id,
-                alert_type=AlertType.OCCUPANCY_ANOMALY,
-                severity=AnomalySeverity.MEDIUM,
-                message=f"High occupancy detected: {data.occupancy} people (max: {self.thresholds.occupancy_max})",
-                data={"current_occupancy": data.occupancy, "threshold": self.thresholds.occupancy_max}
-            ))
-        
-        return alerts
+    def record_sensor_data(self, sensor_data: RealTimeSensorData):
+        """Store the latest reading and refresh the building status without running any checks"""
+        self.state_store.put(sensor_data)
+    
+    def _evaluate_rule(self, data: RealTimeSensorData, rule: str, value: Optional[float],
+                       firing: bool, cleared: bool, build) -> Optional[RealTimeAlert]:
+        """Run one rule through the alert lifecycle; returns the alert if it opened, changed or closed"""
+        alert = self.alert_tracker.observe(
+            data.building_id, data.sensor_id, rule, data.timestamp, value, firing, cleared, build
+        )
+        if alert is None:
+            return None
+        if alert.state == AlertState.CLOSED:
+            self.alert_writer.submit(alert)
+        elif alert.occurrences == 1:
+            self.alert_history.append(alert)
+            self.alert_writer.submit(alert)
+        return alert
     
-    def _check_system_efficiency(self, data: RealTimeSensorData) -> List[RealTimeAlert]:
-        """Check system efficiency"""
+    def _check_thresholds(self, data: RealTimeSensorData, profile) -> List[RealTimeAlert]:
+        """Evaluate a compiled rule table against one reading"""
         alerts = []
         
-        if data.hvac_efficiency and data.hvac_efficiency < self.thresholds.hvac_efficiency_min:
-            alerts.append(RealTimeAlert(
-                alert_id=f"hvac_efficiency_{data.timestamp.timestamp()}",
-                building_id=data.building_id,
-                sensor_id=data.sensor_id,
-                alert_type=AlertType.MAINTENANCE_REQUIRED,
-                severity=AnomalySeverity.MEDIUM,
-                message=f"HVAC efficiency low: {data.hvac_efficiency}% (min: {self.thresholds.hvac_efficiency_min}%)",
-                data={"current_efficiency": data.hvac_efficiency, "threshold": self.thresholds.hvac_efficiency_min}
-            ))
-        
-        if data.lighting_efficiency and data.lighting_efficiency < self.thresholds.lighting_efficiency_min:
-            alerts.append(RealTimeAlert(
-                alert_id=f"lighting_efficiency_{data.timestamp.timestamp()}",
-                building_id=data.building_id,
-                sensor_id=data.sensor_id,
-                alert_type=AlertType.MAINTENANCE_REQUIRED,
-                severity=AnomalySeverity.LOW,
-                message=f"Lighting efficiency low: {data.lighting_efficiency}% (min: {self.thresholds.lighting_efficiency_min}%)",
-                data={"current_efficiency": data.lighting_efficiency, "threshold": self.thresholds.lighting_efficiency_min}
-            ))
+        for rule in profile.rules:
+            value = getattr(data, rule.field)
+            if value is None:
+                continue
+            if rule.above:
+                firing = value > rule.threshold
+                cleared = value <= rule.clear_at
+            else:
+                firing = value < rule.threshold
+                cleared = value >= rule.clear_at
+            alert = self._evaluate_rule(data, rule.name, value, firing, cleared,
+                                        build=lambda rule=rule, value=value: rule.build(value))
+            if alert is not None:
+                alerts.append(alert)
         
         return alerts
     
-    def _check_air_quality(self, data: RealTimeSensorData) -> List[RealTimeAlert]:
-        """Check air quality"""
+    def _check_window_rules(self, data: RealTimeSensorData, thresholds: ThresholdConfig) -> List[RealTimeAlert]:
+        """Check the sliding-window rules; each updates its per-sensor state in constant time"""
         alerts = []
-        
-        if data.air_quality and data.air_quality < self.thresholds.air_quality_min:
-            alerts.append(RealTimeAlert(
-                alert_id=f"air_quality_{data.timestamp.timestamp()}",
-                building_id=data.building_id,
-                sensor_id=data.sensor_id,
-                alert_type=AlertType.AIR_QUALITY_ISSUE,
-                severity=AnomalySeverity.HIGH if data.air_quality < 30 else AnomalySeverity.MEDIUM,
-                message=f"Poor air quality: {data.air_quality} (min: {self.thresholds.air_quality_min})",
-                data={"current_air_quality": data.air_quality, "threshold": self.thresholds.air_quality_min}
-            ))
+        key = (data.building_id, data.sensor_id)
+        
+        for rule in self.window_rules:
+            value = getattr(data, rule.field)
+            if value is None:
+                continue
+            firing, cleared, details = rule.evaluate(key, data.timestamp, value, thresholds)
+            alert = self._evaluate_rule(
+                data, rule.name, value, firing, cleared,
+                build=lambda rule=rule, value=value, details=details: (
+                    rule.alert_type, rule.severity, rule.describe(value, details), details
+                )
+            )
+            if alert is not None:
+                alerts.append(alert)
         
         return alerts
     
-    def _update_system_status(self, data: RealTimeSensorData):
-        """Update system status based on sensor data"""
-        building_key = data.building_id
-        
-        if building_key not in self.system_status:
-            self.system_status[building_key] = {}
-        
-        self.system_status[building_key].update({
-            "last_update": data.timestamp.isoformat(),
-            "hvac_status": data.hvac_status,
-            "lighting_status": data.lighting_status,
-            "current_temperature": data.temperature,
-            "current_humidity": data.humidity,
-            "current_occupancy": data.occupancy,
-            "current_energy_consumption": data.energy_consumption
-        })
-    
     async def process_command(self, command: RealTimeCommand) -> Dict[str, Any]:
         """Process real-time commands"""
         # Validate command
@@ -217,13 +249,28 @@ class RealTimeBusinessLogic:
         
         # Process based on target system
         if command.target_system == SystemType.HVAC:
-            return await self._process_hvac_command(command)
+            result = await self._process_hvac_command(command)
         elif command.target_system == SystemType.LIGHTING:
-            return await self._process_lighting_command(command)
+            result = await self._process_lighting_command(command)
         elif command.target_system == SystemType.SECURITY:
-            return await self._process_security_command(command)
+            result = await self._process_security_command(command)
         else:
             return {"status": "error", "message": f"Unknown target system: {command.target_system}"}
+        
+        if result["status"] != "success":
+            return result
+        
+        # Deliver to the building's devices
+        delivery = await self.dispatcher.dispatch(command)
+        if not delivery["acknowledged"]:
+            return {
+                "status": "error",
+                "message": f"Command not acknowledged by the {delivery['gateway']} gateway: "
+                           f"{delivery.get('error') or delivery['ack'].get('error', 'rejected')}",
+                "command_id": command.command_id,
+                "delivery": delivery
+            }
+        return {**result, "delivery": delivery}
     
     async def _process_hvac_command(self, command: RealTimeCommand) -> Dict[str, Any]:
         """Process HVAC commands"""
@@ -305,11 +352,19 @@ class RealTimeBusinessLogic:
     
     def get_system_status(self, building_id: str) -> Optional[Dict[str, Any]]:
         """Get current system status for a building"""
-        return self.system_status.get(building_id)
+        return self.state_store.get_building_status(building_id)
+    
+    def get_last_sensor_data(self, building_id: str, sensor_id: str) -> Optional[Dict[str, Any]]:
+        """Get the latest stored reading of a sensor"""
+        return self.state_store.get_sensor_reading(building_id, sensor_id)
+    
+    def get_open_alerts(self, building_id: str) -> List[RealTimeAlert]:
+        """Get the alerts currently open for a building"""
+        return self.alert_tracker.get_open_alerts(building_id)
     
     def get_alert_history(self, building_id: str, limit: int = 50) -> List[RealTimeAlert]:
         """Get alert history for a building"""
-        return self.alert_history.get(building_id, [])[-limit:]
+        return self.alert_history.recent(building_id, limit)
 
 # Global instance
 business_logic = RealTimeBusinessLogic() 
\ No newline at end of file
@@ -0,0 +1,283 @@
+"""
+Priority scheduling for real-time building commands
+
+Commands are queued per (building, target system) lane and dispatched in
+priority order (10 first, FIFO within a priority) instead of in arrival
+order. Before a command is dispatched:
+
+- expired commands (expires_at in the past) are dropped
+- a newer setpoint command (set_temperature, set_mode, set_brightness) for
+  the same building, system and target replaces the queued older one,
+  which is answered with status "superseded"
+- each lane stays within its system's concurrency limit and token-bucket
+  rate, so a burst of UI clicks reaches the HVAC or lighting integration
+  at a bounded rate
+
+Every submitted command gets a future resolved with the executor's
+result, or with an expired/superseded/rejected status.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Deque
+
+from dotenv import load_dotenv
+
+from validators import RealTimeCommand
+from business_logic import business_logic
+
+load_dotenv()
+
+# Scheduler settings; per-system values below override the concurrency and rate defaults
+COMMAND_CONCURRENCY = int(os.getenv("COMMAND_CONCURRENCY", "4"))  # in-flight commands per building and system
+COMMAND_RATE = float(os.getenv("COMMAND_RATE", "10"))  # commands per second per building and system
+COMMAND_BURST = int(os.getenv("COMMAND_BURST", "20"))
+COMMAND_QUEUE_SIZE = int(os.getenv("COMMAND_QUEUE_SIZE", "1000"))  # queued commands per building and system
+
+# Commands that set a state; only the newest queued one per target matters
+SUPERSEDABLE_COMMANDS = {"set_temperature", "set_mode", "set_brightness"}
+
+# Parameters naming what a command acts on, checked in order
+TARGET_PARAMETERS = ("target", "zone", "device_id", "floor")
+
+LATENCY_SAMPLES = 1024
+
+@dataclass(frozen=True)
+class CommandLimit:
+    concurrency: int
+    rate: float  # commands per second
+    burst: int
+
+SYSTEM_LIMITS = {
+    "hvac": CommandLimit(concurrency=2, rate=5, burst=10),
+    "lighting": CommandLimit(concurrency=COMMAND_CONCURRENCY, rate=COMMAND_RATE, burst=COMMAND_BURST),
+    # Security commands are rare and must not wait behind a rate limit
+    "security": CommandLimit(concurrency=COMMAND_CONCURRENCY, rate=100, burst=100),
+}
+
+CommandExecutor = Callable[[RealTimeCommand], Awaitable[Dict[str, Any]]]
+
+class _Entry:
+    __slots__ = ("command", "future", "enqueued_at", "key", "done")
+    
+    def __init__(self, command: RealTimeCommand, future: asyncio.Future, key: Optional[Tuple]):
+        self.command = command
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.key = key
+        self.done = False
+
+class _Lane:
+    """Queue, concurrency and token bucket for one (building, system)"""
+    
+    __slots__ = ("heap", "limit", "in_flight", "tokens", "refilled_at")
+    
+    def __init__(self, limit: CommandLimit):
+        self.heap: List[Tuple[int, int, _Entry]] = []
+        self.limit = limit
+        self.in_flight = 0
+        self.tokens = float(limit.burst)
+        self.refilled_at = time.monotonic()
+    
+    def refill(self, now: float):
+        self.tokens = min(self.limit.burst, self.tokens + (now - self.refilled_at) * self.limit.rate)
+        self.refilled_at = now
+    
+    def pop(self) -> Optional[_Entry]:
+        """Highest-priority live entry, skipping superseded ones"""
+        while self.heap:
+            entry = heapq.heappop(self.heap)[2]
+            if not entry.done:
+                return entry
+        return None
+    
+    def queued(self) -> int:
+        return sum(1 for _, _, entry in self.heap if not entry.done)
+
+def _is_expired(command: RealTimeCommand) -> bool:
+    expires_at = command.expires_at
+    return expires_at is not None and datetime.now(expires_at.tzinfo) > expires_at
+
+def supersede_key(command: RealTimeCommand) -> Optional[Tuple]:
+    if command.command_type not in SUPERSEDABLE_COMMANDS:
+        return None
+    target = next((command.parameters[name] for name in TARGET_PARAMETERS if name in command.parameters), None)
+    return (command.building_id, command.target_system, command.command_type, str(target))
+
+class CommandScheduler:
+    """Per-building, per-system priority queues in front of a command executor"""
+    
+    def __init__(self, executor: CommandExecutor, limits: Optional[Dict[str, CommandLimit]] = None,
+                 default_limit: Optional[CommandLimit] = None, queue_size: int = COMMAND_QUEUE_SIZE):
+        self.executor = executor
+        self.limits = SYSTEM_LIMITS if limits is None else limits
+        self.default_limit = default_limit or CommandLimit(COMMAND_CONCURRENCY, COMMAND_RATE, COMMAND_BURST)
+        self.queue_size = queue_size
+        self.lanes: Dict[Tuple[str, str], _Lane] = {}
+        self.latest: Dict[Tuple, _Entry] = {}  # supersede key -> queued entry
+        self.counts = {
+            "submitted": 0, "dispatched": 0, "completed": 0, "failed": 0,
+            "expired": 0, "superseded": 0, "rejected": 0, "rate_limit_waits": 0
+        }
+        self.latencies: Dict[str, Deque[float]] = {}  # seconds queued before dispatch, per system
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+    
+    def _lane(self, command: RealTimeCommand) -> _Lane:
+        key = (command.building_id, command.target_system)
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = self.lanes[key] = _Lane(self.limits.get(command.target_system, self.default_limit))
+        return lane
+    
+    def submit(self, command: RealTimeCommand) -> asyncio.Future:
+        """Queue a command; the returned future resolves with its result"""
+        future = asyncio.get_running_loop().create_future()
+        self.counts["submitted"] += 1
+        
+        if _is_expired(command):
+            self.counts["expired"] += 1
+            future.set_result({"status": "error", "message": "Command has expired", "command_id": command.command_id})
+            return future
+        
+        lane = self._lane(command)
+        key = supersede_key(command)
+        if key is not None:
+            older = self.latest.get(key)
+            if older is not None and not older.done:
+                self._finish(older, {
+                    "status": "superseded",
+                    "message": f"Superseded by command {command.command_id}",
+                    "command_id": older.command.command_id
+                })
+                self.counts["superseded"] += 1
+        
+        if len(lane.heap) >= self.queue_size and lane.queued() >= self.queue_size:
+            self.counts["rejected"] += 1
+            future.set_result({"status": "error", "message": "Command queue is full", "command_id": command.command_id})
+            return future
+        
+        entry = _Entry(command, future, key)
+        if key is not None:
+            self.latest[key] = entry
+        heapq.heappush(lane.heap, (-command.priority, next(self._sequence), entry))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return future
+    
+    def _finish(self, entry: _Entry, result: Dict[str, Any]):
+        entry.done = True
+        if entry.key is not None and self.latest.get(entry.key) is entry:
+            del self.latest[entry.key]
+        if not entry.future.done():
+            entry.future.set_result(result)
+    
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run_forever())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def run_forever(self):
+        while True:
+            delay = self.dispatch_ready()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    def dispatch_ready(self) -> Optional[float]:
+        """Start every command its lane allows now; returns seconds until a rate-limited lane has a token"""
+        now = time.monotonic()
+        next_token: Optional[float] = None
+        for lane_key in [key for key, lane in self.lanes.items() if lane.heap]:
+            lane = self.lanes[lane_key]
+            while lane.heap and lane.in_flight < lane.limit.concurrency:
+                lane.refill(now)
+                if lane.tokens < 1:
+                    self.counts["rate_limit_waits"] += 1
+                    wait = (1 - lane.tokens) / lane.limit.rate
+                    next_token = wait if next_token is None else min(next_token, wait)
+                    break
+                entry = lane.pop()
+                if entry is None:
+                    break
+                if _is_expired(entry.command):
+                    self.counts["expired"] += 1
+                    self._finish(entry, {"status": "error", "message": "Command has expired",
+                                         "command_id": entry.command.command_id})
+                    continue
+                if entry.key is not None and self.latest.get(entry.key) is entry:
+                    # Running commands are not superseded
+                    del self.latest[entry.key]
+                lane.tokens -= 1
+                lane.in_flight += 1
+                self._record_latency(entry.command.target_system, now - entry.enqueued_at)
+                self.counts["dispatched"] += 1
+                task = asyncio.create_task(self._execute(lane, entry))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+        return next_token
+    
+    async def _execute(self, lane: _Lane, entry: _Entry):
+        try:
+            result = await self.executor(entry.command)
+            self.counts["completed"] += 1
+        except Exception as e:
+            self.counts["failed"] += 1
+            result = {"status": "error", "message": f"Command failed: {e}", "command_id": entry.command.command_id}
+        finally:
+            lane.in_flight -= 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+        self._finish(entry, result)
+    
+    def _record_latency(self, system: str, seconds: float):
+        samples = self.latencies.get(system)
+        if samples is None:
+            samples = self.latencies[system] = deque(maxlen=LATENCY_SAMPLES)
+        samples.append(seconds)
+    
+    def stats(self) -> Dict[str, Any]:
+        queued: Dict[str, int] = {}
+        in_flight: Dict[str, int] = {}
+        for (_, system), lane in self.lanes.items():
+            queued[system] = queued.get(system, 0) + lane.queued()
+            in_flight[system] = in_flight.get(system, 0) + lane.in_flight
+        
+        latency = {}
+        for system, samples in self.latencies.items():
+            ordered = sorted(samples)
+            latency[system] = {
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3)
+            }
+        
+        return {
+            **self.counts,
+            "queued": queued,
+            "in_flight": in_flight,
+            "queue_latency": latency
+        }
+
+# Global instance
+command_scheduler = CommandScheduler(business_logic.process_command)
@@ -2,7 +2,7 @@
 Database configuration and models for Building Performance Dashboard
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
@@ -97,6 +97,11 @@ class SensorData(Base):
     lighting_efficiency = Column(Float, nullable=True)
     created_at = Column(DateTime, default=func.now())
     
+    # Per-building range scans (history reads, streaming exports)
+    __table_args__ = (
+        Index("ix_sensor_data_building_timestamp", "building_id", "timestamp"),
+    )
+    
     # Relationships
     building = relationship("Building", back_populates="sensor_data")
 
@@ -111,6 +116,7 @@ class Anomaly(Base):
     confidence = Column(Float, nullable=False)
     description = Column(Text, nullable=True)
     feature_values = Column(Text, nullable=True)  # JSON string
+    alert_id = Column(String(200), nullable=True, index=True)  # real-time alert that opened this row
     is_resolved = Column(Boolean, default=False)
     resolved_at = Column(DateTime, nullable=True)
     resolved_by = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -148,6 +154,34 @@ class SystemEvent(Base):
     created_at = Column(DateTime, default=func.now())
     resolved_at = Column(DateTime, nullable=True)
 
+class ScanWatermark(Base):
+    __tablename__ = "scan_watermarks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scanner = Column(String(50), nullable=False)  # name of the background scanner
+    building_id = Column(Integer, ForeignKey("buildings.id"), nullable=False)
+    last_sensor_data_id = Column(Integer, nullable=False, default=0)  # highest SensorData.id scanned
+    last_timestamp = Column(DateTime, nullable=True)  # timestamp of that row
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("scanner", "building_id", name="uq_scan_watermarks_scanner_building"),
+    )
+
+class ThresholdProfile(Base):
+    __tablename__ = "threshold_profiles"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(20), nullable=False)  # types, buildings, zones
+    scope_key = Column(String(120), nullable=False)  # building type, building_id, or "building_id:zone"
+    overrides = Column(Text, nullable=False)  # JSON object of ThresholdConfig fields
+    updated_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_key", name="uq_threshold_profiles_scope_key"),
+    )
+
 # Database dependency
 def get_db():
     db = SessionLocal()
@@ -159,6 +193,11 @@ def get_db():
 # Database initialization
 def init_db():
     """Initialize the database with tables and sample data"""
+    # Monthly-partitioned sensor_data is created first; create_all skips existing tables
+    from sensor_partitions import SENSOR_DATA_PARTITIONING, sensor_partitions
+    if SENSOR_DATA_PARTITIONING == "monthly":
+        sensor_partitions.create_table()
+    
     Base.metadata.create_all(bind=engine)
     
     db = SessionLocal()
@@ -0,0 +1,225 @@
+"""
+Device gateways for real-time building commands
+
+Validated commands are handed to a gateway adapter for their target
+system. The dispatcher wraps every call with a timeout, retries failed or
+timed-out calls with exponential backoff, and tracks acknowledgements:
+
+- SimulatedGateway: in-process devices with configurable latency and
+  failure rate, for development and load tests without hardware
+- HTTPGateway: POSTs commands to a building integration service over a
+  pooled keep-alive connection (httpx)
+
+Select the adapter with DEVICE_GATEWAY (simulated or http). Further
+adapters (BACnet, Modbus, MQTT, ...) only have to implement send().
+"""
+
+import asyncio
+import os
+import random
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Deque
+
+from dotenv import load_dotenv
+
+from validators import RealTimeCommand
+
+load_dotenv()
+
+# Gateway settings
+DEVICE_GATEWAY = os.getenv("DEVICE_GATEWAY", "simulated")  # simulated or http
+DEVICE_GATEWAY_URL = os.getenv("DEVICE_GATEWAY_URL", "http://localhost:9000")
+DEVICE_GATEWAY_TIMEOUT = float(os.getenv("DEVICE_GATEWAY_TIMEOUT", "2"))  # seconds per attempt
+DEVICE_GATEWAY_RETRIES = int(os.getenv("DEVICE_GATEWAY_RETRIES", "2"))  # attempts after the first
+DEVICE_GATEWAY_BACKOFF = float(os.getenv("DEVICE_GATEWAY_BACKOFF", "0.1"))  # seconds, doubled per retry
+DEVICE_GATEWAY_CONNECTIONS = int(os.getenv("DEVICE_GATEWAY_CONNECTIONS", "20"))
+SIMULATED_GATEWAY_LATENCY = float(os.getenv("SIMULATED_GATEWAY_LATENCY", "0.005"))  # seconds
+SIMULATED_GATEWAY_FAILURE_RATE = float(os.getenv("SIMULATED_GATEWAY_FAILURE_RATE", "0"))
+
+ACK_SAMPLES = 1024
+
+class GatewayError(Exception):
+    """A gateway could not deliver a command; the dispatcher may retry it"""
+
+class DeviceGateway(ABC):
+    """Base class: delivers one command and returns the device's acknowledgement"""
+    
+    name = "gateway"
+    
+    @abstractmethod
+    async def send(self, command: RealTimeCommand) -> Dict[str, Any]:
+        ...
+    
+    async def close(self):
+        pass
+
+class SimulatedGateway(DeviceGateway):
+    """Applies commands to in-memory device state after a simulated network delay"""
+    
+    name = "simulated"
+    
+    def __init__(self, latency: float = SIMULATED_GATEWAY_LATENCY, failure_rate: float = SIMULATED_GATEWAY_FAILURE_RATE,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.devices: Dict[tuple, Dict[str, Any]] = {}  # (building_id, system) -> state
+    
+    async def send(self, command: RealTimeCommand) -> Dict[str, Any]:
+        if self.latency > 0:
+            # +/- 50% jitter around the configured latency
+            await asyncio.sleep(self.latency * (0.5 + self.random.random()))
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise GatewayError("Simulated device did not respond")
+        
+        state = self.devices.setdefault((command.building_id, command.target_system), {})
+        state.update(command.parameters)
+        state["last_command"] = command.command_type
+        return {
+            "ack_id": uuid.uuid4().hex,
+            "accepted": True,
+            "device_state": dict(state)
+        }
+
+class HTTPGateway(DeviceGateway):
+    """Sends commands to an HTTP integration service, reusing pooled connections"""
+    
+    name = "http"
+    
+    def __init__(self, base_url: str = DEVICE_GATEWAY_URL, max_connections: int = DEVICE_GATEWAY_CONNECTIONS):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self._client = None
+    
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                # The dispatcher enforces the per-call timeout
+                timeout=None
+            )
+        return self._client
+    
+    async def send(self, command: RealTimeCommand) -> Dict[str, Any]:
+        import httpx
+        
+        try:
+            response = await self._get_client().post(
+                f"/buildings/{command.building_id}/{command.target_system}/commands",
+                json=command.model_dump(mode="json")
+            )
+        except httpx.TransportError as e:
+            raise GatewayError(f"Gateway unreachable: {e}") from e
+        if response.status_code >= 500:
+            raise GatewayError(f"Gateway returned HTTP {response.status_code}")
+        if response.status_code >= 400:
+            return {"accepted": False, "error": response.text[:200]}
+        # A 204 or an empty ack is an acceptance without details
+        if not response.content.strip():
+            return {"accepted": True}
+        try:
+            body = response.json()
+        except ValueError as e:
+            raise GatewayError(f"Gateway returned an unreadable acknowledgement: {e}") from e
+        return {"accepted": True, **(body if isinstance(body, dict) else {})}
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def create_gateway(kind: str = DEVICE_GATEWAY) -> DeviceGateway:
+    if kind == "http":
+        return HTTPGateway()
+    if kind == "simulated":
+        return SimulatedGateway()
+    raise ValueError(f"Unknown DEVICE_GATEWAY: {kind}. Must be one of: ['simulated', 'http']")
+
+class CommandDispatcher:
+    """Sends validated commands to the gateway for their system with timeouts, retries and ack tracking"""
+    
+    def __init__(self, gateways: Optional[Dict[str, DeviceGateway]] = None, default: Optional[DeviceGateway] = None,
+                 timeout: float = DEVICE_GATEWAY_TIMEOUT, retries: int = DEVICE_GATEWAY_RETRIES,
+                 backoff: float = DEVICE_GATEWAY_BACKOFF):
+        self.gateways = gateways or {}
+        self.default = default
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pending: Dict[str, Dict[str, Any]] = {}  # command_id -> attempts and start time
+        self.counts = {"sent": 0, "acked": 0, "rejected": 0, "retries": 0, "timeouts": 0, "failed": 0}
+        self.ack_latencies: Deque[float] = deque(maxlen=ACK_SAMPLES)
+    
+    def gateway_for(self, system: str) -> DeviceGateway:
+        gateway = self.gateways.get(system)
+        if gateway is None:
+            if self.default is None:
+                self.default = create_gateway()
+            gateway = self.default
+        return gateway
+    
+    async def dispatch(self, command: RealTimeCommand) -> Dict[str, Any]:
+        """Deliver a command; returns the acknowledgement or the last delivery error"""
+        gateway = self.gateway_for(command.target_system)
+        started = time.monotonic()
+        pending = self.pending[command.command_id] = {"attempts": 0, "started_at": datetime.now().isoformat()}
+        self.counts["sent"] += 1
+        error = None
+        
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.counts["retries"] += 1
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+                pending["attempts"] = attempt + 1
+                try:
+                    ack = await asyncio.wait_for(gateway.send(command), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    self.counts["timeouts"] += 1
+                    error = f"No acknowledgement within {self.timeout:g}s"
+                    continue
+                except GatewayError as e:
+                    error = str(e)
+                    continue
+                
+                self.ack_latencies.append(time.monotonic() - started)
+                self.counts["acked" if ack.get("accepted") else "rejected"] += 1
+                return {"acknowledged": bool(ack.get("accepted")), "attempts": attempt + 1,
+                        "gateway": gateway.name, "ack": ack}
+        finally:
+            self.pending.pop(command.command_id, None)
+        
+        self.counts["failed"] += 1
+        return {"acknowledged": False, "attempts": self.retries + 1, "gateway": gateway.name, "error": error}
+    
+    async def dispatch_many(self, commands: List[RealTimeCommand]) -> List[Dict[str, Any]]:
+        """Deliver commands concurrently"""
+        return await asyncio.gather(*(self.dispatch(command) for command in commands))
+    
+    async def close(self):
+        for gateway in {*self.gateways.values(), *([self.default] if self.default else [])}:
+            await gateway.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.ack_latencies)
+        latency = None
+        if ordered:
+            latency = {
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3)
+            }
+        return {
+            "gateway": self.default.name if self.default else DEVICE_GATEWAY,
+            "awaiting_ack": len(self.pending),
+            **self.counts,
+            "ack_latency": latency
+        }
@@ -0,0 +1,341 @@
+"""
+Event bus for real-time sensor, alert and status events
+
+With several uvicorn workers, each process only sees the WebSocket clients
+connected to it. Workers publish events to the bus and broadcast what the
+bus delivers, so every client receives every building's events whichever
+worker processed the reading.
+
+Backends:
+- inprocess: handlers are called directly (single worker, the default)
+- unix: workers exchange newline-delimited JSON through a broker on a
+  Unix socket. The first worker to take the lock file hosts the broker;
+  if it exits, another worker takes over. The broker can also run on its
+  own with `python event_bus.py`.
+
+Delivery over the unix backend is best effort, and events can be lost in
+two places:
+- a worker keeps at most EVENT_BUS_MAX_PENDING lines while the broker is
+  unreachable and drops the oldest beyond that
+- the broker cuts off a worker whose unread output passes
+  MAX_PEER_BUFFER_BYTES; events relayed until it reconnects are lost
+
+Every event carries its publisher's sequence number, so a receiving worker
+notices a gap. It counts the missed events in stats() and calls its resync
+handlers, which push fresh building status to its clients. Lost alerts are
+not replayed.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+from abc import ABC, abstractmethod
+from collections import deque
+from enum import Enum
+from typing import Dict, Any, List, Callable, Awaitable, Optional, Set
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: run the broker standalone
+    fcntl = None
+
+load_dotenv()
+
+# Bus settings
+EVENT_BUS_BACKEND = os.getenv("EVENT_BUS_BACKEND", "inprocess")
+EVENT_BUS_SOCKET = os.getenv("EVENT_BUS_SOCKET", "/tmp/building-dashboard-events.sock")
+EVENT_BUS_MAX_PENDING = int(os.getenv("EVENT_BUS_MAX_PENDING", "10000"))
+
+# Largest event line accepted, and the broker's per-peer output buffer limit
+MAX_EVENT_BYTES = 1024 * 1024
+MAX_PEER_BUFFER_BYTES = 16 * 1024 * 1024
+
+class EventType(str, Enum):
+    SENSOR = "sensor"
+    ALERT = "alert"
+    STATUS = "status"
+    THRESHOLDS = "thresholds"
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+ResyncHandler = Callable[[], Awaitable[None]]
+
+# Identifies the publishing process so handlers can skip their own events
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def acquire_broker_lock(lock_path: str):
+    """Take the broker lock without blocking; returns the open lock file or None"""
+    if fcntl is None:
+        return None
+    lock_file = open(lock_path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    # Held for the life of the process; the OS releases it if the process dies
+    return lock_file
+
+class EventBus(ABC):
+    """Publish/subscribe interface shared by all backends"""
+    
+    backend = "base"
+    
+    def __init__(self):
+        self.handlers: List[EventHandler] = []
+        self.resync_handlers: List[ResyncHandler] = []
+        self.published = 0
+        self.delivered = 0
+    
+    def subscribe(self, handler: EventHandler):
+        self.handlers.append(handler)
+    
+    def on_resync(self, handler: ResyncHandler):
+        """Called after events from another worker were lost"""
+        self.resync_handlers.append(handler)
+    
+    async def start(self):
+        pass
+    
+    async def stop(self):
+        pass
+    
+    @abstractmethod
+    async def publish(self, event_type: EventType, building_id: str, data: Any):
+        ...
+    
+    def make_event(self, event_type: EventType, building_id: str, data: Any) -> Dict[str, Any]:
+        """Event from this worker; seq counts this worker's published events"""
+        self.published += 1
+        return {
+            "type": EventType(event_type).value,
+            "building_id": building_id,
+            "data": data,
+            "origin": WORKER_ID,
+            "seq": self.published
+        }
+    
+    async def _dispatch(self, event: Dict[str, Any]):
+        self.delivered += 1
+        for handler in self.handlers:
+            try:
+                await handler(event)
+            except Exception as e:
+                print(f"Event handler failed for {event.get('type')} event: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "worker_id": WORKER_ID, "published": self.published, "delivered": self.delivered}
+
+class InProcessEventBus(EventBus):
+    """Delivers events to handlers in the publishing process"""
+    
+    backend = "inprocess"
+    
+    async def publish(self, event_type: EventType, building_id: str, data: Any):
+        await self._dispatch(self.make_event(event_type, building_id, data))
+
+class EventBroker:
+    """Relays every event line to all connected workers, including the sender"""
+    
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.peers: Set[asyncio.StreamWriter] = set()
+        self.dropped_peers = 0
+        self._server = None
+    
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale socket from a broker that died
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.socket_path, limit=MAX_EVENT_BYTES)
+    
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for peer in list(self.peers):
+            peer.close()
+    
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(self.peers):
+                    # A peer that stops reading is cut off; it reconnects and detects the gap
+                    if peer.transport.get_write_buffer_size() > MAX_PEER_BUFFER_BYTES:
+                        self.dropped_peers += 1
+                        print("Event broker cut off a worker that stopped reading")
+                        self.peers.discard(peer)
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            # Cancellation comes from the broker shutting down; end the peer quietly
+            pass
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+    
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+class UnixSocketEventBus(EventBus):
+    """Exchanges events with other workers on this machine through a Unix socket broker"""
+    
+    backend = "unix"
+    
+    def __init__(self, socket_path: str = EVENT_BUS_SOCKET, max_pending: int = EVENT_BUS_MAX_PENDING):
+        super().__init__()
+        self.socket_path = socket_path
+        self.lock_path = socket_path + ".lock"
+        # Lines published while the broker is unreachable, sent on reconnect
+        self._pending: deque = deque(maxlen=max_pending)
+        self.pending_dropped = 0
+        # Last sequence number received from each publishing worker
+        self._last_seq: Dict[str, int] = {}
+        self.missed = 0
+        self.gaps = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        self.broker: Optional[EventBroker] = None
+        self.connections = 0
+    
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        if self.broker is not None:
+            await self.broker.stop()
+        if self._lock_file is not None:
+            self._lock_file.close()
+    
+    async def _try_become_broker(self):
+        if self.broker is not None:
+            return
+        lock_file = acquire_broker_lock(self.lock_path)
+        if lock_file is None:
+            return
+        self._lock_file = lock_file
+        self.broker = EventBroker(self.socket_path)
+        await self.broker.start()
+    
+    async def _run(self):
+        backoff = 0.05
+        while True:
+            await self._try_become_broker()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MAX_EVENT_BYTES)
+            except OSError:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 2.0)
+                continue
+            
+            backoff = 0.05
+            self.connections += 1
+            while self._pending:
+                writer.write(self._pending.popleft())
+            self._writer = writer
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    event = json.loads(line)
+                    if self._check_sequence(event):
+                        await self._resync()
+                    await self._dispatch(event)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+    
+    def _check_sequence(self, event: Dict[str, Any]) -> bool:
+        """Track the publisher's sequence number; True when events from it were missed"""
+        origin, seq = event.get("origin"), event.get("seq")
+        if origin is None or seq is None:
+            return False
+        last = self._last_seq.get(origin)
+        if last is not None and seq <= last:
+            return False
+        self._last_seq[origin] = seq
+        # The first event from a worker only sets the baseline
+        if last is None or seq == last + 1:
+            return False
+        self.missed += seq - last - 1
+        self.gaps += 1
+        return True
+    
+    async def _resync(self):
+        for handler in self.resync_handlers:
+            try:
+                await handler()
+            except Exception as e:
+                print(f"Event bus resync handler failed: {e}")
+    
+    def _queue(self, line: bytes):
+        if len(self._pending) == self._pending.maxlen:
+            self.pending_dropped += 1
+        self._pending.append(line)
+    
+    async def publish(self, event_type: EventType, building_id: str, data: Any):
+        line = json.dumps(self.make_event(event_type, building_id, data), default=str).encode() + b"\n"
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            self._queue(line)
+            return
+        try:
+            writer.write(line)
+            await writer.drain()
+        except ConnectionError:
+            self._queue(line)
+    
+    def stats(self) -> Dict[str, Any]:
+        data = super().stats()
+        data.update({
+            "socket_path": self.socket_path,
+            "connected": self._writer is not None,
+            "pending": len(self._pending),
+            "pending_dropped": self.pending_dropped,
+            "missed": self.missed,
+            "gaps": self.gaps,
+            "connections": self.connections,
+            "is_broker": self.broker is not None,
+            "broker_peers": len(self.broker.peers) if self.broker else None,
+            "broker_dropped_peers": self.broker.dropped_peers if self.broker else None
+        })
+        return data
+
+def create_event_bus(backend: str = EVENT_BUS_BACKEND) -> EventBus:
+    if backend == "inprocess":
+        return InProcessEventBus()
+    if backend == "unix":
+        return UnixSocketEventBus()
+    raise ValueError(f"Unknown event bus backend: {backend}. Must be one of: ['inprocess', 'unix']")
+
+# Global instance
+event_bus = create_event_bus()
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else EVENT_BUS_SOCKET
+    broker_lock = acquire_broker_lock(path + ".lock")
+    if broker_lock is None and fcntl is not None:
+        print(f"❌ Another broker already serves {path}")
+        sys.exit(1)
+    print(f"📡 Event broker listening on {path}")
+    try:
+        asyncio.run(EventBroker(path).serve_forever())
+    except KeyboardInterrupt:
+        print("\n🛑 Event broker stopped")
@@ -0,0 +1,232 @@
+"""
+In-process job queue and result cache for heavy analytics requests
+
+Jobs run on a fixed number of workers off the event loop. Identical
+requests share one computation: a job is keyed by its type, parameters and
+the building's data watermark, so a request arriving while the same job is
+queued or running joins it, and a finished result is served from the cache
+until its TTL expires or new readings move the watermark.
+
+The queue is an asyncio.Queue inside the API process, so it needs no
+external broker. A broker-backed queue only has to provide the same
+submit/get_job interface.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Tuple
+
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from services import BuildingService
+from model_jobs import JobStatus, FINISHED_STATUSES
+
+load_dotenv()
+
+# Queue settings
+ANALYTICS_JOB_WORKERS = int(os.getenv("ANALYTICS_JOB_WORKERS", "2"))
+ANALYTICS_RESULT_TTL = float(os.getenv("ANALYTICS_RESULT_TTL", "600"))  # seconds
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+
+# Job type -> handler(db, building_id, params); handlers run in a worker thread
+JOB_HANDLERS: Dict[str, Callable] = {}
+
+def job_handler(job_type: str):
+    def register(func: Callable) -> Callable:
+        JOB_HANDLERS[job_type] = func
+        return func
+    return register
+
+@job_handler("usage_clusters")
+def _usage_clusters(db, building_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    from ai_models import ai_models
+    start_time = datetime.now() - timedelta(hours=params["hours"])
+    return ai_models.cluster_daily_profiles(
+        lambda: BuildingService.stream_sensor_frames(db, [building_id], start_time=start_time),
+        n_clusters=params.get("n_clusters")
+    )
+
+@job_handler("anomaly_scan")
+def _anomaly_scan(db, building_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    import pandas as pd
+    from ai_models import ai_models
+    start_time = datetime.now() - timedelta(hours=params["hours"])
+    frames = list(BuildingService.stream_sensor_frames(db, [building_id], start_time=start_time))
+    if not frames:
+        return {"rows_scanned": 0, "anomalies": []}
+    building_data = pd.concat(frames, ignore_index=True)
+    return {"rows_scanned": len(building_data), "anomalies": ai_models.detect_anomalies(building_data)}
+
+@job_handler("daily_aggregates")
+def _daily_aggregates(db, building_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {"days": BuildingService.get_daily_aggregates(db, building_id, params["hours"])}
+
+@dataclass
+class AnalyticsJob:
+    job_id: str
+    job_type: str
+    building_id: str
+    params: Dict[str, Any]
+    cache_key: str
+    watermark: int
+    status: JobStatus = JobStatus.PENDING
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "job_type": self.job_type,
+            "building_id": self.building_id,
+            "params": self.params,
+            "status": self.status.value,
+            "data_watermark": self.watermark,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error
+        }
+
+class ResultCache:
+    """LRU cache of finished jobs with a time-to-live"""
+
+    def __init__(self, ttl: float = ANALYTICS_RESULT_TTL, max_entries: int = ANALYTICS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, AnalyticsJob]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[AnalyticsJob]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, job = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return job
+
+    def put(self, key: str, job: AnalyticsJob):
+        self._entries[key] = (time.monotonic() + self.ttl, job)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class JobQueue:
+    """Bounded-concurrency job queue with request de-duplication"""
+
+    def __init__(self, workers: int = ANALYTICS_JOB_WORKERS, cache: Optional[ResultCache] = None,
+                 max_jobs: int = 1000):
+        self.workers = workers
+        self.cache = cache or ResultCache()
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, AnalyticsJob]" = OrderedDict()
+        self._in_flight: Dict[str, AnalyticsJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks = []
+
+    @staticmethod
+    def make_key(job_type: str, building_id: str, params: Dict[str, Any], watermark: int) -> str:
+        payload = json.dumps([job_type, building_id, params, watermark], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, job_type: str, building_id: str, params: Dict[str, Any]) -> Tuple[AnalyticsJob, str]:
+        """Return the job serving this request and its source: new, in_flight or cached"""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job type: {job_type}. Must be one of: {sorted(JOB_HANDLERS)}")
+        self._ensure_workers()
+
+        watermark = await asyncio.to_thread(self._read_watermark, building_id)
+        key = self.make_key(job_type, building_id, params, watermark)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._remember(cached)
+            return cached, "cached"
+        if key in self._in_flight:
+            return self._in_flight[key], "in_flight"
+
+        job = AnalyticsJob(
+            job_id=uuid.uuid4().hex,
+            job_type=job_type,
+            building_id=building_id,
+            params=params,
+            cache_key=key,
+            watermark=watermark
+        )
+        self._in_flight[key] = job
+        self._remember(job)
+        await self._queue.put(job)
+        return job, "new"
+
+    def get_job(self, job_id: str) -> Optional[AnalyticsJob]:
+        return self.jobs.get(job_id)
+
+    def _remember(self, job: AnalyticsJob):
+        self.jobs[job.job_id] = job
+        self.jobs.move_to_end(job.job_id)
+        while len(self.jobs) > self.max_jobs:
+            oldest_id = next(iter(self.jobs))
+            if self.jobs[oldest_id].status not in FINISHED_STATUSES:
+                break
+            del self.jobs[oldest_id]
+
+    @staticmethod
+    def _read_watermark(building_id: str) -> int:
+        db = SessionLocal()
+        try:
+            return BuildingService.get_data_watermark(db, building_id)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _execute(job: AnalyticsJob) -> Any:
+        db = SessionLocal()
+        try:
+            return JOB_HANDLERS[job.job_type](db, job.building_id, job.params)
+        finally:
+            db.close()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = datetime.now()
+            try:
+                job.result = await asyncio.to_thread(self._execute, job)
+                job.status = JobStatus.COMPLETED
+            except Exception as e:
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.now()
+                self._in_flight.pop(job.cache_key, None)
+                self._queue.task_done()
+
+            if job.status == JobStatus.COMPLETED:
+                self.cache.put(job.cache_key, job)
+
+    def shutdown(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+        self._queue = None
+
+# Global instance
+analytics_queue = JobQueue()
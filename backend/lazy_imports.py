@@ -0,0 +1,29 @@
+"""
+Deferred imports for heavy optional dependencies
+
+numpy, pandas and scikit-learn take over a second to import. Modules that
+only need them inside ML code paths bind a LazyModule instead, so the API
+process starts without loading them and pays the cost on first use.
+"""
+
+import importlib
+from types import ModuleType
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
@@ -1,16 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Request, Response, Query
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+import asyncio
 import json
 import random
 import os
+import tempfile
+from starlette.background import BackgroundTask
 
 # Import database and services
-from database import get_db, init_db
-from services import UserService, BuildingService, AnomalyService, PredictionService, AuthService
+from database import get_db, init_db, SessionLocal
+from services import UserService, BuildingService, AnomalyService, PredictionService, AuthService, ThresholdProfileService
+from model_jobs import model_job_runner, ModelTask
+from anomaly_scanner import anomaly_scanner, ANOMALY_SCAN_INTERVAL
+from job_queue import analytics_queue
+from model_jobs import JobStatus
+from websocket_hub import connection_hub, SlowConsumerPolicy
+from ws_encoding import WireEncoding
+from command_scheduler import command_scheduler
+from business_logic import business_logic
+from event_bus import event_bus, EventType
+from alert_history import load_alert_history
+from threshold_profiles import PROFILE_SCOPES
+from validators import validate_sensor_batch_json
+from responses import FastJSONResponse, DataFormat, arrow_stream, ARROW_MEDIA_TYPE
+from export import run_export
+from archive import sensor_archive, ARCHIVE_INTERVAL
+from analytics_engine import analytics_engine, ANALYTICS_SYNC_INTERVAL, DEFAULT_PERCENTILES
+from sensor_partitions import sensor_partitions, PARTITION_MAINTENANCE_INTERVAL
 from sqlalchemy.orm import Session
 
 app = FastAPI(
@@ -63,6 +84,17 @@ class SensorDataCreate(BaseModel):
     hvac_efficiency: Optional[float] = None
     lighting_efficiency: Optional[float] = None
 
+class ModelJobRequest(BaseModel):
+    task: ModelTask
+    building_ids: Optional[List[str]] = None  # defaults to all of the user's buildings
+    hours: int = 168
+
+class AnalyticsJobRequest(BaseModel):
+    job_type: str  # usage_clusters, anomaly_scan, daily_aggregates
+    building_id: str
+    hours: int = 24 * 30
+    n_clusters: Optional[int] = None  # usage_clusters only; chosen automatically when omitted
+
 # Dependency to get current user from JWT token
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -141,10 +173,11 @@ async def get_buildings(
     
     return {"buildings": buildings_data}
 
-@app.get("/api/buildings/{building_id}/data")
+@app.get("/api/buildings/{building_id}/data", response_class=FastJSONResponse)
 async def get_building_data(
     building_id: str,
     hours: int = 24,
+    format: DataFormat = DataFormat.ROWS,
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -155,9 +188,61 @@ async def get_building_data(
     if building_id not in building_ids:
         raise HTTPException(status_code=404, detail="Building not found or access denied")
     
-    data = BuildingService.get_building_data(db, building_id, hours)
+    if format == DataFormat.ROWS:
+        data = BuildingService.get_building_data(db, building_id, hours)
+        return FastJSONResponse({"building_id": building_id, "data": data})
+    
+    series = BuildingService.get_building_series(db, building_id, hours)
+    if format == DataFormat.ARROW:
+        try:
+            body = arrow_stream({"timestamp": series["timestamps"], **series["series"]},
+                                metadata={"building_id": building_id})
+        except ImportError:
+            raise HTTPException(status_code=406, detail="Arrow format requires pyarrow on the server")
+        return Response(content=body, media_type=ARROW_MEDIA_TYPE)
+    
+    return FastJSONResponse({
+        "building_id": building_id,
+        "format": format.value,
+        "count": len(series["timestamps"]),
+        **series
+    })
+
+@app.get("/api/export/sensor-data")
+async def export_sensor_history(
+    building_ids: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Sensor history of the given buildings (default: all accessible) as a Parquet file"""
+    user_buildings = UserService.get_user_buildings(db, current_user.id)
+    accessible = [b.building_id for b in user_buildings]
+    
+    if building_ids is None:
+        building_ids = accessible
+    elif any(building_id not in accessible for building_id in building_ids):
+        raise HTTPException(status_code=404, detail="Building not found or access denied")
+    if not building_ids:
+        raise HTTPException(status_code=404, detail="No accessible buildings to export")
+    
+    # Row groups are written to a temporary file off the event loop, then streamed;
+    # the worker thread opens its own session rather than sharing the request's
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(run_export, path, building_ids, start, end)
+    except ImportError:
+        os.unlink(path)
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow on the server")
+    except Exception:
+        os.unlink(path)
+        raise
     
-    return {"building_id": building_id, "data": data}
+    period = f"{start.date() if start else 'start'}_{(end or datetime.now()).date()}"
+    return FileResponse(path, media_type="application/vnd.apache.parquet", filename=f"sensor_data_{period}.parquet",
+                        background=BackgroundTask(os.unlink, path))
 
 @app.post("/api/buildings/{building_id}/sensor-data")
 async def create_sensor_data(
@@ -205,7 +290,7 @@ async def create_sensor_data(
     }
 
 # AI/ML endpoints
-@app.post("/api/predictions")
+@app.post("/api/predictions", response_class=FastJSONResponse)
 async def get_predictions(
     request: PredictionRequest,
     current_user = Depends(get_current_user),
@@ -222,13 +307,13 @@ async def get_predictions(
         db, request.building_id, request.feature, request.hours_ahead
     )
     
-    return {
+    return FastJSONResponse({
         "building_id": request.building_id,
         "feature": request.feature,
         "predictions": predictions
-    }
+    })
 
-@app.get("/api/anomalies/{building_id}")
+@app.get("/api/anomalies/{building_id}", response_class=FastJSONResponse)
 async def get_anomalies(
     building_id: str,
     limit: int = 10,
@@ -244,7 +329,7 @@ async def get_anomalies(
     
     anomalies = AnomalyService.get_anomalies(db, building_id, limit)
     
-    return {"building_id": building_id, "anomalies": anomalies}
+    return FastJSONResponse({"building_id": building_id, "anomalies": anomalies})
 
 @app.post("/api/anomalies/{building_id}")
 async def create_anomaly(
@@ -270,6 +355,389 @@ async def create_anomaly(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Model job endpoints
+@app.post("/api/jobs/models", status_code=status.HTTP_202_ACCEPTED)
+async def submit_model_job(
+    request: ModelJobRequest,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if user has access to the requested buildings
+    user_buildings = UserService.get_user_buildings(db, current_user.id)
+    building_ids = [b.building_id for b in user_buildings]
+    
+    requested = request.building_ids if request.building_ids is not None else building_ids
+    denied = [b for b in requested if b not in building_ids]
+    if denied:
+        raise HTTPException(status_code=404, detail=f"Buildings not found or access denied: {denied}")
+    if not requested:
+        raise HTTPException(status_code=400, detail="No buildings to process")
+    
+    job = model_job_runner.submit(request.task, requested, request.hours)
+    return job.to_dict()
+
+def _get_model_job_for_user(job_id: str, current_user, db: Session):
+    job = model_job_runner.get_job(job_id)
+    if job:
+        user_buildings = UserService.get_user_buildings(db, current_user.id)
+        accessible = [b.building_id for b in user_buildings]
+        if all(building_id in accessible for building_id in job.building_ids):
+            return job
+    raise HTTPException(status_code=404, detail="Job not found")
+
+@app.get("/api/jobs/models/{job_id}")
+async def get_model_job(
+    job_id: str,
+    include_results: bool = False,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = _get_model_job_for_user(job_id, current_user, db)
+    return job.to_dict(include_results=include_results)
+
+@app.delete("/api/jobs/models/{job_id}")
+async def cancel_model_job(
+    job_id: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    _get_model_job_for_user(job_id, current_user, db)
+    job = model_job_runner.cancel(job_id)
+    return job.to_dict()
+
+# Analytics job endpoints
+@app.post("/api/analytics/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_analytics_job(
+    request: AnalyticsJobRequest,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if user has access to this building
+    user_buildings = UserService.get_user_buildings(db, current_user.id)
+    building_ids = [b.building_id for b in user_buildings]
+    
+    if request.building_id not in building_ids:
+        raise HTTPException(status_code=404, detail="Building not found or access denied")
+    
+    params = {"hours": request.hours}
+    if request.job_type == "usage_clusters":
+        params["n_clusters"] = request.n_clusters
+    
+    try:
+        job, source = await analytics_queue.submit(request.job_type, request.building_id, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {**job.to_dict(), "source": source}
+
+def _get_analytics_job_for_user(job_id: str, current_user, db: Session):
+    job = analytics_queue.get_job(job_id)
+    if job:
+        user_buildings = UserService.get_user_buildings(db, current_user.id)
+        if job.building_id in [b.building_id for b in user_buildings]:
+            return job
+    raise HTTPException(status_code=404, detail="Job not found")
+
+@app.get("/api/analytics/jobs/{job_id}")
+async def get_analytics_job(
+    job_id: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return _get_analytics_job_for_user(job_id, current_user, db).to_dict()
+
+@app.get("/api/analytics/jobs/{job_id}/result")
+async def get_analytics_job_result(
+    job_id: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = _get_analytics_job_for_user(job_id, current_user, db)
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.error}")
+    if job.status != JobStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status.value}")
+    
+    return {**job.to_dict(), "result": job.result}
+
+# Portfolio analytics endpoints (embedded DuckDB over Parquet history)
+def _accessible_building_ids(building_ids: Optional[List[str]], current_user, db: Session) -> List[str]:
+    user_buildings = UserService.get_user_buildings(db, current_user.id)
+    accessible = [b.building_id for b in user_buildings]
+    
+    if building_ids is None:
+        return accessible
+    if any(building_id not in accessible for building_id in building_ids):
+        raise HTTPException(status_code=404, detail="Building not found or access denied")
+    return building_ids
+
+async def _run_analytics(query, *args):
+    try:
+        result = await asyncio.to_thread(query, *args)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Portfolio analytics requires duckdb on the server")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(result)
+
+@app.get("/api/analytics/portfolio/summary", response_class=FastJSONResponse)
+async def get_portfolio_summary(
+    building_ids: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    building_ids = _accessible_building_ids(building_ids, current_user, db)
+    return await _run_analytics(analytics_engine.summary, building_ids, start, end)
+
+@app.get("/api/analytics/portfolio/percentiles", response_class=FastJSONResponse)
+async def get_portfolio_percentiles(
+    metric: str = "energy_consumption",
+    percentiles: List[float] = Query(DEFAULT_PERCENTILES),
+    building_ids: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    building_ids = _accessible_building_ids(building_ids, current_user, db)
+    return await _run_analytics(analytics_engine.percentiles, metric, percentiles, building_ids, start, end)
+
+@app.get("/api/analytics/portfolio/rollup", response_class=FastJSONResponse)
+async def get_portfolio_rollup(
+    bucket: str = "month",
+    building_ids: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    building_ids = _accessible_building_ids(building_ids, current_user, db)
+    return await _run_analytics(analytics_engine.rollup, bucket, building_ids, start, end)
+
+@app.get("/api/analytics/portfolio/compare", response_class=FastJSONResponse)
+async def compare_portfolio_periods(
+    baseline_start: datetime,
+    baseline_end: datetime,
+    start: datetime,
+    end: datetime,
+    building_ids: Optional[List[str]] = Query(None),
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    building_ids = _accessible_building_ids(building_ids, current_user, db)
+    return await _run_analytics(analytics_engine.compare, baseline_start, baseline_end, start, end, building_ids)
+
+@app.post("/api/analytics/portfolio/sync")
+async def sync_portfolio_analytics(current_user = Depends(get_current_user)):
+    """Refresh the engine's snapshot of readings not yet archived"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only administrators can sync portfolio analytics")
+    try:
+        return await asyncio.to_thread(analytics_engine.sync)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Analytics sync requires pyarrow on the server")
+
+@app.get("/api/analytics/portfolio/stats")
+async def get_portfolio_analytics_stats(current_user = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only administrators can view analytics engine stats")
+    return analytics_engine.stats()
+
+# Real-time WebSocket endpoints
+def _websocket_user_can_access(token: Optional[str], building_id: str) -> bool:
+    """Browsers can't set headers on WebSocket requests, so the JWT comes as ?token="""
+    payload = AuthService.verify_token(token) if token else None
+    if payload is None:
+        return False
+    
+    db = SessionLocal()
+    try:
+        user = UserService.get_user_by_username(db, payload.get("username"))
+        if user is None:
+            return False
+        user_buildings = UserService.get_user_buildings(db, user.id)
+        return building_id in [b.building_id for b in user_buildings]
+    finally:
+        db.close()
+
+@app.websocket("/api/v2/ws/{building_id}")
+async def building_websocket(
+    websocket: WebSocket,
+    building_id: str,
+    token: Optional[str] = None,
+    policy: Optional[SlowConsumerPolicy] = None,
+    deltas: bool = False,
+    encoding: WireEncoding = WireEncoding.JSON
+):
+    if not _websocket_user_can_access(token, building_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    client = await connection_hub.connect(building_id, websocket, policy=policy, deltas=deltas, encoding=encoding)
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            raw = frame.get("text")
+            await connection_hub.handle_message(client, raw if raw is not None else frame.get("bytes"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection_hub.disconnect(client)
+
+@app.get("/api/v2/realtime/stats")
+async def get_realtime_stats(
+    include_connections: bool = False,
+    current_user = Depends(get_current_user)
+):
+    return {
+        **connection_hub.stats(include_connections=include_connections),
+        "event_bus": event_bus.stats(),
+        "state_store": business_logic.state_store.stats(),
+        "alerts": business_logic.alert_tracker.stats(),
+        "commands": command_scheduler.stats(),
+        "gateways": business_logic.dispatcher.stats(),
+        "alert_history": {**business_logic.alert_history.stats(), "writer": business_logic.alert_writer.stats()}
+    }
+
+@app.get("/api/v2/realtime/thresholds")
+async def get_threshold_profiles(current_user = Depends(get_current_user)):
+    return business_logic.profiles.describe()
+
+@app.get("/api/v2/realtime/thresholds/{building_id}")
+async def get_building_thresholds(
+    building_id: str,
+    zone: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if user has access to this building
+    user_buildings = UserService.get_user_buildings(db, current_user.id)
+    building_ids = [b.building_id for b in user_buildings]
+    
+    if building_id not in building_ids:
+        raise HTTPException(status_code=404, detail="Building not found or access denied")
+    
+    profile = business_logic.profiles.resolve(building_id, zone)
+    return {
+        "building_id": building_id,
+        "zone": zone,
+        "sources": profile.sources,
+        "thresholds": profile.thresholds,
+        "rules": [rule._asdict() for rule in profile.rules]
+    }
+
+@app.put("/api/v2/realtime/thresholds/{scope}/{scope_key}")
+async def set_threshold_profile(
+    scope: str,
+    scope_key: str,
+    overrides: Dict[str, Any],
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only administrators can change thresholds")
+    if scope not in PROFILE_SCOPES:
+        raise HTTPException(status_code=400, detail=f"Invalid scope. Must be one of: {list(PROFILE_SCOPES)}")
+    try:
+        overrides = business_logic.profiles.validate(overrides)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    profile = ThresholdProfileService.set_profile(db, scope, scope_key, overrides, current_user.id)
+    # Every worker reloads its profiles; new limits apply from the next reading
+    await event_bus.publish(EventType.THRESHOLDS, scope_key, {"scope": scope})
+    return {
+        "scope": profile.scope,
+        "scope_key": profile.scope_key,
+        "overrides": overrides,
+        "updated_at": profile.updated_at.isoformat() if profile.updated_at else None
+    }
+
+@app.delete("/api/v2/realtime/thresholds/{scope}/{scope_key}")
+async def delete_threshold_profile(
+    scope: str,
+    scope_key: str,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only administrators can change thresholds")
+    if not ThresholdProfileService.delete_profile(db, scope, scope_key):
+        raise HTTPException(status_code=404, detail="Threshold profile not found")
+    
+    await event_bus.publish(EventType.THRESHOLDS, scope_key, {"scope": scope})
+    return {"message": "Threshold profile deleted"}
+
+@app.post("/api/v2/realtime/thresholds/reload")
+async def reload_threshold_profiles(current_user = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only administrators can change thresholds")
+    
+    await event_bus.publish(EventType.THRESHOLDS, "*", {"scope": None})
+    return {"message": "Threshold profiles reload requested"}
+
+@app.post("/api/v2/realtime/{building_id}/sensor-data/batch")
+async def process_sensor_data_batch(
+    building_id: str,
+    request: Request,
+    window_rules: bool = True,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if user has access to this building
+    user_buildings = UserService.get_user_buildings(db, current_user.id)
+    building_ids = [b.building_id for b in user_buildings]
+    
+    if building_id not in building_ids:
+        raise HTTPException(status_code=404, detail="Building not found or access denied")
+    
+    # The body is validated as one batch; invalid rows are reported and skipped
+    try:
+        readings, errors = validate_sensor_batch_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
+    if any(reading.building_id != building_id for reading in readings):
+        raise HTTPException(status_code=400, detail=f"All readings must be for building {building_id}")
+    
+    alerts = await business_logic.process_sensor_batch(readings, window_rules=window_rules)
+    
+    for alert in alerts:
+        await event_bus.publish(EventType.ALERT, building_id, alert.model_dump(mode="json"))
+    if readings:
+        await event_bus.publish(EventType.STATUS, building_id, business_logic.get_system_status(building_id))
+    
+    return {
+        "building_id": building_id,
+        "processed": len(readings),
+        "rejected": len(errors),
+        "errors": errors,
+        "alerts": len(alerts)
+    }
+
+@app.get("/api/v2/realtime/{building_id}/alerts")
+async def get_realtime_alerts(
+    building_id: str,
+    limit: int = 50,
+    current_user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if user has access to this building
+    user_buildings = UserService.get_user_buildings(db, current_user.id)
+    building_ids = [b.building_id for b in user_buildings]
+    
+    if building_id not in building_ids:
+        raise HTTPException(status_code=404, detail="Building not found or access denied")
+    
+    return {
+        "building_id": building_id,
+        "open": business_logic.get_open_alerts(building_id),
+        "history": business_logic.get_alert_history(building_id, limit)
+    }
+
 # User management endpoints
 @app.get("/api/users/me")
 async def get_current_user_info(current_user = Depends(get_current_user)):
@@ -325,12 +793,78 @@ async def initialize_database():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database initialization failed: {str(e)}")
 
+async def reload_thresholds_on_event(event: Dict[str, Any]):
+    if event["type"] == EventType.THRESHOLDS:
+        await asyncio.to_thread(business_logic.profiles.load)
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     print("🚀 Starting Building Performance Dashboard API with MySQL Database")
     print("📊 Database URL:", os.getenv("DATABASE_URL", "mysql+pymysql://root@localhost:3306/building_dashboard"))
     print("🔧 API Documentation available at: http://localhost:8000/docs")
+    
+    # Latest readings shared with the other workers; the first worker starts the segment empty
+    business_logic.state_store.open()
+    
+    # Real-time events reach this worker's WebSocket clients through the bus
+    event_bus.subscribe(connection_hub.on_event)
+    event_bus.on_resync(connection_hub.on_resync)
+    event_bus.subscribe(reload_thresholds_on_event)
+    await event_bus.start()
+    
+    # Threshold profiles from the file and the threshold_profiles table
+    await asyncio.to_thread(business_logic.profiles.load)
+    
+    # Recent alerts from before the restart; new transitions are written in batches
+    try:
+        await asyncio.to_thread(load_alert_history, business_logic.alert_history)
+    except Exception as e:
+        print(f"Alert history not loaded: {e}")
+    business_logic.alert_writer.start()
+    command_scheduler.start()
+    
+    # Run one scanner per deployment: enable it on a single worker or use `python anomaly_scanner.py`
+    if ANOMALY_SCAN_INTERVAL > 0:
+        app.state.anomaly_scan_task = asyncio.create_task(anomaly_scanner.run_forever(ANOMALY_SCAN_INTERVAL))
+        print(f"🔎 Anomaly scanner running every {ANOMALY_SCAN_INTERVAL:g}s")
+
+    # Like the scanner, archive from one worker only, or with `python archive.py` from cron
+    if ARCHIVE_INTERVAL > 0:
+        app.state.archive_task = asyncio.create_task(sensor_archive.run_forever(ARCHIVE_INTERVAL))
+        print(f"🗄️ Archiving readings older than {sensor_archive.older_than_days} days every {ARCHIVE_INTERVAL:g}s")
+    
+    if ANALYTICS_SYNC_INTERVAL > 0:
+        app.state.analytics_sync_task = asyncio.create_task(analytics_engine.run_forever(ANALYTICS_SYNC_INTERVAL))
+        print(f"📐 Analytics snapshot refreshed every {ANALYTICS_SYNC_INTERVAL:g}s")
+    
+    # Partition DDL takes metadata locks; run it from one worker or `python sensor_partitions.py` from cron
+    if PARTITION_MAINTENANCE_INTERVAL > 0:
+        app.state.partition_task = asyncio.create_task(sensor_partitions.run_forever(PARTITION_MAINTENANCE_INTERVAL))
+        print(f"🧱 sensor_data partition maintenance every {PARTITION_MAINTENANCE_INTERVAL:g}s")
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    model_job_runner.shutdown()
+    analytics_queue.shutdown()
+    await command_scheduler.stop()
+    await business_logic.dispatcher.close()
+    await business_logic.alert_writer.stop()
+    await event_bus.stop()
+    business_logic.state_store.close()
+    scan_task = getattr(app.state, "anomaly_scan_task", None)
+    if scan_task:
+        scan_task.cancel()
+    archive_task = getattr(app.state, "archive_task", None)
+    if archive_task:
+        archive_task.cancel()
+    analytics_sync_task = getattr(app.state, "analytics_sync_task", None)
+    if analytics_sync_task:
+        analytics_sync_task.cancel()
+    partition_task = getattr(app.state, "partition_task", None)
+    if partition_task:
+        partition_task.cancel()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,250 @@
+"""
+Process-pool job runner for per-building model training and batch scoring
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Dict, List, Optional, Any
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Runner settings
+MODEL_JOB_WORKERS = int(os.getenv("MODEL_JOB_WORKERS", "0")) or os.cpu_count() or 1
+MODEL_JOB_TASK_TIMEOUT = float(os.getenv("MODEL_JOB_TASK_TIMEOUT", "300"))
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+
+FINISHED_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED, JobStatus.TIMED_OUT}
+
+class ModelTask(str, Enum):
+    TRAIN = "train"
+    SCORE = "score"
+
+# Worker process state
+_worker_models = None
+
+def _init_worker():
+    """Per-process setup: one model instance per worker"""
+    global _worker_models
+    from ai_models import BuildingAIModels
+    _worker_models = BuildingAIModels()
+
+def _on_task_timeout(signum, frame):
+    raise TimeoutError("Task exceeded its time limit")
+
+def _run_building_task(task: str, building_id: str, hours: int, timeout: float) -> Dict[str, Any]:
+    """
+    Train or score one building inside a worker process.
+
+    Where SIGALRM is available the worker interrupts itself after
+    ``timeout`` seconds so a stuck task frees its process for the next one.
+    """
+    import pandas as pd
+    from database import SessionLocal
+    from services import BuildingService
+
+    use_alarm = hasattr(signal, "SIGALRM") and timeout > 0
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_task_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    db = SessionLocal()
+    try:
+        frames = list(BuildingService.stream_sensor_frames(
+            db, [building_id], start_time=datetime.now() - timedelta(hours=hours)
+        ))
+        if not frames:
+            raise ValueError("No sensor data in the requested window")
+        building_data = pd.concat(frames, ignore_index=True)
+
+        if task == ModelTask.TRAIN:
+            return _worker_models.train_lstm_model(building_data, building_id=building_id)
+
+        anomalies = _worker_models.detect_anomalies(building_data)
+        return {
+            "rows_scored": len(building_data),
+            "anomalies_found": len(anomalies),
+            "anomalies": anomalies
+        }
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        db.close()
+
+@dataclass
+class ModelJob:
+    """A batch of per-building tasks submitted together"""
+    job_id: str
+    task: ModelTask
+    building_ids: List[str]
+    hours: int
+    status: JobStatus = JobStatus.PENDING
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    tasks: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    cancel_requested: bool = False
+
+    def progress(self) -> Dict[str, Any]:
+        counts = {s.value: 0 for s in JobStatus}
+        for task in self.tasks.values():
+            counts[task["status"].value] += 1
+        done = sum(counts[s.value] for s in FINISHED_STATUSES)
+        return {
+            "total": len(self.tasks),
+            "done": done,
+            "percent": round(done / len(self.tasks) * 100, 1) if self.tasks else 100.0,
+            "by_status": counts
+        }
+
+    def to_dict(self, include_results: bool = False) -> Dict[str, Any]:
+        data = {
+            "job_id": self.job_id,
+            "task": self.task.value,
+            "status": self.status.value,
+            "hours": self.hours,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "progress": self.progress()
+        }
+        if include_results:
+            data["tasks"] = {
+                building_id: {
+                    "status": task["status"].value,
+                    "result": task.get("result"),
+                    "error": task.get("error"),
+                    "duration_seconds": task.get("duration_seconds")
+                }
+                for building_id, task in self.tasks.items()
+            }
+        return data
+
+class ModelJobRunner:
+    """Fans model jobs out over a process pool, one building per task"""
+
+    def __init__(self, max_workers: int = MODEL_JOB_WORKERS, task_timeout: float = MODEL_JOB_TASK_TIMEOUT,
+                 max_finished_jobs: int = 100):
+        self.max_workers = max_workers
+        self.task_timeout = task_timeout
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: "OrderedDict[str, ModelJob]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._runners: Dict[str, asyncio.Task] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so API workers that never run jobs don't spawn processes.
+        # "spawn" avoids inheriting the parent's open database connections.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._executor
+
+    def submit(self, task: ModelTask, building_ids: List[str], hours: int = 168) -> ModelJob:
+        """Queue a job; must be called from the event loop"""
+        job = ModelJob(job_id=uuid.uuid4().hex, task=ModelTask(task), building_ids=list(building_ids), hours=hours)
+        job.tasks = {building_id: {"status": JobStatus.PENDING} for building_id in job.building_ids}
+        self.jobs[job.job_id] = job
+        self._prune_finished()
+        self._runners[job.job_id] = asyncio.get_running_loop().create_task(self._run_job(job))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ModelJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ModelJob]:
+        """Cancel queued tasks; tasks already running finish but their results are discarded"""
+        job = self.jobs.get(job_id)
+        if job and job.status not in FINISHED_STATUSES:
+            job.cancel_requested = True
+            for task in job.tasks.values():
+                future = task.get("future")
+                if task["status"] == JobStatus.PENDING:
+                    task["status"] = JobStatus.CANCELLED
+                if future is not None:
+                    future.cancel()
+        return job
+
+    async def _run_job(self, job: ModelJob):
+        executor = self._get_executor()
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now()
+
+        await asyncio.gather(*(self._run_task(executor, job, building_id) for building_id in job.building_ids))
+
+        statuses = {task["status"] for task in job.tasks.values()}
+        if job.cancel_requested:
+            job.status = JobStatus.CANCELLED
+        elif statuses <= {JobStatus.COMPLETED}:
+            job.status = JobStatus.COMPLETED
+        else:
+            job.status = JobStatus.FAILED
+        job.finished_at = datetime.now()
+        self._runners.pop(job.job_id, None)
+
+    async def _run_task(self, executor: ProcessPoolExecutor, job: ModelJob, building_id: str):
+        task = job.tasks[building_id]
+        async with self._slots:
+            if job.cancel_requested:
+                task["status"] = JobStatus.CANCELLED
+                return
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            task["status"] = JobStatus.RUNNING
+            future = executor.submit(_run_building_task, job.task.value, building_id, job.hours, self.task_timeout)
+            task["future"] = future
+            try:
+                # The worker enforces the timeout itself; the grace period covers
+                # platforms without SIGALRM and code that ignores the signal
+                result = await asyncio.wait_for(asyncio.wrap_future(future), self.task_timeout + 5)
+                task["status"] = JobStatus.CANCELLED if job.cancel_requested else JobStatus.COMPLETED
+                if not job.cancel_requested:
+                    task["result"] = result
+            except (asyncio.TimeoutError, TimeoutError):
+                task["status"] = JobStatus.TIMED_OUT
+                task["error"] = f"Timed out after {self.task_timeout}s"
+            except asyncio.CancelledError:
+                task["status"] = JobStatus.CANCELLED
+            except Exception as e:
+                task["status"] = JobStatus.FAILED
+                task["error"] = str(e)
+            finally:
+                task.pop("future", None)
+                task["duration_seconds"] = round(loop.time() - started, 3)
+
+    def _prune_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        for runner in self._runners.values():
+            runner.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+model_job_runner = ModelJobRunner()
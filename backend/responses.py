@@ -0,0 +1,80 @@
+"""
+Fast JSON responses for large REST payloads
+
+Endpoints returning thousands of rows return FastJSONResponse directly, so
+FastAPI hands the content through without its jsonable_encoder walk.
+Rendering uses orjson when it is installed, which writes datetimes, floats
+and numpy scalars natively, so rows can keep their datetime objects instead
+of calling .isoformat() per row. Without orjson the standard library
+renders the same JSON.
+
+Time-series endpoints can also answer in a columnar layout (DataFormat):
+JSON with one array per field, or an Arrow IPC stream for analytics
+clients (needs pyarrow).
+"""
+
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Standard library fallback
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+class DataFormat(str, Enum):
+    ROWS = "rows"  # one object per reading
+    COLUMNAR = "columnar"  # one array per field plus shared epoch-millisecond timestamps
+    ARROW = "arrow"  # Arrow IPC stream of the columnar table
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; return it from the endpoint to skip jsonable_encoder"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def arrow_stream(columns: Dict[str, List[Any]], metadata: Optional[Dict[str, str]] = None) -> bytes:
+    """Serialize columns as an Arrow IPC stream; a ``timestamp`` column holds epoch milliseconds
+    
+    Raises ImportError when pyarrow is not installed.
+    """
+    import pyarrow as pa
+    
+    arrays = {}
+    for name, values in columns.items():
+        if name == "timestamp":
+            array = pa.array(values, type=pa.timestamp("ms", tz="UTC"))
+        else:
+            array = pa.array(values)
+            if pa.types.is_string(array.type):
+                # Status columns repeat a handful of values
+                array = array.dictionary_encode()
+        arrays[name] = array
+    
+    table = pa.table(arrays).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,221 @@
+"""
+Monthly range partitions for the sensor_data table (MySQL)
+
+With SENSOR_DATA_PARTITIONING=monthly, init_db creates sensor_data
+partitioned by RANGE COLUMNS(timestamp), one partition per month:
+
+    p202403  VALUES LESS THAN ('2024-04-01')
+    p202404  VALUES LESS THAN ('2024-05-01')
+    ...
+    pfuture  VALUES LESS THAN (MAXVALUE)
+
+Time-window queries only touch the partitions they overlap, and retention
+drops whole partitions instead of running a large DELETE. The maintenance
+task keeps PARTITION_PRECREATE_MONTHS months ready ahead of the current one
+by splitting pfuture, which stays empty while maintenance runs, and drops
+months that ended more than SENSOR_DATA_RETENTION_MONTHS ago. The first
+partition also holds any readings older than its month.
+
+MySQL requires the partitioning column in every unique key, so the primary
+key is (id, timestamp). Partitioned InnoDB tables cannot have foreign keys,
+so building_id is indexed but not constrained. An existing unpartitioned
+sensor_data table is left as it is.
+
+    python3 sensor_partitions.py          # one maintenance pass
+    python3 sensor_partitions.py --stats
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from database import engine
+
+load_dotenv()
+
+# Partitioning settings
+SENSOR_DATA_PARTITIONING = os.getenv("SENSOR_DATA_PARTITIONING", "none").lower()  # none or monthly (MySQL only)
+SENSOR_DATA_RETENTION_MONTHS = int(os.getenv("SENSOR_DATA_RETENTION_MONTHS", "0"))  # 0 keeps every month
+PARTITION_PRECREATE_MONTHS = int(os.getenv("PARTITION_PRECREATE_MONTHS", "3"))  # empty months kept ahead
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "0"))  # seconds, 0 disables the in-app task
+
+FUTURE_PARTITION = "pfuture"
+
+# Mirrors the SensorData model, with the partitioning column in the primary key
+SENSOR_DATA_DDL = """
+CREATE TABLE sensor_data (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    building_id INTEGER NOT NULL,
+    timestamp DATETIME NOT NULL,
+    temperature FLOAT NOT NULL,
+    humidity FLOAT NOT NULL,
+    energy_consumption FLOAT NOT NULL,
+    occupancy INTEGER NOT NULL,
+    hvac_status VARCHAR(50) NOT NULL,
+    lighting_status VARCHAR(50) NOT NULL,
+    air_quality FLOAT NULL,
+    hvac_efficiency FLOAT NULL,
+    lighting_efficiency FLOAT NULL,
+    created_at DATETIME NULL,
+    PRIMARY KEY (id, timestamp),
+    INDEX ix_sensor_data_timestamp (timestamp),
+    INDEX ix_sensor_data_building_timestamp (building_id, timestamp)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE COLUMNS(timestamp) (
+    {partitions}
+)
+"""
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+def partition_name(month: datetime) -> str:
+    return f"p{month:%Y%m}"
+
+def _month_partition(month: datetime) -> str:
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{_add_months(month, 1):%Y-%m-%d}')"
+
+def _future_partition() -> str:
+    return f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)"
+
+class SensorDataPartitions:
+    """Creates the monthly-partitioned sensor_data table and keeps its partitions current"""
+    
+    def __init__(self, bind: Engine = engine, retention_months: int = SENSOR_DATA_RETENTION_MONTHS,
+                 precreate_months: int = PARTITION_PRECREATE_MONTHS):
+        self.bind = bind
+        self.retention_months = retention_months
+        self.precreate_months = precreate_months
+        self.last_run: Optional[Dict[str, Any]] = None
+    
+    def supported(self) -> bool:
+        return self.bind.dialect.name == "mysql"
+    
+    def create_table(self, now: Optional[datetime] = None) -> bool:
+        """Create sensor_data partitioned by month unless it exists; True when created"""
+        if not self.supported():
+            print(f"Monthly partitioning needs MySQL; sensor_data is created unpartitioned on {self.bind.dialect.name}")
+            return False
+        
+        current = _month_start(now or datetime.now())
+        months = [_add_months(current, i) for i in range(self.precreate_months + 1)]
+        with self.bind.begin() as conn:
+            if inspect(conn).has_table("sensor_data"):
+                return False
+            partitions = ",\n    ".join([*map(_month_partition, months), _future_partition()])
+            conn.execute(text(SENSOR_DATA_DDL.format(partitions=partitions)))
+        print(f"Created sensor_data with monthly partitions {partition_name(months[0])}..{partition_name(months[-1])}")
+        return True
+    
+    def partitions(self, conn: Connection) -> List[Tuple[str, Optional[str], int]]:
+        """(name, upper bound, estimated rows) of sensor_data partitions in order; empty when unpartitioned"""
+        rows = conn.execute(text("""
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'sensor_data'
+                AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """)).all()
+        return [(name, bound, estimated or 0) for name, bound, estimated in rows]
+    
+    def plan(self, names: List[str], now: datetime) -> Tuple[List[datetime], List[str]]:
+        """Months to create and partitions to drop for the given partition names"""
+        current = _month_start(now)
+        months = sorted(datetime.strptime(name[1:], "%Y%m") for name in names if name != FUTURE_PARTITION)
+        
+        # Range partitions can only be added after the last one
+        last = months[-1] if months else _add_months(current, -1)
+        create = [
+            month for month in (_add_months(current, i) for i in range(self.precreate_months + 1))
+            if month > last
+        ]
+        
+        drop = []
+        if self.retention_months > 0:
+            cutoff = _add_months(current, -self.retention_months)
+            drop = [partition_name(month) for month in months if _add_months(month, 1) <= cutoff]
+        return create, drop
+    
+    def maintain(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Pre-create upcoming months and drop expired ones"""
+        started = datetime.now()
+        now = now or started
+        if not self.supported():
+            return {"partitioned": False}
+        
+        with self.bind.begin() as conn:
+            names = [name for name, _, _ in self.partitions(conn)]
+            if not names:
+                return {"partitioned": False}
+            create, drop = self.plan(names, now)
+            
+            if create:
+                clauses = ", ".join(map(_month_partition, create))
+                if FUTURE_PARTITION in names:
+                    conn.execute(text(
+                        f"ALTER TABLE sensor_data REORGANIZE PARTITION {FUTURE_PARTITION} "
+                        f"INTO ({clauses}, {_future_partition()})"
+                    ))
+                else:
+                    conn.execute(text(f"ALTER TABLE sensor_data ADD PARTITION ({clauses})"))
+            if drop:
+                # Metadata-only: the expired months' data files are removed, no rows are scanned
+                conn.execute(text(f"ALTER TABLE sensor_data DROP PARTITION {', '.join(drop)}"))
+        
+        self.last_run = {
+            "partitioned": True,
+            "started_at": started.isoformat(),
+            "created": [partition_name(month) for month in create],
+            "dropped": drop,
+            "duration_seconds": round((datetime.now() - started).total_seconds(), 3)
+        }
+        return self.last_run
+    
+    async def run_forever(self, interval: float):
+        """Run maintenance off the event loop, sleeping ``interval`` seconds between passes"""
+        while True:
+            try:
+                await asyncio.to_thread(self.maintain)
+            except Exception as e:
+                print(f"Partition maintenance failed: {e}")
+            await asyncio.sleep(interval)
+    
+    def stats(self) -> Dict[str, Any]:
+        partitions = []
+        if self.supported():
+            with self.bind.connect() as conn:
+                partitions = [
+                    {"name": name, "less_than": bound, "estimated_rows": rows}
+                    for name, bound, rows in self.partitions(conn)
+                ]
+        return {
+            "partitioned": bool(partitions),
+            "retention_months": self.retention_months,
+            "precreate_months": self.precreate_months,
+            "partitions": partitions,
+            "last_run": self.last_run
+        }
+
+# Global instance
+sensor_partitions = SensorDataPartitions()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain monthly sensor_data partitions")
+    parser.add_argument("--stats", action="store_true", help="list partitions and exit")
+    args = parser.parse_args()
+    
+    if args.stats:
+        print(sensor_partitions.stats())
+    else:
+        print(sensor_partitions.maintain())
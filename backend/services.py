@@ -7,14 +7,17 @@ from sqlalchemy import and_, desc, func
 from datetime import datetime, timedelta
 import json
 import random
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
+from itertools import islice, chain
+from operator import itemgetter
+import heapq
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import os
 from dotenv import load_dotenv
 import math
 
-from database import User, Building, SensorData, Anomaly, Prediction, UserBuilding, SystemEvent
+from database import User, Building, SensorData, Anomaly, Prediction, UserBuilding, SystemEvent, ThresholdProfile
 
 load_dotenv()
 
@@ -26,6 +29,12 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Fields served by the building data endpoint besides the timestamp
+SENSOR_DATA_FIELDS = [
+    "temperature", "humidity", "energy_consumption", "occupancy", "hvac_status",
+    "lighting_status", "air_quality", "hvac_efficiency", "lighting_efficiency"
+]
+
 class UserService:
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -69,48 +78,181 @@ class BuildingService:
         return db.query(Building).filter(Building.building_id == building_id).first()
     
     @staticmethod
-    def get_building_data(db: Session, building_id: str, hours: int = 24) -> List[Dict[str, Any]]:
-        building = BuildingService.get_building_by_id(db, building_id)
-        if not building:
-            return []
+    def _get_sensor_rows(db: Session, building: Building, hours: int) -> List[tuple]:
+        """(timestamp, *SENSOR_DATA_FIELDS) tuples for the last ``hours``, oldest first, archive included"""
+        from archive import sensor_archive
         
         end_time = datetime.now()
         start_time = end_time - timedelta(hours=hours)
         
-        # Get existing data from database
-        existing_data = db.query(SensorData).filter(
+        # Plain column tuples; no ORM objects are built per row
+        query = db.query(
+            SensorData.timestamp,
+            *(getattr(SensorData, field) for field in SENSOR_DATA_FIELDS)
+        ).filter(
             and_(
                 SensorData.building_id == building.id,
                 SensorData.timestamp >= start_time,
                 SensorData.timestamp <= end_time
             )
-        ).order_by(SensorData.timestamp).all()
+        ).order_by(SensorData.timestamp)
+        existing_data = query.all()
+        
+        # Older readings may have moved to the archive; merge them in by timestamp
+        archived = list(sensor_archive.iter_rows(
+            building.building_id, start_time, end_time, ["timestamp", *SENSOR_DATA_FIELDS]
+        ))
+        if archived:
+            existing_data = list(heapq.merge(archived, existing_data, key=itemgetter(0)))
         
         # If we don't have enough data, generate some
         if len(existing_data) < hours * 4:  # 4 data points per hour
             BuildingService._generate_sample_data(db, building.id, start_time, end_time)
-            existing_data = db.query(SensorData).filter(
-                and_(
-                    SensorData.building_id == building.id,
-                    SensorData.timestamp >= start_time,
-                    SensorData.timestamp <= end_time
-                )
-            ).order_by(SensorData.timestamp).all()
+            existing_data = list(heapq.merge(archived, query.all(), key=itemgetter(0)))
+        
+        return existing_data
+    
+    @staticmethod
+    def get_building_data(db: Session, building_id: str, hours: int = 24) -> List[Dict[str, Any]]:
+        building = BuildingService.get_building_by_id(db, building_id)
+        if not building:
+            return []
+        
+        # Timestamps stay datetimes; FastJSONResponse serializes them natively
+        keys = ["timestamp", *SENSOR_DATA_FIELDS]
+        return [dict(zip(keys, row)) for row in BuildingService._get_sensor_rows(db, building, hours)]
+    
+    @staticmethod
+    def get_building_series(db: Session, building_id: str, hours: int = 24) -> Dict[str, Any]:
+        """
+        Building data as columns: one shared list of timestamps in epoch
+        milliseconds and one list of values per field.
+        """
+        building = BuildingService.get_building_by_id(db, building_id)
+        rows = BuildingService._get_sensor_rows(db, building, hours) if building else []
+        
+        columns = list(zip(*rows)) if rows else [()] * (len(SENSOR_DATA_FIELDS) + 1)
+        return {
+            "timestamps": [round(timestamp.timestamp() * 1000) for timestamp in columns[0]],
+            "series": {field: list(values) for field, values in zip(SENSOR_DATA_FIELDS, columns[1:])}
+        }
+    
+    @staticmethod
+    def stream_sensor_frames(
+        db: Session,
+        building_ids: Optional[List[str]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        chunk_size: int = 10000
+    ) -> Iterator["pd.DataFrame"]:
+        """
+        Stream sensor history as DataFrames of at most ``chunk_size`` rows.
+        
+        Rows are ordered by building and timestamp and fetched through a
+        server-side cursor, so memory stays bounded by the chunk size.
+        Archived readings are merged in per building, one archive
+        partition in memory at a time.
+        """
+        import pandas as pd
+        from archive import sensor_archive
+        
+        columns = ["building_id", "timestamp", "temperature", "humidity", "energy_consumption", "occupancy"]
+        query = db.query(
+            Building.building_id,
+            SensorData.timestamp,
+            SensorData.temperature,
+            SensorData.humidity,
+            SensorData.energy_consumption,
+            SensorData.occupancy
+        ).join(Building, SensorData.building_id == Building.id)
+        
+        if building_ids:
+            query = query.filter(Building.building_id.in_(building_ids))
+        if start_time:
+            query = query.filter(SensorData.timestamp >= start_time)
+        if end_time:
+            query = query.filter(SensorData.timestamp <= end_time)
+        
+        archived = [
+            building_id for building_id in (building_ids or sensor_archive.building_ids())
+            if sensor_archive.partitions(building_id, start_time, end_time)
+        ]
+        if not archived:
+            rows = iter(query.order_by(SensorData.building_id, SensorData.timestamp).yield_per(chunk_size))
+        else:
+            # One hot query per building, merged with that building's archive by timestamp
+            buildings = db.query(Building.id, Building.building_id).order_by(Building.id)
+            if building_ids:
+                buildings = buildings.filter(Building.building_id.in_(building_ids))
+            per_building = []
+            for pk, building_id in buildings.all():
+                hot = query.filter(SensorData.building_id == pk).order_by(SensorData.timestamp).yield_per(chunk_size)
+                if building_id in archived:
+                    per_building.append(heapq.merge(
+                        sensor_archive.iter_rows(building_id, start_time, end_time, columns), hot, key=itemgetter(1)
+                    ))
+                else:
+                    per_building.append(hot)
+            rows = chain.from_iterable(per_building)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+    
+    @staticmethod
+    def get_data_watermark(db: Session, building_id: str) -> int:
+        """Highest SensorData.id stored for a building; changes whenever new readings land"""
+        building = BuildingService.get_building_by_id(db, building_id)
+        if not building:
+            return 0
+        return db.query(func.max(SensorData.id)).filter(SensorData.building_id == building.id).scalar() or 0
+    
+    @staticmethod
+    def get_daily_aggregates(db: Session, building_id: str, hours: int = 24 * 30) -> List[Dict[str, Any]]:
+        """Per-day aggregates over a window, computed in the database and over the archive"""
+        from archive import sensor_archive, merge_daily_aggregates
+        
+        building = BuildingService.get_building_by_id(db, building_id)
+        if not building:
+            return []
+        
+        start_time = datetime.now() - timedelta(hours=hours)
+        day = func.date(SensorData.timestamp)
+        # Sums rather than averages, so days split between the table and the archive combine exactly
+        rows = db.query(
+            day.label("day"),
+            func.count(SensorData.id),
+            func.sum(SensorData.temperature),
+            func.sum(SensorData.humidity),
+            func.sum(SensorData.energy_consumption),
+            func.max(SensorData.energy_consumption),
+            func.sum(SensorData.occupancy),
+            func.max(SensorData.occupancy)
+        ).filter(
+            and_(
+                SensorData.building_id == building.id,
+                SensorData.timestamp >= start_time
+            )
+        ).group_by(day).order_by(day).all()
+        
+        days = sensor_archive.daily_aggregates(building.building_id, start_time)
+        for row in rows:
+            values = list(row[1:])
+            days[str(row[0])] = merge_daily_aggregates(days[str(row[0])], values) if str(row[0]) in days else values
         
         return [
             {
-                "timestamp": data.timestamp.isoformat(),
-                "temperature": data.temperature,
-                "humidity": data.humidity,
-                "energy_consumption": data.energy_consumption,
-                "occupancy": data.occupancy,
-                "hvac_status": data.hvac_status,
-                "lighting_status": data.lighting_status,
-                "air_quality": data.air_quality,
-                "hvac_efficiency": data.hvac_efficiency,
-                "lighting_efficiency": data.lighting_efficiency
+                "date": date,
+                "readings": count,
+                "avg_temperature": round(temperature / count, 2),
+                "avg_humidity": round(humidity / count, 2),
+                "total_energy_consumption": round(energy, 2),
+                "peak_energy_consumption": round(peak_energy, 2),
+                "avg_occupancy": round(float(occupancy) / count, 1),
+                "peak_occupancy": peak_occupancy
             }
-            for data in existing_data
+            for date, (count, temperature, humidity, energy, peak_energy, occupancy, peak_occupancy) in sorted(days.items())
         ]
     
     @staticmethod
@@ -169,7 +311,7 @@ class AnomalyService:
         
         return [
             {
-                "timestamp": anomaly.timestamp.isoformat(),
+                "timestamp": anomaly.timestamp,
                 "type": anomaly.anomaly_type,
                 "severity": anomaly.severity,
                 "description": anomaly.description,
@@ -199,6 +341,35 @@ class AnomalyService:
         db.commit()
         db.refresh(anomaly)
         return anomaly
+    
+    @staticmethod
+    def create_anomalies(db: Session, building_id: str, anomalies: List[Dict[str, Any]], commit: bool = True) -> int:
+        """Bulk-insert anomalies for one building; pass commit=False to join the caller's transaction"""
+        building = BuildingService.get_building_by_id(db, building_id)
+        if not building:
+            raise ValueError("Building not found")
+        
+        rows = []
+        for anomaly_data in anomalies:
+            timestamp = anomaly_data.get("timestamp", datetime.now())
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            rows.append({
+                "building_id": building.id,
+                "timestamp": timestamp,
+                "anomaly_type": anomaly_data["type"],
+                "severity": anomaly_data["severity"],
+                "confidence": float(anomaly_data["confidence"]),
+                "description": anomaly_data.get("description", ""),
+                "feature_values": json.dumps(anomaly_data.get("feature_values", {}), default=float),
+                "is_resolved": False
+            })
+        
+        if rows:
+            db.bulk_insert_mappings(Anomaly, rows)
+        if commit:
+            db.commit()
+        return len(rows)
 
 class PredictionService:
     @staticmethod
@@ -225,7 +396,7 @@ class PredictionService:
         
         return [
             {
-                "timestamp": pred.timestamp.isoformat(),
+                "timestamp": pred.timestamp,
                 "predicted_value": pred.predicted_value,
                 "confidence": pred.confidence,
                 "factors": json.loads(pred.factors) if pred.factors else {}
@@ -271,6 +442,37 @@ class PredictionService:
         
         return predictions
 
+class ThresholdProfileService:
+    @staticmethod
+    def set_profile(db: Session, scope: str, scope_key: str, overrides: Dict[str, float],
+                    user_id: Optional[int] = None) -> ThresholdProfile:
+        """Create or replace the threshold overrides for a building type, building or zone"""
+        profile = db.query(ThresholdProfile).filter(
+            and_(
+                ThresholdProfile.scope == scope,
+                ThresholdProfile.scope_key == scope_key
+            )
+        ).first()
+        if profile is None:
+            profile = ThresholdProfile(scope=scope, scope_key=scope_key)
+            db.add(profile)
+        profile.overrides = json.dumps(overrides)
+        profile.updated_by = user_id
+        db.commit()
+        db.refresh(profile)
+        return profile
+    
+    @staticmethod
+    def delete_profile(db: Session, scope: str, scope_key: str) -> bool:
+        deleted = db.query(ThresholdProfile).filter(
+            and_(
+                ThresholdProfile.scope == scope,
+                ThresholdProfile.scope_key == scope_key
+            )
+        ).delete()
+        db.commit()
+        return deleted > 0
+
 class AuthService:
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
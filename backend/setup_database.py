@@ -6,6 +6,7 @@ This script helps set up MySQL database and initialize tables
 
 import os
 import sys
+import argparse
 import subprocess
 from dotenv import load_dotenv
 
@@ -116,6 +117,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES=30
 DEBUG=True
 MODEL_PATH=./models
 
+# sensor_data partitioning (none or monthly) and months of readings kept (0 = all)
+SENSOR_DATA_PARTITIONING=none
+SENSOR_DATA_RETENTION_MONTHS=0
+
 # MySQL Connection Settings
 MYSQL_HOST=localhost
 MYSQL_PORT=3306
@@ -179,5 +184,14 @@ def main():
     return True
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Set up the MySQL database for the dashboard")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="create sensor_data range-partitioned by month")
+    args = parser.parse_args()
+    
+    # Read by init_db; an explicit flag wins over .env
+    if args.partitioned:
+        os.environ["SENSOR_DATA_PARTITIONING"] = "monthly"
+    
     success = main()
     sys.exit(0 if success else 1) 
\ No newline at end of file
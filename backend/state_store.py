@@ -0,0 +1,424 @@
+"""
+Latest-value store for real-time sensor readings and building status
+
+Keeps one fixed-width record per sensor and per building instead of a dict
+of Pydantic objects per worker. Records live in a shared-memory segment
+that every worker on the machine attaches to, so get_system_status returns
+the same answer whichever worker serves the request.
+
+Layout of the segment:
+- header: magic, layout version, capacities and slot counts
+- sensor index / building index: open-addressing hash tables mapping a
+  crc32 of the id to a slot number (0 = empty, otherwise slot + 1)
+- sensor records / building records: packed structs, each starting with a
+  sequence number
+
+Writers serialize on a lock file and bump a record's sequence number to odd
+before writing and back to even after, so readers never take the lock: they
+retry until they see the same even sequence number on both sides of a read.
+When shared memory cannot be used the same layout is kept in a
+process-local buffer.
+
+Workers attach in open() at startup and hold a shared flock on a members
+file while attached. The first worker to open finds no other holder and
+recreates the segment, so readings and capacities from an earlier run are
+never served; the last worker to close() removes it. Until open() is called
+the store is process-local.
+"""
+
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+
+from dotenv import load_dotenv
+
+from validators import RealTimeSensorData, SensorStatus, LightingStatus
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, use the local backend
+    fcntl = None
+
+load_dotenv()
+
+# Store settings
+STATE_STORE_BACKEND = os.getenv("STATE_STORE_BACKEND", "shared")  # shared or local
+STATE_STORE_NAME = os.getenv("STATE_STORE_NAME", "building_dashboard_state")
+STATE_STORE_SENSORS = int(os.getenv("STATE_STORE_SENSORS", "131072"))
+STATE_STORE_BUILDINGS = int(os.getenv("STATE_STORE_BUILDINGS", "1024"))
+
+MAGIC = b"BLDSTATE"
+LAYOUT_VERSION = 1
+ID_BYTES = 50  # building_id and sensor_id are at most 50 characters (see validators)
+NAIVE_TZ = -2 ** 31  # tz offset marker for naive timestamps
+NULL = float("nan")  # stored for optional readings that were not sent
+READ_RETRIES = 1000
+
+HEADER = struct.Struct("<8sIIIII")
+INDEX_ENTRY = struct.Struct("<I")
+SEQ = struct.Struct("<I")
+# seq, building_id, sensor_id, timestamp, tz offset, temperature, humidity, air_quality,
+# energy_consumption, occupancy, hvac_efficiency, lighting_efficiency, hvac_status, lighting_status
+SENSOR_RECORD = struct.Struct(f"<I{ID_BYTES}s{ID_BYTES}sdiddddiddBB")
+# seq, building_id, timestamp, tz offset, temperature, humidity, energy_consumption, occupancy,
+# hvac_status, lighting_status
+BUILDING_RECORD = struct.Struct(f"<I{ID_BYTES}sdidddiBB")
+
+HVAC_STATUSES = list(SensorStatus)
+LIGHTING_STATUSES = list(LightingStatus)
+
+def _table_size(capacity: int) -> int:
+    """Power of two at least twice the capacity, so probes stay short"""
+    size = 1
+    while size < capacity * 2:
+        size *= 2
+    return size
+
+def _encode_id(value: str) -> bytes:
+    encoded = value.encode()
+    if len(encoded) > ID_BYTES:
+        raise ValueError(f"Identifier longer than {ID_BYTES} bytes: {value}")
+    return encoded
+
+def _encode_timestamp(value: datetime):
+    offset = value.utcoffset()
+    return value.timestamp(), NAIVE_TZ if offset is None else int(offset.total_seconds())
+
+def _decode_timestamp(epoch: float, tz_offset: int) -> datetime:
+    if tz_offset == NAIVE_TZ:
+        return datetime.fromtimestamp(epoch)
+    return datetime.fromtimestamp(epoch, timezone(timedelta(seconds=tz_offset)))
+
+def _optional(value: Optional[float]) -> float:
+    return NULL if value is None else float(value)
+
+def _from_optional(value: float) -> Optional[float]:
+    return None if value != value else value  # NaN marks a missing reading
+
+class _Layout:
+    """Offsets of the header, indexes and record arrays for given capacities"""
+    
+    def __init__(self, sensor_capacity: int, building_capacity: int):
+        self.sensor_capacity = sensor_capacity
+        self.building_capacity = building_capacity
+        self.sensor_table = _table_size(sensor_capacity)
+        self.building_table = _table_size(building_capacity)
+        
+        self.sensor_index = 64
+        self.building_index = self.sensor_index + self.sensor_table * INDEX_ENTRY.size
+        self.sensor_records = self.building_index + self.building_table * INDEX_ENTRY.size
+        self.building_records = self.sensor_records + sensor_capacity * SENSOR_RECORD.size
+        self.size = self.building_records + building_capacity * BUILDING_RECORD.size
+
+class LatestStateStore:
+    """Fixed-width latest readings per sensor and status per building"""
+    
+    def __init__(
+        self,
+        backend: str = STATE_STORE_BACKEND,
+        name: str = STATE_STORE_NAME,
+        sensor_capacity: int = STATE_STORE_SENSORS,
+        building_capacity: int = STATE_STORE_BUILDINGS
+    ):
+        if backend not in ("shared", "local"):
+            raise ValueError(f"Unknown state store backend: {backend}. Must be one of: ['shared', 'local']")
+        
+        self.backend = backend
+        self.name = name
+        self.sensor_capacity = sensor_capacity
+        self.building_capacity = building_capacity
+        self._thread_lock = threading.Lock()
+        self._lock_file = None
+        self._members_file = None
+        self._shm = None
+        self.overflow = 0
+        self._use_local()
+    
+    @property
+    def shared(self) -> bool:
+        return self._shm is not None
+    
+    def _use_local(self):
+        self.layout = _Layout(self.sensor_capacity, self.building_capacity)
+        self.buf = memoryview(bytearray(self.layout.size))
+        HEADER.pack_into(self.buf, 0, MAGIC, LAYOUT_VERSION, self.sensor_capacity, self.building_capacity, 0, 0)
+    
+    def open(self):
+        """Attach to the shared segment, recreating it when no other worker is attached"""
+        if self.backend != "shared" or fcntl is None or self._shm is not None:
+            return
+        try:
+            self._attach_shared()
+        except OSError as e:
+            print(f"Shared state store unavailable ({e}); using process-local state")
+            self._close_files()
+    
+    def _attach_shared(self):
+        from multiprocessing import shared_memory, resource_tracker
+        
+        self._lock_file = open(os.path.join("/tmp", f"{self.name}.lock"), "a")
+        self._members_file = open(os.path.join("/tmp", f"{self.name}.members"), "a")
+        with self._locked():
+            try:
+                fcntl.flock(self._members_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                first = True
+            except BlockingIOError:
+                first = False
+            
+            if first:
+                # No worker is attached, so a segment still present is left from an earlier run
+                try:
+                    stale = shared_memory.SharedMemory(name=self.name)
+                    stale.close()
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
+                layout = _Layout(self.sensor_capacity, self.building_capacity)
+                shm = shared_memory.SharedMemory(name=self.name, create=True, size=layout.size)
+                HEADER.pack_into(shm.buf, 0, MAGIC, LAYOUT_VERSION, layout.sensor_capacity,
+                                 layout.building_capacity, 0, 0)
+            else:
+                shm = shared_memory.SharedMemory(name=self.name)
+                magic, version, sensors, buildings, _, _ = HEADER.unpack_from(shm.buf, 0)
+                if magic != MAGIC or version != LAYOUT_VERSION:
+                    shm.close()
+                    raise OSError(f"segment {self.name} is in use by an incompatible release")
+                layout = _Layout(sensors, buildings)
+            
+            # Held until close(); the lock is dropped by the kernel if the worker dies
+            fcntl.flock(self._members_file, fcntl.LOCK_SH)
+            
+            # close() decides when to unlink; stop the resource tracker unlinking it on exit
+            resource_tracker.unregister(shm._name, "shared_memory")
+        
+        self._shm = shm
+        self.layout = layout
+        self.buf = shm.buf
+    
+    def _locked(self):
+        return _StoreLock(self._thread_lock, self._lock_file)
+    
+    def close(self):
+        """Detach from the shared segment; the last worker attached removes it"""
+        if self._shm is None:
+            return
+        with self._locked():
+            # With our shared lock dropped, an exclusive one only succeeds if no other worker holds one
+            fcntl.flock(self._members_file, fcntl.LOCK_UN)
+            try:
+                fcntl.flock(self._members_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                last = True
+            except BlockingIOError:
+                last = False
+            
+            self.buf = None
+            if last:
+                self.unlink()
+            self._shm.close()
+            self._shm = None
+            # Closed before the store lock is released, so a worker opening next sees it as first
+            self._members_file.close()
+            self._members_file = None
+        self._close_files()
+        self._use_local()
+    
+    def _close_files(self):
+        for lock_file in (self._members_file, self._lock_file):
+            if lock_file is not None:
+                lock_file.close()
+        self._members_file = None
+        self._lock_file = None
+    
+    def unlink(self):
+        """Remove the shared segment; workers still attached keep their mapping"""
+        if self._shm is not None:
+            from multiprocessing import resource_tracker
+            # unlink() unregisters from the tracker, which _attach_shared already did
+            resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+    
+    def _counts(self):
+        _, _, _, _, sensors, buildings = HEADER.unpack_from(self.buf, 0)
+        return sensors, buildings
+    
+    def _set_counts(self, sensors: int, buildings: int):
+        layout = self.layout
+        HEADER.pack_into(self.buf, 0, MAGIC, LAYOUT_VERSION, layout.sensor_capacity, layout.building_capacity,
+                         sensors, buildings)
+    
+    def _find(self, key: bytes, index_offset: int, table_size: int, record_offset: int,
+              record: struct.Struct, key_field: slice):
+        """Probe an index; returns (index position, slot) with slot None when the key is absent"""
+        position = zlib.crc32(key) & (table_size - 1)
+        padded = key.ljust(key_field.stop - key_field.start, b"\0")
+        while True:
+            entry_offset = index_offset + position * INDEX_ENTRY.size
+            (entry,) = INDEX_ENTRY.unpack_from(self.buf, entry_offset)
+            if entry == 0:
+                return position, None
+            slot = entry - 1
+            start = record_offset + slot * record.size
+            if self.buf[start + key_field.start:start + key_field.stop] == padded:
+                return position, slot
+            position = (position + 1) & (table_size - 1)
+    
+    def _sensor_slot(self, key: bytes):
+        layout = self.layout
+        return self._find(key, layout.sensor_index, layout.sensor_table, layout.sensor_records,
+                          SENSOR_RECORD, slice(SEQ.size, SEQ.size + 2 * ID_BYTES))
+    
+    def _building_slot(self, key: bytes):
+        layout = self.layout
+        return self._find(key, layout.building_index, layout.building_table, layout.building_records,
+                          BUILDING_RECORD, slice(SEQ.size, SEQ.size + ID_BYTES))
+    
+    def _claim(self, position: int, index_offset: int, slot: int):
+        INDEX_ENTRY.pack_into(self.buf, index_offset + position * INDEX_ENTRY.size, slot + 1)
+    
+    def _write(self, record: struct.Struct, offset: int, *values):
+        (seq,) = SEQ.unpack_from(self.buf, offset)
+        # Odd while the write is in progress; also repairs a record left odd by a writer that died
+        seq = (seq | 1) & 0xFFFFFFFF
+        SEQ.pack_into(self.buf, offset, seq)
+        record.pack_into(self.buf, offset, seq, *values)
+        SEQ.pack_into(self.buf, offset, (seq + 1) & 0xFFFFFFFF)
+    
+    def _read(self, record: struct.Struct, offset: int):
+        for _ in range(READ_RETRIES):
+            (before,) = SEQ.unpack_from(self.buf, offset)
+            if before & 1:
+                continue
+            values = record.unpack_from(self.buf, offset)
+            (after,) = SEQ.unpack_from(self.buf, offset)
+            if before == after:
+                return values
+        # A writer keeps winning the race (or died mid-write); read under the lock instead
+        with self._locked():
+            return record.unpack_from(self.buf, offset)
+    
+    def put(self, data: RealTimeSensorData):
+        """Store a reading as its sensor's latest value and its building's current status"""
+        building_key = _encode_id(data.building_id)
+        sensor_key = building_key.ljust(ID_BYTES, b"\0") + _encode_id(data.sensor_id)
+        epoch, tz_offset = _encode_timestamp(data.timestamp)
+        hvac = HVAC_STATUSES.index(data.hvac_status)
+        lighting = LIGHTING_STATUSES.index(data.lighting_status)
+        layout = self.layout
+        
+        with self._locked():
+            sensors, buildings = self._counts()
+            
+            position, slot = self._sensor_slot(sensor_key)
+            if slot is None and sensors < layout.sensor_capacity:
+                slot = sensors
+                sensors += 1
+                self._write(SENSOR_RECORD, layout.sensor_records + slot * SENSOR_RECORD.size,
+                            building_key, _encode_id(data.sensor_id), 0.0, NAIVE_TZ,
+                            NULL, NULL, NULL, NULL, 0, NULL, NULL, 0, 0)
+                self._claim(position, layout.sensor_index, slot)
+            if slot is None:
+                self.overflow += 1
+            else:
+                self._write(SENSOR_RECORD, layout.sensor_records + slot * SENSOR_RECORD.size,
+                            building_key, _encode_id(data.sensor_id), epoch, tz_offset,
+                            data.temperature, data.humidity, _optional(data.air_quality),
+                            data.energy_consumption, data.occupancy,
+                            _optional(data.hvac_efficiency), _optional(data.lighting_efficiency),
+                            hvac, lighting)
+            
+            position, slot = self._building_slot(building_key)
+            if slot is None and buildings < layout.building_capacity:
+                slot = buildings
+                buildings += 1
+                self._write(BUILDING_RECORD, layout.building_records + slot * BUILDING_RECORD.size,
+                            building_key, 0.0, NAIVE_TZ, NULL, NULL, NULL, 0, 0, 0)
+                self._claim(position, layout.building_index, slot)
+            if slot is None:
+                self.overflow += 1
+            else:
+                self._write(BUILDING_RECORD, layout.building_records + slot * BUILDING_RECORD.size,
+                            building_key, epoch, tz_offset, data.temperature, data.humidity,
+                            data.energy_consumption, data.occupancy, hvac, lighting)
+            
+            self._set_counts(sensors, buildings)
+    
+    def get_building_status(self, building_id: str) -> Optional[Dict[str, Any]]:
+        """Current status of a building, in the shape the dashboard expects"""
+        _, slot = self._building_slot(_encode_id(building_id))
+        if slot is None:
+            return None
+        (_, _, epoch, tz_offset, temperature, humidity, energy, occupancy,
+         hvac, lighting) = self._read(BUILDING_RECORD, self.layout.building_records + slot * BUILDING_RECORD.size)
+        return {
+            "last_update": _decode_timestamp(epoch, tz_offset).isoformat(),
+            "hvac_status": HVAC_STATUSES[hvac],
+            "lighting_status": LIGHTING_STATUSES[lighting],
+            "current_temperature": temperature,
+            "current_humidity": humidity,
+            "current_occupancy": occupancy,
+            "current_energy_consumption": energy
+        }
+    
+    def get_sensor_reading(self, building_id: str, sensor_id: str) -> Optional[Dict[str, Any]]:
+        """Latest stored values of one sensor"""
+        key = _encode_id(building_id).ljust(ID_BYTES, b"\0") + _encode_id(sensor_id)
+        _, slot = self._sensor_slot(key)
+        if slot is None:
+            return None
+        (_, _, _, epoch, tz_offset, temperature, humidity, air_quality, energy, occupancy,
+         hvac_efficiency, lighting_efficiency, hvac,
+         lighting) = self._read(SENSOR_RECORD, self.layout.sensor_records + slot * SENSOR_RECORD.size)
+        return {
+            "building_id": building_id,
+            "sensor_id": sensor_id,
+            "timestamp": _decode_timestamp(epoch, tz_offset),
+            "temperature": temperature,
+            "humidity": humidity,
+            "air_quality": _from_optional(air_quality),
+            "energy_consumption": energy,
+            "occupancy": occupancy,
+            "hvac_efficiency": _from_optional(hvac_efficiency),
+            "lighting_efficiency": _from_optional(lighting_efficiency),
+            "hvac_status": HVAC_STATUSES[hvac],
+            "lighting_status": LIGHTING_STATUSES[lighting]
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        sensors, buildings = self._counts()
+        return {
+            "backend": "shared" if self.shared else "local",
+            "name": self.name if self.shared else None,
+            "size_bytes": self.layout.size,
+            "sensors": sensors,
+            "sensor_capacity": self.layout.sensor_capacity,
+            "buildings": buildings,
+            "building_capacity": self.layout.building_capacity,
+            "overflow": self.overflow
+        }
+
+class _StoreLock:
+    """Thread lock plus, for the shared backend, an exclusive flock on the store's lock file"""
+    
+    def __init__(self, thread_lock: threading.Lock, lock_file):
+        self.thread_lock = thread_lock
+        self.lock_file = lock_file
+    
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+    
+    def __exit__(self, *exc):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+if __name__ == "__main__":
+    store = LatestStateStore()
+    # Run with no workers attached, this also removes a segment left by workers that crashed
+    store.open()
+    print(store.stats())
+    store.close()
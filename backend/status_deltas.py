@@ -0,0 +1,86 @@
+"""
+Versioned building status for delta-encoded real-time updates
+
+Every status published for a building is compared field by field with the
+previous one. When anything changed the building's version goes up and the
+changed fields remember that version, so the fields that changed since any
+earlier version can be listed without keeping old snapshots.
+
+Clients that opt in to deltas acknowledge the versions they have applied
+and are sent only the fields that changed since their acknowledged version,
+plus a full snapshot every STATUS_SNAPSHOT_INTERVAL seconds to resync.
+"""
+
+import os
+from typing import Dict, Any, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between full snapshots sent to a delta client
+STATUS_SNAPSHOT_INTERVAL = float(os.getenv("STATUS_SNAPSHOT_INTERVAL", "30"))
+
+# Fields that change with every reading; on their own they are not worth a push
+# and ride along with the next real change or snapshot
+HEARTBEAT_FIELDS = {"last_update"}
+
+class BuildingStatusVersion:
+    """Current status of one building with the version each field last changed in"""
+    
+    __slots__ = ("version", "fields", "field_versions")
+    
+    def __init__(self):
+        self.version = 0
+        self.fields: Dict[str, Any] = {}
+        self.field_versions: Dict[str, int] = {}
+
+class StatusVersionTracker:
+    """Per-building status versions"""
+    
+    def __init__(self):
+        self.buildings: Dict[str, BuildingStatusVersion] = {}
+    
+    def update(self, building_id: str, status: Dict[str, Any]) -> int:
+        """Record a published status; returns the building's version after it"""
+        state = self.buildings.get(building_id)
+        if state is None:
+            state = self.buildings[building_id] = BuildingStatusVersion()
+        
+        changed = [key for key, value in status.items()
+                   if key not in state.fields or state.fields[key] != value]
+        if changed:
+            state.version += 1
+            for key in changed:
+                state.fields[key] = status[key]
+                state.field_versions[key] = state.version
+        return state.version
+    
+    def version(self, building_id: str) -> int:
+        state = self.buildings.get(building_id)
+        return state.version if state else 0
+    
+    def snapshot(self, building_id: str) -> Dict[str, Any]:
+        state = self.buildings.get(building_id) or BuildingStatusVersion()
+        return {"version": state.version, "status": dict(state.fields)}
+    
+    def changes_since(self, building_id: str, base_version: int) -> Dict[str, Any]:
+        """Fields whose value changed after ``base_version``"""
+        state = self.buildings.get(building_id)
+        if state is None:
+            return {}
+        return {key: state.fields[key] for key, version in state.field_versions.items() if version > base_version}
+    
+    def delta(self, building_id: str, base_version: int) -> Dict[str, Any]:
+        return {
+            "version": self.version(building_id),
+            "base_version": base_version,
+            "changes": self.changes_since(building_id, base_version)
+        }
+    
+    def is_heartbeat_only(self, building_id: str, base_version: int) -> bool:
+        """True when nothing but heartbeat fields changed after ``base_version``"""
+        return self.changes_since(building_id, base_version).keys() <= HEARTBEAT_FIELDS
+
+# Global instance
+status_versions = StatusVersionTracker()
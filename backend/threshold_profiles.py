@@ -0,0 +1,273 @@
+"""
+Threshold profiles compiled into flat per-building rule tables
+
+Limits are layered from most general to most specific:
+
+    ThresholdConfig defaults -> building type -> building -> zone
+
+Overrides come from a JSON file (THRESHOLD_PROFILES_FILE) and from the
+threshold_profiles table, database rows taking precedence:
+
+    {
+        "types": {"laboratory": {"temperature_max": 23.0}},
+        "buildings": {"bldg_001": {"energy_threshold": 1500}},
+        "zones": {"bldg_001:server_room": {"temperature_max": 22.0}}
+    }
+
+The first reading from a (building, zone) resolves its limits once and
+compiles every rule into a tuple of plain values, so evaluation is one
+pass over that tuple regardless of how many buildings or profiles exist.
+Reloading swaps the sources and clears the compiled cache. The file is
+re-read when its mtime changes, reusing the database rows from the last
+full load; the database is read only by load() from startup and the
+threshold reload event, both off the event loop.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, fields, replace
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+
+from dotenv import load_dotenv
+
+from validators import AnomalySeverity
+
+load_dotenv()
+
+# Profile settings
+THRESHOLD_PROFILES_FILE = os.getenv(
+    "THRESHOLD_PROFILES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "threshold_profiles.json")
+)
+THRESHOLD_RELOAD_INTERVAL = float(os.getenv("THRESHOLD_RELOAD_INTERVAL", "5"))  # seconds between file mtime checks
+
+PROFILE_SCOPES = ("types", "buildings", "zones")
+
+@dataclass(frozen=True)
+class RuleSpec:
+    """A single-reading threshold rule; limits are named ThresholdConfig fields"""
+    name: str
+    field: str
+    above: bool  # fires when the value is above the threshold, else below
+    threshold_field: str
+    band_field: str
+    alert_type: str
+    severity: AnomalySeverity
+    message: str  # formatted with value and threshold
+    data_key: str
+    escalate_at: Optional[float] = None  # beyond this value the alert takes escalated_severity
+    escalated_severity: Optional[AnomalySeverity] = None
+
+class CompiledRule(NamedTuple):
+    name: str
+    field: str
+    above: bool
+    threshold: float
+    clear_at: float
+    escalate_at: Optional[float]
+    severity: AnomalySeverity
+    escalated_severity: Optional[AnomalySeverity]
+    alert_type: str
+    message: str
+    data_key: str
+    
+    def build(self, value: float):
+        """Alert contents for a firing reading: (alert_type, severity, message, data)"""
+        severity = self.severity
+        if self.escalate_at is not None and (value > self.escalate_at if self.above else value < self.escalate_at):
+            severity = self.escalated_severity
+        return (
+            self.alert_type,
+            severity,
+            self.message.format(value=value, threshold=self.threshold),
+            {self.data_key: value, "threshold": self.threshold}
+        )
+
+class CompiledProfile(NamedTuple):
+    thresholds: Any  # resolved ThresholdConfig, also read by the window rules
+    rules: Tuple[CompiledRule, ...]
+    sources: Tuple[str, ...]  # profiles applied, most general first
+
+def compile_rules(specs: List[RuleSpec], thresholds) -> Tuple[CompiledRule, ...]:
+    compiled = []
+    for spec in specs:
+        threshold = getattr(thresholds, spec.threshold_field)
+        band = getattr(thresholds, spec.band_field)
+        compiled.append(CompiledRule(
+            name=spec.name,
+            field=spec.field,
+            above=spec.above,
+            threshold=threshold,
+            clear_at=threshold - band if spec.above else threshold + band,
+            escalate_at=spec.escalate_at,
+            severity=spec.severity,
+            escalated_severity=spec.escalated_severity,
+            alert_type=spec.alert_type,
+            message=spec.message,
+            data_key=spec.data_key
+        ))
+    return tuple(compiled)
+
+class ThresholdProfiles:
+    """Threshold overrides by building type, building and zone, with compiled rule tables"""
+    
+    def __init__(self, defaults, rules: List[RuleSpec], path: str = THRESHOLD_PROFILES_FILE,
+                 reload_interval: float = THRESHOLD_RELOAD_INTERVAL):
+        self.defaults = defaults
+        self.rules = rules
+        self.path = path
+        self.reload_interval = reload_interval
+        self.overrides: Dict[str, Dict[str, Dict[str, float]]] = {scope: {} for scope in PROFILE_SCOPES}
+        self.building_types: Dict[str, str] = {}
+        self.generation = 0
+        self.loaded_at: Optional[datetime] = None
+        self.errors: List[str] = []
+        self._db_overrides: Dict[str, Dict[str, Dict[str, float]]] = {scope: {} for scope in PROFILE_SCOPES}
+        self._compiled: Dict[Tuple[str, Optional[str]], CompiledProfile] = {}
+        self._file_mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+    
+    def validate(self, overrides: Dict[str, Any]) -> Dict[str, float]:
+        """Check that overrides name ThresholdConfig fields and hold numbers"""
+        known = {f.name for f in fields(self.defaults)}
+        unknown = sorted(set(overrides) - known)
+        if unknown:
+            raise ValueError(f"Unknown threshold fields: {unknown}. Must be among: {sorted(known)}")
+        for name, value in overrides.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Threshold {name} must be a number")
+        return dict(overrides)
+    
+    def _read_file(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        profiles = {scope: {} for scope in PROFILE_SCOPES}
+        if not os.path.exists(self.path):
+            self._file_mtime = None
+            return profiles
+        self._file_mtime = os.path.getmtime(self.path)
+        with open(self.path) as f:
+            raw = json.load(f)
+        for scope in PROFILE_SCOPES:
+            for key, overrides in raw.get(scope, {}).items():
+                try:
+                    profiles[scope][key] = self.validate(overrides)
+                except ValueError as e:
+                    self.errors.append(f"{self.path} {scope}/{key}: {e}")
+        return profiles
+    
+    def _read_db(self) -> Dict[str, str]:
+        """Cache the database overrides; returns the building types"""
+        from database import SessionLocal, Building, ThresholdProfile
+        
+        profiles = {scope: {} for scope in PROFILE_SCOPES}
+        db = SessionLocal()
+        try:
+            building_types = {building_id: building_type for building_id, building_type
+                              in db.query(Building.building_id, Building.type).all()}
+            for row in db.query(ThresholdProfile).all():
+                try:
+                    profiles[row.scope].setdefault(row.scope_key, {}).update(self.validate(json.loads(row.overrides)))
+                except (ValueError, KeyError) as e:
+                    self.errors.append(f"threshold_profiles {row.scope}/{row.scope_key}: {e}")
+        finally:
+            db.close()
+        self._db_overrides = profiles
+        return building_types
+    
+    def load(self, use_db: bool = True):
+        """Re-read the file (and the database with use_db), then drop every compiled table
+        
+        The database read blocks; call it through asyncio.to_thread from async code.
+        """
+        with self._lock:
+            self.errors = []
+            try:
+                profiles = self._read_file()
+            except (OSError, ValueError) as e:
+                self.errors.append(f"{self.path}: {e}")
+                profiles = {scope: {} for scope in PROFILE_SCOPES}
+            building_types = self.building_types
+            if use_db:
+                try:
+                    building_types = self._read_db()
+                except Exception as e:
+                    self.errors.append(f"threshold_profiles table: {e}")
+            # Database rows take precedence over the file
+            for scope, entries in self._db_overrides.items():
+                for key, overrides in entries.items():
+                    profiles[scope].setdefault(key, {}).update(overrides)
+            
+            # resolve() reads _compiled before the rest, so the new cache is swapped in last
+            self.overrides = profiles
+            self.building_types = building_types
+            self._compiled = {}
+            self.generation += 1
+            self.loaded_at = datetime.now()
+        for error in self.errors:
+            print(f"Threshold profile skipped: {error}")
+    
+    def reload_if_changed(self):
+        """Reload the file when it changed; checks at most every reload_interval seconds
+        
+        Runs on the event loop, so the database rows from the last load are reused.
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self._file_mtime:
+            self.load(use_db=False)
+    
+    def resolve(self, building_id: str, zone: Optional[str] = None) -> CompiledProfile:
+        # Startup loads the database off the event loop; before that only the file is used
+        if self.loaded_at is None:
+            self.load(use_db=False)
+        
+        # A threaded load() can swap the cache at any point. Taking the cache first means the
+        # overrides read after it are at least as new; a profile built from them then lands in
+        # that cache, or in an old one that has already been dropped
+        key = (building_id, zone)
+        compiled = self._compiled
+        profile = compiled.get(key)
+        if profile is not None:
+            return profile
+        overrides = self.overrides
+        building_types = self.building_types
+        
+        layers = []
+        building_type = building_types.get(building_id)
+        if building_type is not None:
+            layers.append((f"type:{building_type}", overrides["types"].get(building_type)))
+        layers.append((f"building:{building_id}", overrides["buildings"].get(building_id)))
+        if zone:
+            zone_key = f"{building_id}:{zone}"
+            layers.append((f"zone:{zone_key}", overrides["zones"].get(zone_key)))
+        
+        thresholds = self.defaults
+        sources = ["defaults"]
+        for source, overrides in layers:
+            if overrides:
+                thresholds = replace(thresholds, **overrides)
+                sources.append(source)
+        
+        profile = CompiledProfile(thresholds, compile_rules(self.rules, thresholds), tuple(sources))
+        compiled[key] = profile
+        return profile
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "file": self.path,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "rules": [spec.name for spec in self.rules],
+            "overrides": self.overrides,
+            "building_types": self.building_types,
+            "compiled_profiles": len(self._compiled),
+            "errors": self.errors
+        }
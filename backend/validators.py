@@ -2,11 +2,13 @@
 Data validation models and business logic for real-time features
 """
 
-from pydantic import BaseModel, field_validator, Field
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, field_validator, Field, TypeAdapter, ValidationError, WrapValidator
+from typing import Optional, Dict, Any, List, Tuple, Annotated
 from datetime import datetime
 from enum import Enum
-import re
+
+# Identifiers: alphanumeric characters, hyphens and underscores
+ID_PATTERN = r'^[a-zA-Z0-9_-]+$'
 
 class SensorStatus(str, Enum):
     ACTIVE = "active"
@@ -28,18 +30,22 @@ class AnomalySeverity(str, Enum):
     CRITICAL = "critical"
 
 class RealTimeSensorData(BaseModel):
-    """Real-time sensor data with comprehensive validation"""
-    building_id: str = Field(..., min_length=1, max_length=50, description="Building identifier")
-    sensor_id: str = Field(..., min_length=1, max_length=50, description="Sensor identifier")
+    """Real-time sensor data with comprehensive validation
+    
+    Every check is a core constraint, so validation runs in pydantic-core
+    without calling back into Python. Ranges are realistic indoor values.
+    """
+    building_id: str = Field(..., min_length=1, max_length=50, pattern=ID_PATTERN, description="Building identifier")
+    sensor_id: str = Field(..., min_length=1, max_length=50, pattern=ID_PATTERN, description="Sensor identifier")
     timestamp: datetime = Field(default_factory=datetime.now, description="Data timestamp")
     
     # Environmental data
-    temperature: float = Field(..., ge=-50, le=100, description="Temperature in Celsius")
-    humidity: float = Field(..., ge=0, le=100, description="Humidity percentage")
+    temperature: float = Field(..., ge=-20, le=50, description="Temperature in Celsius")
+    humidity: float = Field(..., ge=10, le=90, description="Humidity percentage")
     air_quality: Optional[float] = Field(None, ge=0, le=500, description="Air quality index")
     
     # Energy data
-    energy_consumption: float = Field(..., ge=0, le=10000, description="Energy consumption in kWh")
+    energy_consumption: float = Field(..., ge=0, le=5000, description="Energy consumption in kWh")
     power_factor: Optional[float] = Field(None, ge=0, le=1, description="Power factor")
     voltage: Optional[float] = Field(None, ge=0, le=1000, description="Voltage in volts")
     current: Optional[float] = Field(None, ge=0, le=1000, description="Current in amperes")
@@ -58,42 +64,6 @@ class RealTimeSensorData(BaseModel):
     location: Optional[str] = Field(None, max_length=100, description="Sensor location within building")
     floor: Optional[int] = Field(None, ge=0, le=200, description="Floor number")
     zone: Optional[str] = Field(None, max_length=50, description="Building zone")
-    
-    @field_validator('building_id')
-    @classmethod
-    def validate_building_id(cls, v):
-        if not re.match(r'^[a-zA-Z0-9_-]+$', v):
-            raise ValueError('Building ID must contain only alphanumeric characters, hyphens, and underscores')
-        return v
-    
-    @field_validator('sensor_id')
-    @classmethod
-    def validate_sensor_id(cls, v):
-        if not re.match(r'^[a-zA-Z0-9_-]+$', v):
-            raise ValueError('Sensor ID must contain only alphanumeric characters, hyphens, and underscores')
-        return v
-    
-    @field_validator('temperature', 'humidity', 'energy_consumption')
-    @classmethod
-    def validate_realistic_values(cls, v, info):
-        field_name = info.field_name
-        if field_name == 'temperature' and (v < -20 or v > 50):
-            raise ValueError('Temperature seems unrealistic for indoor environment')
-        elif field_name == 'humidity' and (v < 10 or v > 90):
-            raise ValueError('Humidity seems unrealistic for indoor environment')
-        elif field_name == 'energy_consumption' and v > 5000:
-            raise ValueError('Energy consumption seems unusually high')
-        return v
-    
-    @field_validator('occupancy')
-    @classmethod
-    def validate_occupancy(cls, v, info):
-        # Get the data from the model being validated
-        data = info.data
-        if data and 'occupancy_density' in data and data['occupancy_density']:
-            # Validate occupancy density consistency
-            pass
-        return v
 
 class RealTimeAlert(BaseModel):
     """Real-time alert with validation"""
@@ -108,6 +78,11 @@ class RealTimeAlert(BaseModel):
     is_acknowledged: bool = Field(default=False, description="Whether alert is acknowledged")
     acknowledged_by: Optional[str] = Field(None, description="User who acknowledged the alert")
     acknowledged_at: Optional[datetime] = Field(None, description="When alert was acknowledged")
+    state: str = Field(default="open", description="Lifecycle state (open, closed)")
+    occurrences: int = Field(default=1, ge=1, description="Readings that met the alert condition")
+    first_seen: Optional[datetime] = Field(None, description="First reading that met the condition")
+    last_seen: Optional[datetime] = Field(None, description="Latest reading that met the condition")
+    closed_at: Optional[datetime] = Field(None, description="When the condition cleared")
 
 class RealTimeCommand(BaseModel):
     """Real-time command for controlling building systems"""
@@ -145,7 +120,65 @@ class WebSocketMessage(BaseModel):
     @field_validator('message_type')
     @classmethod
     def validate_message_type(cls, v):
-        allowed_types = ['sensor_data', 'alert', 'command', 'status_update', 'heartbeat']
+        allowed_types = ['sensor_data', 'alert', 'command', 'status_update', 'heartbeat',
+                         'status_request', 'status_ack', 'connection_established']
         if v not in allowed_types:
             raise ValueError(f'Message type must be one of: {allowed_types}')
-        return v 
\ No newline at end of file
+        return v
+
+def _keep_row_error(value, handler):
+    try:
+        return handler(value)
+    except ValidationError as e:
+        return e
+
+class SensorBatchValidator:
+    """Validates a whole list of readings in one pydantic-core call, with errors reported per row
+
+    Batches are first validated strictly, which is fastest when every row
+    is valid. A batch that fails is validated again with a tolerant adapter
+    that keeps each bad row's error instead of aborting; after a failed
+    batch the tolerant adapter is used first until a batch comes back clean.
+    """
+    
+    def __init__(self):
+        self.strict = TypeAdapter(List[RealTimeSensorData])
+        self.tolerant = TypeAdapter(List[Annotated[RealTimeSensorData, WrapValidator(_keep_row_error)]])
+        self.expect_errors = False
+    
+    def validate_python(self, rows: List[Any]) -> Tuple[List[RealTimeSensorData], List[Dict[str, Any]]]:
+        return self._validate(self.strict.validate_python, self.tolerant.validate_python, rows)
+    
+    def validate_json(self, raw: bytes) -> Tuple[List[RealTimeSensorData], List[Dict[str, Any]]]:
+        """Parse and validate a JSON array; raises ValidationError when the body is not one"""
+        return self._validate(self.strict.validate_json, self.tolerant.validate_json, raw)
+    
+    def _validate(self, strict, tolerant, data) -> Tuple[List[RealTimeSensorData], List[Dict[str, Any]]]:
+        if not self.expect_errors:
+            try:
+                return strict(data), []
+            except ValidationError as e:
+                if any(not detail["loc"] or not isinstance(detail["loc"][0], int) for detail in e.errors()):
+                    raise
+        results = tolerant(data)
+        
+        readings = []
+        errors = []
+        for index, result in enumerate(results):
+            if isinstance(result, ValidationError):
+                errors.append({"index": index, "errors": result.errors(include_url=False, include_input=False)})
+            else:
+                readings.append(result)
+        self.expect_errors = bool(errors)
+        return readings, errors
+
+# Global instance
+sensor_batch_validator = SensorBatchValidator()
+
+def validate_sensor_batch(rows: List[Any]) -> Tuple[List[RealTimeSensorData], List[Dict[str, Any]]]:
+    """Validate a list of readings; returns the valid readings and per-row errors"""
+    return sensor_batch_validator.validate_python(rows)
+
+def validate_sensor_batch_json(raw: bytes) -> Tuple[List[RealTimeSensorData], List[Dict[str, Any]]]:
+    """Validate a JSON array of readings; returns the valid readings and per-row errors"""
+    return sensor_batch_validator.validate_json(raw)
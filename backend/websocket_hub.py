@@ -0,0 +1,412 @@
+"""
+WebSocket hub for real-time building updates
+
+Dashboard clients connect to /api/v2/ws/{building_id} and are subscribed to
+that building's topic. Incoming frames are parsed as WebSocketMessage and
+handed to the business logic; alerts and status updates are broadcast to
+every subscriber of the building, serialized once per broadcast.
+
+Alerts, status updates and readings are published on the event bus rather
+than broadcast directly; the hub broadcasts what the bus delivers, so
+clients on other workers receive them too.
+
+Every client has a bounded outbound queue drained by its own writer task,
+so a broadcast only enqueues and never waits on a slow socket. When a
+queue is full the client's slow-consumer policy decides what gives.
+
+Clients connecting with ?deltas=true get status as a status_snapshot
+followed by status_delta frames holding only the fields changed since the
+version they last acknowledged with a status_ack message.
+
+Clients connecting with ?encoding=msgpack get binary MessagePack frames
+instead of JSON text (see ws_encoding).
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Set, Any, Optional, List
+
+from dotenv import load_dotenv
+from fastapi import WebSocket
+from pydantic import ValidationError
+
+from validators import WebSocketMessage, RealTimeSensorData, RealTimeCommand
+from business_logic import business_logic
+from command_scheduler import command_scheduler
+from event_bus import event_bus, EventType, WORKER_ID
+from status_deltas import status_versions, STATUS_SNAPSHOT_INTERVAL
+from ws_encoding import Frame, WireEncoding, Payload, decode_message
+
+load_dotenv()
+
+class SlowConsumerPolicy(str, Enum):
+    DROP_OLDEST = "drop_oldest"  # discard the oldest queued frame
+    CONFLATE = "conflate"  # keep only the latest status update, then drop oldest
+    DISCONNECT = "disconnect"  # close the connection
+
+# Outbound queue settings
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SLOW_CONSUMER_POLICY = SlowConsumerPolicy(os.getenv("WS_SLOW_CONSUMER_POLICY", SlowConsumerPolicy.CONFLATE.value))
+
+# Frames that only matter in their latest version; deltas are cumulative from
+# the acknowledged version, so a newer one can replace any queued status frame
+CONFLATABLE_TYPES = {"status_update", "status_snapshot", "status_delta"}
+
+# Close code sent to clients disconnected for falling behind ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class ClientConnection:
+    """One subscriber with a bounded outbound queue"""
+    
+    def __init__(self, websocket: WebSocket, building_id: str,
+                 max_queue: int = WS_SEND_QUEUE_SIZE, policy: SlowConsumerPolicy = WS_SLOW_CONSUMER_POLICY,
+                 deltas: bool = False, encoding: WireEncoding = WireEncoding.JSON):
+        self.websocket = websocket
+        self.building_id = building_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.encoding = encoding
+        # Delta status: last version the client acknowledged and last version sent to it
+        self.deltas = deltas
+        self.acked_version: Optional[int] = None
+        self.sent_version = 0
+        self.last_snapshot_at = 0.0
+        self.connected_at = datetime.now()
+        # Entries are [message_type, payload, enqueued_at] so a queued status can be replaced in place
+        self.queue: deque = deque()
+        self.closed = False
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.last_send_lag = 0.0
+        self.max_send_lag = 0.0
+        self._queued_status: Optional[list] = None
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+    
+    def start(self, on_close):
+        self._writer = asyncio.create_task(self._write_loop(on_close))
+    
+    def enqueue(self, message_type: str, payload: Payload) -> bool:
+        """Queue a serialized frame; returns False if the client was disconnected instead"""
+        if self.closed:
+            return False
+        
+        now = time.monotonic()
+        if message_type in CONFLATABLE_TYPES and self.policy == SlowConsumerPolicy.CONFLATE \
+                and self._queued_status is not None:
+            self._queued_status[1] = payload
+            self.conflated += 1
+            return True
+        
+        if len(self.queue) >= self.max_queue:
+            if self.policy == SlowConsumerPolicy.DISCONNECT:
+                self.close(SLOW_CONSUMER_CLOSE_CODE, "Client too slow")
+                return False
+            dropped = self.queue.popleft()
+            if dropped is self._queued_status:
+                self._queued_status = None
+            self.dropped += 1
+        
+        entry = [message_type, payload, now]
+        self.queue.append(entry)
+        if message_type in CONFLATABLE_TYPES:
+            self._queued_status = entry
+        self._wakeup.set()
+        return True
+    
+    async def _write_loop(self, on_close):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                entry = self.queue.popleft()
+                if entry is self._queued_status:
+                    self._queued_status = None
+                payload = entry[1]
+                if self.encoding == WireEncoding.MSGPACK:
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+                self.sent += 1
+                self.bytes_sent += len(payload)
+                self.last_send_lag = time.monotonic() - entry[2]
+                self.max_send_lag = max(self.max_send_lag, self.last_send_lag)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.closed = True
+            on_close(self)
+    
+    def close(self, code: int = 1000, reason: str = ""):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self._queued_status = None
+        self._wakeup.set()
+        asyncio.create_task(self._close_socket(code, reason))
+    
+    async def _close_socket(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+    
+    def stop(self):
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+    
+    def stats(self) -> Dict[str, Any]:
+        oldest_age = time.monotonic() - self.queue[0][2] if self.queue else 0.0
+        return {
+            "building_id": self.building_id,
+            "policy": self.policy.value,
+            "deltas": self.deltas,
+            "encoding": self.encoding.value,
+            "acked_version": self.acked_version,
+            "connected_at": self.connected_at.isoformat(),
+            "queued": len(self.queue),
+            "oldest_queued_seconds": round(oldest_age, 3),
+            "last_send_lag_seconds": round(self.last_send_lag, 3),
+            "max_send_lag_seconds": round(self.max_send_lag, 3),
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated
+        }
+
+class ConnectionHub:
+    """Per-building topics of WebSocket subscribers"""
+    
+    def __init__(self):
+        self.topics: Dict[str, Set[ClientConnection]] = {}
+        self.slow_consumer_disconnects = 0
+        # Status frames and bytes queued, by frame type, plus delta pushes skipped
+        self.status_frames = {"status_update": 0, "status_snapshot": 0, "status_delta": 0}
+        self.status_bytes = {"status_update": 0, "status_snapshot": 0, "status_delta": 0}
+        self.status_skipped = 0
+    
+    async def connect(self, building_id: str, websocket: WebSocket,
+                      policy: Optional[SlowConsumerPolicy] = None, deltas: bool = False,
+                      encoding: WireEncoding = WireEncoding.JSON) -> ClientConnection:
+        await websocket.accept()
+        client = ClientConnection(websocket, building_id, policy=policy or WS_SLOW_CONSUMER_POLICY, deltas=deltas,
+                                  encoding=encoding)
+        client.start(self.disconnect)
+        self.topics.setdefault(building_id, set()).add(client)
+        return client
+    
+    def disconnect(self, client: ClientConnection):
+        client.stop()
+        subscribers = self.topics.get(client.building_id)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self.topics[client.building_id]
+    
+    def send(self, client: ClientConnection, message_type: str, data: Any):
+        client.enqueue(message_type, Frame(message_type, data).encode(client.encoding))
+    
+    def broadcast(self, building_id: str, message_type: str, data: Any) -> int:
+        """Queue one frame for every subscriber of a building; returns the number reached"""
+        subscribers = self.topics.get(building_id)
+        if not subscribers:
+            return 0
+        
+        frame = Frame(message_type, data)
+        delivered = 0
+        for client in list(subscribers):
+            if self._deliver(client, message_type, frame.encode(client.encoding)):
+                delivered += 1
+        return delivered
+    
+    def _deliver(self, client: ClientConnection, message_type: str, payload: Payload) -> bool:
+        if client.enqueue(message_type, payload):
+            return True
+        self.slow_consumer_disconnects += 1
+        self.disconnect(client)
+        return False
+    
+    def broadcast_status(self, building_id: str, status: Dict[str, Any]) -> int:
+        """Push a building status: full to plain clients, snapshot or delta to delta clients
+        
+        Each distinct frame is serialized once per broadcast and encoding,
+        however many clients share it.
+        """
+        version = status_versions.update(building_id, status)
+        subscribers = self.topics.get(building_id)
+        if not subscribers:
+            return 0
+        
+        now = time.monotonic()
+        full_frame: Optional[Frame] = None
+        snapshot_frame: Optional[Frame] = None
+        delta_frames: Dict[int, Frame] = {}
+        heartbeat_only: Dict[int, bool] = {}
+        delivered = 0
+        
+        for client in list(subscribers):
+            if not client.deltas:
+                if full_frame is None:
+                    full_frame = Frame("status_update", status)
+                frame = full_frame
+            else:
+                resync = now - client.last_snapshot_at >= STATUS_SNAPSHOT_INTERVAL
+                if not resync:
+                    if client.sent_version not in heartbeat_only:
+                        heartbeat_only[client.sent_version] = status_versions.is_heartbeat_only(
+                            building_id, client.sent_version)
+                    if heartbeat_only[client.sent_version]:
+                        self.status_skipped += 1
+                        continue
+                
+                base = client.acked_version
+                if resync or base is None or base > version:
+                    # Until the client acknowledges a version, snapshots are the only safe frame
+                    if snapshot_frame is None:
+                        snapshot_frame = Frame("status_snapshot", status_versions.snapshot(building_id))
+                    frame = snapshot_frame
+                    client.last_snapshot_at = now
+                else:
+                    if base not in delta_frames:
+                        delta_frames[base] = Frame("status_delta", status_versions.delta(building_id, base))
+                    frame = delta_frames[base]
+            
+            message_type = frame.message_type
+            payload = frame.encode(client.encoding)
+            if self._deliver(client, message_type, payload):
+                client.sent_version = version
+                self.status_frames[message_type] += 1
+                self.status_bytes[message_type] += len(payload)
+                delivered += 1
+        return delivered
+    
+    async def handle_message(self, client: ClientConnection, raw: Payload):
+        """Dispatch one incoming frame"""
+        try:
+            message = decode_message(raw)
+        except ValidationError as e:
+            self.send(client, "error", {"message": "Invalid message", "details": e.errors(include_url=False)})
+            return
+        except ValueError as e:
+            self.send(client, "error", {"message": str(e)})
+            return
+        
+        handler = getattr(self, f"_handle_{message.message_type}", None)
+        if handler is None:
+            self.send(client, "error", {"message": f"Unsupported message type: {message.message_type}"})
+            return
+        
+        try:
+            await handler(client, message)
+        except ValidationError as e:
+            self.send(client, "error", {
+                "message": f"Invalid {message.message_type} payload",
+                "details": e.errors(include_url=False)
+            })
+        except ValueError as e:
+            self.send(client, "error", {"message": str(e)})
+    
+    def _scoped_payload(self, client: ClientConnection, data: Dict[str, Any]) -> Dict[str, Any]:
+        payload = dict(data)
+        if payload.setdefault("building_id", client.building_id) != client.building_id:
+            raise ValueError(f"Message is for building {payload['building_id']}, connection is for {client.building_id}")
+        return payload
+    
+    async def _handle_sensor_data(self, client: ClientConnection, message: WebSocketMessage):
+        sensor_data = RealTimeSensorData.model_validate(self._scoped_payload(client, message.data))
+        alerts = await business_logic.process_sensor_data(sensor_data)
+        
+        self.send(client, "sensor_data_confirmed", {
+            "sensor_id": sensor_data.sensor_id,
+            "message_id": message.message_id,
+            "alerts": len(alerts)
+        })
+        await event_bus.publish(EventType.SENSOR, client.building_id, sensor_data.model_dump(mode="json"))
+        for alert in alerts:
+            await event_bus.publish(EventType.ALERT, client.building_id, alert.model_dump(mode="json"))
+        await event_bus.publish(EventType.STATUS, client.building_id, business_logic.get_system_status(client.building_id))
+    
+    async def _handle_command(self, client: ClientConnection, message: WebSocketMessage):
+        command = RealTimeCommand.model_validate(self._scoped_payload(client, message.data))
+        # Queued by priority and rate-limited; the response is pushed once the command has run
+        future = command_scheduler.submit(command)
+        future.add_done_callback(lambda done: self.send(client, "command_response", done.result()))
+    
+    async def _handle_heartbeat(self, client: ClientConnection, message: WebSocketMessage):
+        self.send(client, "heartbeat_response", {"building_id": client.building_id})
+    
+    async def _handle_status_request(self, client: ClientConnection, message: WebSocketMessage):
+        if client.deltas:
+            client.last_snapshot_at = time.monotonic()
+            client.sent_version = status_versions.version(client.building_id)
+            self.send(client, "status_snapshot", status_versions.snapshot(client.building_id))
+            return
+        self.send(client, "status_update", business_logic.get_system_status(client.building_id) or {})
+    
+    async def _handle_status_ack(self, client: ClientConnection, message: WebSocketMessage):
+        version = message.data.get("version")
+        if not isinstance(version, int) or version < 0:
+            raise ValueError("status_ack needs a non-negative integer version")
+        if version > status_versions.version(client.building_id):
+            raise ValueError(f"Unknown status version: {version}")
+        client.acked_version = version
+    
+    async def _handle_connection_established(self, client: ClientConnection, message: WebSocketMessage):
+        self.send(client, "connection_established", {
+            "building_id": client.building_id,
+            "subscribers": len(self.topics.get(client.building_id, ()))
+        })
+    
+    async def on_event(self, event: Dict[str, Any]):
+        """Event bus handler: push events to this worker's subscribers"""
+        event_type = event["type"]
+        building_id = event["building_id"]
+        if event_type == EventType.ALERT:
+            self.broadcast(building_id, "alert", event["data"])
+        elif event_type == EventType.STATUS:
+            self.broadcast_status(building_id, event["data"])
+        elif event_type == EventType.SENSOR and event["origin"] != WORKER_ID and not business_logic.state_store.shared:
+            # Workers sharing the state store already see the reading; others keep their own copy in step
+            business_logic.record_sensor_data(RealTimeSensorData.model_validate(event["data"]))
+    
+    async def on_resync(self):
+        """Event bus gap handler: status events may be missing, push every subscribed building's current status"""
+        for building_id in list(self.topics):
+            status = business_logic.get_system_status(building_id)
+            if status is not None:
+                self.broadcast_status(building_id, status)
+    
+    def stats(self, include_connections: bool = False) -> Dict[str, Any]:
+        clients: List[ClientConnection] = [client for subscribers in self.topics.values() for client in subscribers]
+        data = {
+            "buildings": len(self.topics),
+            "connections": len(clients),
+            "by_building": {building_id: len(subscribers) for building_id, subscribers in self.topics.items()},
+            "queued": sum(len(client.queue) for client in clients),
+            "dropped": sum(client.dropped for client in clients),
+            "conflated": sum(client.conflated for client in clients),
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "by_encoding": {encoding.value: sum(1 for client in clients if client.encoding == encoding)
+                            for encoding in WireEncoding},
+            "bytes_sent": sum(client.bytes_sent for client in clients),
+            "max_send_lag_seconds": round(max((client.max_send_lag for client in clients), default=0.0), 3),
+            "status_frames": dict(self.status_frames),
+            "status_bytes": dict(self.status_bytes),
+            "status_deltas_skipped": self.status_skipped
+        }
+        if include_connections:
+            data["connections_detail"] = [client.stats() for client in clients]
+        return data
+
+# Global instance
+connection_hub = ConnectionHub()
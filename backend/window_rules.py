@@ -0,0 +1,297 @@
+"""
+Sliding-window alert rules evaluated incrementally per sensor
+
+The threshold checks in business_logic compare a single reading. These
+rules look at a sensor's recent history without querying it: each keeps a
+small per-sensor state that is updated in constant time per reading.
+
+- DurationRule: a threshold has been breached continuously for a duration
+  (state: when the current breach started)
+- PercentileRule: the value is above a percentile of the sensor's own
+  readings over a long window (state: hourly histogram buckets plus their
+  running total; expired buckets are subtracted)
+- TrendRule: the least-squares slope over a time window is steeper than a
+  limit (state: deque of samples with running regression sums)
+
+Each rule reports whether it fires and whether an open alert may clear;
+the alert lifecycle in alert_lifecycle.py decides what is emitted.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from collections import deque, Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from validators import AnomalySeverity
+
+SensorKey = Tuple[str, str]  # (building_id, sensor_id)
+
+# (firing, cleared, details)
+RuleOutcome = Tuple[bool, bool, Dict[str, Any]]
+
+class WindowRule(ABC):
+    """Base class: a named rule over one RealTimeSensorData field"""
+    
+    def __init__(self, name: str, field: str, alert_type: str, severity: AnomalySeverity):
+        self.name = name
+        self.field = field
+        self.alert_type = alert_type
+        self.severity = severity
+    
+    @abstractmethod
+    def evaluate(self, key: SensorKey, timestamp: datetime, value: float, thresholds) -> RuleOutcome:
+        ...
+    
+    @abstractmethod
+    def describe(self, value: float, details: Dict[str, Any]) -> str:
+        ...
+    
+    @abstractmethod
+    def forget(self, key: SensorKey):
+        """Drop a sensor's window state"""
+
+class DurationRule(WindowRule):
+    """Fires once a ThresholdConfig limit has been breached for ``duration_seconds`` without a break"""
+    
+    def __init__(self, name: str, field: str, alert_type: str, severity: AnomalySeverity,
+                 threshold_field: str, duration_seconds: float, above: bool = True, band_field: Optional[str] = None):
+        super().__init__(name, field, alert_type, severity)
+        self.threshold_field = threshold_field
+        self.duration_seconds = duration_seconds
+        self.above = above
+        self.band_field = band_field
+        self.breach_started: Dict[SensorKey, datetime] = {}
+    
+    def evaluate(self, key: SensorKey, timestamp: datetime, value: float, thresholds) -> RuleOutcome:
+        threshold = getattr(thresholds, self.threshold_field)
+        band = getattr(thresholds, self.band_field) if self.band_field else 0
+        breached = value > threshold if self.above else value < threshold
+        
+        if breached:
+            started = self.breach_started.setdefault(key, timestamp)
+            held = (timestamp - started).total_seconds()
+        else:
+            self.breach_started.pop(key, None)
+            held = 0.0
+        
+        cleared = value <= threshold - band if self.above else value >= threshold + band
+        details = {
+            "current_value": value,
+            "threshold": threshold,
+            "held_seconds": held,
+            "duration_seconds": self.duration_seconds
+        }
+        return breached and held >= self.duration_seconds, cleared, details
+    
+    def describe(self, value: float, details: Dict[str, Any]) -> str:
+        direction = "above" if self.above else "below"
+        minutes = details["held_seconds"] / 60
+        return f"{self.field} {direction} {details['threshold']} for {minutes:.0f} min (now {value})"
+    
+    def forget(self, key: SensorKey):
+        self.breach_started.pop(key, None)
+
+class LogBins:
+    """Log-spaced histogram bins between ``low`` and ``high``; values below ``low`` share bin 0"""
+    
+    def __init__(self, low: float, high: float, count: int = 256):
+        self.low = low
+        self.count = count
+        self.ratio = (high / low) ** (1 / (count - 1))
+        self._log_low = math.log(low)
+        self._log_ratio = math.log(self.ratio)
+    
+    def index(self, value: float) -> int:
+        if value <= self.low:
+            return 0
+        return min(self.count - 1, int((math.log(value) - self._log_low) / self._log_ratio) + 1)
+    
+    def upper_edge(self, index: int) -> float:
+        return self.low * self.ratio ** index
+
+class _PercentileWindow:
+    __slots__ = ("buckets", "totals", "count")
+    
+    def __init__(self, bins: int):
+        self.buckets: deque = deque()  # (bucket number, Counter of bin -> readings)
+        self.totals = [0] * bins
+        self.count = 0
+    
+    def expire(self, oldest_bucket: int):
+        while self.buckets and self.buckets[0][0] < oldest_bucket:
+            _, counts = self.buckets.popleft()
+            for index, n in counts.items():
+                self.totals[index] -= n
+            self.count -= sum(counts.values())
+    
+    def add(self, bucket: int, index: int):
+        if not self.buckets or self.buckets[-1][0] != bucket:
+            self.buckets.append((bucket, Counter()))
+        self.buckets[-1][1][index] += 1
+        self.totals[index] += 1
+        self.count += 1
+    
+    def percentile_index(self, percentile: float) -> int:
+        target = math.ceil(self.count * percentile / 100)
+        seen = 0
+        for index, n in enumerate(self.totals):
+            seen += n
+            if seen >= target:
+                return index
+        return len(self.totals) - 1
+
+class PercentileRule(WindowRule):
+    """Fires when a reading is above a percentile of the sensor's readings over ``window_seconds``
+    
+    The current reading is compared before it is added, so a spike does
+    not raise its own baseline.
+    """
+    
+    def __init__(self, name: str, field: str, alert_type: str, severity: AnomalySeverity,
+                 percentile: float = 95, window_seconds: float = 7 * 24 * 3600, bucket_seconds: float = 3600,
+                 min_samples: int = 288, bins: Optional[LogBins] = None, clear_ratio: float = 0.95):
+        super().__init__(name, field, alert_type, severity)
+        self.percentile = percentile
+        self.window_buckets = int(window_seconds // bucket_seconds)
+        self.bucket_seconds = bucket_seconds
+        self.min_samples = min_samples
+        self.bins = bins or LogBins(1.0, 10000.0)
+        # An open alert clears once the value is this fraction of the percentile or lower
+        self.clear_ratio = clear_ratio
+        self.windows: Dict[SensorKey, _PercentileWindow] = {}
+    
+    def evaluate(self, key: SensorKey, timestamp: datetime, value: float, thresholds) -> RuleOutcome:
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = _PercentileWindow(self.bins.count)
+        
+        bucket = int(timestamp.timestamp() // self.bucket_seconds)
+        window.expire(bucket - self.window_buckets + 1)
+        
+        baseline = None
+        if window.count >= self.min_samples:
+            baseline = self.bins.upper_edge(window.percentile_index(self.percentile))
+        samples = window.count
+        window.add(bucket, self.bins.index(value))
+        
+        firing = baseline is not None and value > baseline
+        cleared = baseline is None or value <= baseline * self.clear_ratio
+        details = {
+            "current_value": value,
+            "percentile": self.percentile,
+            "baseline": round(baseline, 3) if baseline is not None else None,
+            "samples": samples
+        }
+        return firing, cleared, details
+    
+    def describe(self, value: float, details: Dict[str, Any]) -> str:
+        days = self.window_buckets * self.bucket_seconds / 86400
+        return (f"{self.field} {value} above p{self.percentile:g} of the last {days:g} days "
+                f"({details['baseline']})")
+    
+    def forget(self, key: SensorKey):
+        self.windows.pop(key, None)
+
+class _RegressionWindow:
+    __slots__ = ("samples", "origin", "n", "sum_t", "sum_y", "sum_tt", "sum_ty")
+    
+    def __init__(self, origin: float):
+        self.samples: deque = deque()
+        self.origin = origin
+        self.n = 0
+        self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = 0.0
+    
+    def add(self, t: float, y: float):
+        t -= self.origin
+        self.samples.append((t, y))
+        self.n += 1
+        self.sum_t += t
+        self.sum_y += y
+        self.sum_tt += t * t
+        self.sum_ty += t * y
+    
+    def expire(self, oldest: float):
+        oldest -= self.origin
+        while self.samples and self.samples[0][0] < oldest:
+            t, y = self.samples.popleft()
+            self.n -= 1
+            self.sum_t -= t
+            self.sum_y -= y
+            self.sum_tt -= t * t
+            self.sum_ty -= t * y
+    
+    def span(self) -> float:
+        return self.samples[-1][0] - self.samples[0][0] if self.samples else 0.0
+    
+    def slope(self) -> Optional[float]:
+        denominator = self.n * self.sum_tt - self.sum_t * self.sum_t
+        if self.n < 2 or denominator <= 0:
+            return None
+        return (self.n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+
+class TrendRule(WindowRule):
+    """Fires when the fitted slope over ``window_seconds`` falls faster than ``max_drop_per_hour``
+    
+    Use a negative ``max_drop_per_hour`` to watch for a rise instead.
+    """
+    
+    def __init__(self, name: str, field: str, alert_type: str, severity: AnomalySeverity,
+                 max_drop_per_hour: float, window_seconds: float = 3600, min_samples: int = 10):
+        super().__init__(name, field, alert_type, severity)
+        self.max_drop_per_hour = max_drop_per_hour
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.windows: Dict[SensorKey, _RegressionWindow] = {}
+    
+    def evaluate(self, key: SensorKey, timestamp: datetime, value: float, thresholds) -> RuleOutcome:
+        t = timestamp.timestamp()
+        window = self.windows.get(key)
+        if window is None or not window.samples:
+            # Re-base on an empty window to keep the running sums small
+            window = self.windows[key] = _RegressionWindow(origin=t)
+        window.expire(t - self.window_seconds)
+        window.add(t, value)
+        
+        slope = window.slope()
+        # Only judge a trend once the samples cover half the window
+        ready = slope is not None and window.n >= self.min_samples and window.span() >= self.window_seconds / 2
+        drop_per_hour = -slope * 3600 if slope is not None else 0.0
+        if self.max_drop_per_hour < 0:
+            firing = ready and drop_per_hour <= self.max_drop_per_hour
+            cleared = not ready or drop_per_hour > self.max_drop_per_hour / 2
+        else:
+            firing = ready and drop_per_hour >= self.max_drop_per_hour
+            cleared = not ready or drop_per_hour < self.max_drop_per_hour / 2
+        
+        details = {
+            "current_value": value,
+            "change_per_hour": round(-drop_per_hour, 3),
+            "limit_per_hour": -self.max_drop_per_hour,
+            "samples": window.n
+        }
+        return firing, cleared, details
+    
+    def describe(self, value: float, details: Dict[str, Any]) -> str:
+        minutes = self.window_seconds / 60
+        return f"{self.field} trending {details['change_per_hour']:+g}/h over {minutes:.0f} min (now {value})"
+    
+    def forget(self, key: SensorKey):
+        self.windows.pop(key, None)
+
+def default_window_rules() -> List[WindowRule]:
+    """Rules evaluated on every reading in addition to the single-sample checks"""
+    return [
+        DurationRule(
+            "temp_high_sustained", "temperature", "temperature_anomaly", AnomalySeverity.HIGH,
+            threshold_field="temperature_max", duration_seconds=15 * 60, band_field="temperature_band"
+        ),
+        PercentileRule(
+            "energy_above_p95", "energy_consumption", "energy_spike", AnomalySeverity.MEDIUM,
+            percentile=95, window_seconds=7 * 24 * 3600
+        ),
+        TrendRule(
+            "hvac_efficiency_falling", "hvac_efficiency", "maintenance_required", AnomalySeverity.MEDIUM,
+            max_drop_per_hour=5.0, window_seconds=3600
+        )
+    ]
@@ -0,0 +1,71 @@
+"""
+Wire encodings for real-time WebSocket frames
+
+Clients choose an encoding when they connect (?encoding=json|msgpack):
+
+- json: text frames, the default and what src/utils/websocket.js speaks
+- msgpack: binary MessagePack frames with the same envelope
+  (message_type, data, timestamp, message_id). Floats travel as 9-byte
+  binary doubles instead of decimal text, so readings and status frames
+  are smaller and cheaper to encode and decode
+
+A binary client may send either binary MessagePack or JSON text frames;
+each incoming frame is decoded by its frame type.
+
+An outgoing Frame serializes its envelope once per encoding, however many
+clients of that encoding it is broadcast to.
+"""
+
+import json
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Any, Union
+
+from validators import WebSocketMessage
+
+Payload = Union[str, bytes]
+
+class WireEncoding(str, Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+def _msgpack():
+    # Imported on first use so JSON-only deployments never load it
+    import msgpack
+    return msgpack
+
+class Frame:
+    """One outgoing message, serialized at most once per encoding"""
+    
+    __slots__ = ("message_type", "envelope", "payloads")
+    
+    def __init__(self, message_type: str, data: Any):
+        self.message_type = message_type
+        self.envelope = {
+            "message_type": message_type,
+            "data": data,
+            "timestamp": datetime.now().isoformat(),
+            "message_id": uuid.uuid4().hex
+        }
+        self.payloads: Dict[WireEncoding, Payload] = {}
+    
+    def encode(self, encoding: WireEncoding) -> Payload:
+        payload = self.payloads.get(encoding)
+        if payload is None:
+            if encoding == WireEncoding.MSGPACK:
+                payload = _msgpack().packb(self.envelope, default=str)
+            else:
+                payload = json.dumps(self.envelope, default=str)
+            self.payloads[encoding] = payload
+        return payload
+
+def decode_message(raw: Payload) -> WebSocketMessage:
+    """Parse an incoming frame: text as JSON, binary as MessagePack"""
+    if isinstance(raw, str):
+        return WebSocketMessage.model_validate_json(raw)
+    try:
+        message = _msgpack().unpackb(raw, raw=False)
+    except Exception as e:
+        raise ValueError(f"Invalid MessagePack frame: {str(e) or type(e).__name__}") from e
+    return WebSocketMessage.model_validate(message)
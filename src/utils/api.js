@@ -68,6 +68,11 @@ class ApiService {
     return await this.request(`/buildings/${buildingId}/data?hours=${hours}`);
   }
 
+  // One array per field plus shared epoch-millisecond timestamps, ready for charts
+  async getBuildingSeries(buildingId, hours = 24) {
+    return await this.request(`/buildings/${buildingId}/data?hours=${hours}&format=columnar`);
+  }
+
   // AI/ML Features
   async getPredictions(buildingId, feature, hoursAhead = 24) {
     return await this.request('/predictions', {
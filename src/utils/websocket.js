@@ -8,6 +8,7 @@ class WebSocketService {
     this.reconnectAttempts = new Map();
     this.maxReconnectAttempts = 5;
     this.reconnectDelay = 1000; // Start with 1 second
+    this.statusState = new Map(); // buildingId -> { version, status } for delta status updates
   }
 
   // Connect to WebSocket for a specific building
@@ -26,8 +27,11 @@ class WebSocketService {
       }
     }
 
-    const url = `${WS_BASE_URL}/${buildingId}`;
-    console.log(`🔌 Attempting to connect to: ${url}`);
+    // Opt in to delta-encoded status: a snapshot first, then only changed fields.
+    // Browsers can't send an Authorization header here, so the JWT goes in the query.
+    const token = encodeURIComponent(localStorage.getItem('authToken') || '');
+    const url = `${WS_BASE_URL}/${buildingId}?deltas=true&token=${token}`;
+    console.log(`🔌 Attempting to connect to building ${buildingId}`);
     
     try {
       const ws = new WebSocket(url);
@@ -141,6 +145,7 @@ class WebSocketService {
       }
       this.connections.delete(connectionId);
       this.reconnectAttempts.delete(connectionId);
+      this.statusState.delete(buildingId);
       console.log(`🔌 Disconnected from building ${buildingId}`);
     }
   }
@@ -230,6 +235,14 @@ class WebSocketService {
         this.notifyStatusHandlers(buildingId, message.data);
         break;
         
+      case 'status_snapshot':
+        this.applyStatusSnapshot(buildingId, message.data);
+        break;
+        
+      case 'status_delta':
+        this.applyStatusDelta(buildingId, message.data);
+        break;
+        
       case 'heartbeat_response':
         console.log(`💓 Heartbeat response from building ${buildingId}`);
         break;
@@ -247,6 +260,36 @@ class WebSocketService {
     }
   }
 
+  // Replace the building's status with a full snapshot and acknowledge its version
+  applyStatusSnapshot(buildingId, snapshot) {
+    this.statusState.set(buildingId, { version: snapshot.version, status: snapshot.status });
+    this.acknowledgeStatus(buildingId, snapshot.version);
+    this.notifyStatusHandlers(buildingId, snapshot.status);
+  }
+
+  // Merge changed fields into the known status; resync if the delta's base is unknown
+  applyStatusDelta(buildingId, delta) {
+    const state = this.statusState.get(buildingId);
+    if (!state || state.version < delta.base_version) {
+      this.requestStatus(buildingId);
+      return;
+    }
+    if (delta.version <= state.version) {
+      return;
+    }
+    const status = { ...state.status, ...delta.changes };
+    this.statusState.set(buildingId, { version: delta.version, status });
+    this.acknowledgeStatus(buildingId, delta.version);
+    this.notifyStatusHandlers(buildingId, status);
+  }
+
+  acknowledgeStatus(buildingId, version) {
+    this.sendMessage(buildingId, {
+      message_type: 'status_ack',
+      data: { version }
+    });
+  }
+
   // Register message handlers
   onAlert(buildingId, handler) {
     const key = `alert_${buildingId}`;